@@ -1,87 +1,383 @@
-import json
 import logging
-from datetime import datetime
-from agent.task_manager import generate_tasks
-from agent.task_executor import run_nmap, run_gobuster, run_ffuf, run_sqlmap
+from functools import partial
+from agent.task_manager import generate_tasks, shard_task
+from agent.task_executor import run_nmap, run_gobuster, run_ffuf, run_sqlmap, command_signature, merge_nmap_results
+from agent.result_cache import get_cache, make_key
+from agent.wordlists import resolve_wordlist
+from agent.journal import ScanJournal, new_scan_id
+from agent.report_sink import ReportSink, report_path
+from config import CACHE_ENABLED
+from agent.scheduler import TaskScheduler
+from agent.parsers import get_parser, PortRecord
+from agent.findings import FindingIndex, findings_from_result, compact_result
+from agent.blob_store import offload_output
+from agent.metrics import task_span, timed, timing_summary, write_metrics
+from agent.audit_log import log_context
+from agent.cost_model import get_runtime_history
+from agent.planner import ScanPlanner
+from agent.endpoints import EndpointSet, batch_injection_tasks
+
+# Task keys that don't change how a tool is invoked, and so stay out of the cache key
+NON_CACHE_KEYS = ("id", "tool", "target", "refresh")
+
+# Tools that take a wordlist
+WORDLIST_TOOLS = ("gobuster", "ffuf")
+
+def task_cache_key(task, wordlist_hash=None):
+    """
+    Build the result cache key for a task.
+
+    The key covers the tool, the normalized target, the tool's full argument
+    set, any extra task options and, for wordlist-driven tools, the hash of
+    the wordlist (or wordlist shard) content.
+
+    Returns:
+        str: The cache key, or None for unknown tools.
+    """
+    tool = task.get("tool")
+    arguments = command_signature(tool)
+    if arguments is None:
+        return None
+    options = {key: value for key, value in task.items() if key not in NON_CACHE_KEYS}
+    return make_key(tool, task.get("target", ""), arguments, options, wordlist_hash)
+
+def run_tool(tool, target, on_line=None, wordlist=None, ports=None, urls=None):
+    """Run the tool function that matches the tool name."""
+    if tool == "nmap":
+        return run_nmap(target, on_line=on_line, ports=ports)
+    elif tool == "gobuster":
+        return run_gobuster(target, on_line=on_line, wordlist=wordlist)
+    elif tool == "ffuf":
+        return run_ffuf(target, on_line=on_line, wordlist=wordlist)
+    elif tool == "sqlmap":
+        return run_sqlmap(target, on_line=on_line, urls=urls)
+    else:
+        # Log an error if an unknown tool is specified
+        logging.error(f"Unknown tool specified: {tool}")
+        return {"status": "failed", "error": f"Unknown tool specified: {tool}"}
+
+def attach_findings(task, result):
+    """Add the normalized findings of a successful result under "findings" (see agent.findings)."""
+    if result.get("status") == "success" and "findings" not in result:
+        result["findings"] = [finding.to_dict() for finding in findings_from_result(task, result)]
+    return result
 
 # Define our "node" function (simulating a LangGraph node)
-def execute_task(task):
+def execute_task(task, on_event=None):
     """
     Executes a given security scanning task based on the tool specified.
     
     - Logs the execution details.
+    - Returns a cached result if the same invocation ran recently.
+    - Streams the tool's output through its parser while the tool is running.
     - Calls the appropriate function based on the tool name.
-    - Returns the output of the executed command.
+    - Returns the output of the executed command, with its normalized findings.
+      Large raw output is moved to the blob store and replaced by an "output_ref" handle.
+    - Records the task's timing (subprocess, retry backoff, parsing) under "timing"
+      and in the process-wide metrics (see agent.metrics).
 
     Args:
-        task (dict): A dictionary containing the tool name and target.
+        task (dict): A dictionary containing the tool name and target. Set
+            "refresh" to True to ignore cached results and re-run the tool.
+        on_event (callable): Optional callback ``(task, event)`` receiving live
+            progress: one "line" event per output line plus parsed events such
+            as discovered ports or paths.
 
     Returns:
         dict: The output of the tool execution, or an error message if the tool is unknown.
     """
     tool = task.get("tool")  # Extract the tool name
     target = task.get("target")  # Extract the target domain/IP
-    logging.info(f"Executing task: {tool} on target: {target}")
+    with log_context(task_id=task.get("id"), tool=tool, target=target), task_span(tool, target) as span:
+        logging.info(f"Executing task: {tool} on target: {target}")
+        result = _execute_task(task, on_event, span)
+        span.status = result.get("status", "unknown")
+    result["timing"] = span.to_dict()  # Not cached: a cache hit gets its own timing
+    if span.status == "success" and not span.cached:
+        try:
+            get_runtime_history().record(task, span.total)  # Feeds the estimates of the scan planner
+        except OSError as e:
+            logging.warning(f"Could not record the runtime of {tool} on {target}: {str(e)}")
+    return result
 
-    # Run the corresponding tool function based on the tool name
-    if tool == "nmap":
-        return run_nmap(target)
-    elif tool == "gobuster":
-        return run_gobuster(target)
-    elif tool == "ffuf":
-        return run_ffuf(target)
-    elif tool == "sqlmap":
-        return run_sqlmap(target)
+def _execute_task(task, on_event, span):
+    """Run (or look up) one task inside its timing span; see execute_task."""
+    tool = task.get("tool")
+    target = task.get("target")
+
+    # Resolve the named wordlist (or the task's shard of it) for wordlist-driven tools
+    wordlist_path, wordlist_hash, wordlist_info = None, None, None
+    if tool in WORDLIST_TOOLS:
+        wordlist_path, wordlist_hash, wordlist_info = resolve_wordlist(task)
+
+    # Consult the result cache before shelling out
+    cache_key = task_cache_key(task, wordlist_hash) if CACHE_ENABLED else None
+    if cache_key and not task.get("refresh"):
+        cached = get_cache().get(cache_key, tool)
+        if cached is not None:
+            logging.info(f"Using cached {tool} result for target: {target}")
+            span.cached = True
+            return offload_output(attach_findings(task, dict(cached, cached=True)))
+
+    parser = get_parser(tool)
+
+    def on_line(line):
+        with timed("parse"):
+            events = parser.feed(line)
+        for event in events:
+            logging.info(f"{tool} on {target} reported {event}")  # Live progress in the audit log
+        if on_event is None:
+            return
+        try:
+            on_event(task, {"type": "line", "line": line})
+            for event in events:
+                on_event(task, event)
+        except Exception as e:
+            # A broken progress consumer must not abort the running tool
+            logging.error(f"Progress callback failed for {tool} on {target}: {str(e)}")
+
+    result = run_tool(tool, target, on_line=on_line, wordlist=wordlist_path, ports=task.get("ports"),
+                      urls=task.get("urls"))
+    if wordlist_info:
+        result["wordlist"] = wordlist_info  # Name, content hash and shard for the report
+    with timed("parse"):
+        attach_findings(task, result)
+    offload_output(result)  # Keep only a reference to large raw output
+
+    # Only successful runs are worth reusing
+    if cache_key and result.get("status") == "success":
+        get_cache().put(cache_key, tool, result)
+    return result
+
+def merge_nmap_shards(target, outputs):
+    """
+    Merge the results of the shards of a target's nmap scan into one result,
+    with the findings and output handling of any other task result.
+    """
+    merged = merge_nmap_results(outputs)
+    attach_findings({"tool": "nmap", "target": target}, merged)
+    return offload_output(merged)
+
+def follow_up_tasks(task, event):
+    """
+    Work out which extra scanning tasks a single parsed event calls for.
+
+    Every open HTTP(S) service reported by nmap gets a gobuster follow-up,
+    whatever port it runs on. Follow-up tasks get a deterministic id, so the
+    same evidence seen twice (live while streaming and again in the final
+    result) queues them only once.
+
+    Args:
+        task (dict): The task that produced the event.
+        event (dict): A parsed output event (see agent.parsers).
+
+    Returns:
+        list: Task dictionaries to add to the scheduler.
+    """
+    if task["tool"] != "nmap" or event.get("type") != "port":
+        return []
+
+    record = PortRecord(**{field: event[field] for field in PortRecord._fields})
+    if record.state != "open" or not record.is_web():
+        return []
+
+    # Scan the named target, unless nmap was pointed at a range of hosts
+    host = record.host if "/" in task["target"] else task["target"]
+    scheme = record.url_scheme()
+    if (scheme, record.port) in (("http", 80), ("https", 443)):
+        url = f"{scheme}://{host}"
     else:
-        # Log an error if an unknown tool is specified
-        logging.error(f"Unknown tool specified: {tool}")
-        return {"status": "failed", "error": f"Unknown tool specified: {tool}"}
+        url = f"{scheme}://{host}:{record.port}"
+    return shard_task({"id": f"gobuster:{url}", "tool": "gobuster", "target": url})
 
-def run_agent(target):
+def schedule_follow_ups(task, output, scheduler, refresh=False, admit=None):
+    """
+    Queue extra scanning tasks based on the final result of a finished task.
+
+    Most follow-ups are already queued while the task is still streaming its
+    output; this pass over the parsed port records catches anything that was
+    not seen live. Follow-ups are added with a dependency on the task that
+    triggered them.
+
+    Args:
+        task (dict): The task that just finished.
+        output (dict): The result returned by execute_task for that task.
+        scheduler (TaskScheduler): The scheduler to add follow-up tasks to.
+        refresh (bool): Ignore cached results for the follow-up tasks.
+        admit (callable): Optional check ``(task) -> task or None`` a follow-up must
+            pass (e.g. ScanPlanner.admit); it may return a trimmed task.
+    """
+    for port in output.get("ports", []):
+        for follow_up in follow_up_tasks(task, dict(port, type="port")):
+            follow_up = admit(follow_up) if admit else follow_up
+            if follow_up is not None:
+                scheduler.add_task(dict(follow_up, refresh=refresh), depends_on=[task["id"]])
+
+def run_agent(target, save_report=True, on_event=None, refresh=False, scan_id=None, resume=False, report_sink=None,
+              execute=None, time_budget=None):
     """
     Main function that orchestrates the security scanning process.
 
-    - Generates a list of tasks for the given target.
-    - Executes each task sequentially.
-    - Dynamically adds new tasks based on results.
-    - Saves the final output as a JSON report.
+    - Generates a list of tasks for the given target and queues them longest
+      estimated critical path first (see agent.planner).
+    - With a time budget, trims or skips the tasks (follow-ups included) that
+      would not finish in time, and reports them under "plan".
+    - Executes independent tasks concurrently through the task scheduler.
+    - Dynamically adds new tasks as soon as their evidence shows up in a tool's output,
+      including the output of each nmap shard while the other shards still run.
+    - Merges the port records of a sharded nmap scan into one nmap result.
+    - Runs sqlmap once discovery is done, over the distinct endpoints gobuster
+      and ffuf found, batched into a few bulk sqlmap processes (see agent.endpoints).
+    - Records every task in an append-only journal so an interrupted scan can be resumed.
+    - Streams each task result into an NDJSON report as soon as it completes.
+    - Merges the findings of all tasks, so a path reported by both gobuster and ffuf appears once.
+    - Adds a timing summary to the report and updates the metrics file (METRICS_FILE).
 
     Args:
-        target (str): The domain or IP address to be scanned.
+        target (str): The domain or IP address to be scanned (ignored when resuming).
+        save_report (bool): Write a report for this scan to reports/scan_<scan_id>.ndjson.
+        on_event (callable): Optional callback ``(task, event)`` for live progress (see execute_task).
+        refresh (bool): Ignore cached tool results and re-run every tool.
+        scan_id (str): Id of the scan journal; a new id is generated if omitted.
+        resume (bool): Resume the scan `scan_id`, only running tasks that never completed.
+        report_sink (ReportSink): Shared report to write results to instead (used by batch mode).
+        execute (callable): Runs one task, ``(task, on_event=None) -> result``; defaults to
+            execute_task (the job service passes its shared worker pool instead).
+        time_budget (float): Seconds the scan may take; tasks estimated to end later are trimmed or skipped.
 
     Returns:
-        dict: A dictionary containing the results of the executed tasks.
+        dict: The results of the executed tasks as a list per tool name, plus the
+        deduplicated findings of the whole scan under "findings".
     """
-    # Generate an initial list of security tasks for the target
-    tasks = generate_tasks(target)
-    
-    if not tasks:
-        # If no tasks were generated (e.g., target is out of scope), log an error and return
-        logging.error("No tasks generated. The target might be out of scope.")
-        return {"error": "Target is out of scope or no valid tasks were generated."}
+    scan_id = scan_id or new_scan_id()
+    with log_context(scan_id=scan_id):  # Every record of the scan, its tasks included, carries the scan id
+        return _run_agent(target, save_report, on_event, refresh, scan_id, resume, report_sink, execute, time_budget)
+
+def _run_agent(target, save_report, on_event, refresh, scan_id, resume, report_sink, execute, time_budget):
+    """Run one scan inside its log context; see run_agent."""
+    journal = ScanJournal(scan_id)
+    planner = ScanPlanner(time_budget)
+    endpoints = EndpointSet()
+    if resume:
+        if not journal.exists():
+            logging.error(f"No journal found for scan {journal.scan_id}")
+            return {"error": f"No journal found for scan {journal.scan_id}"}
+        state = journal.load()
+        target = state["target"]
+        logging.info(f"Resuming scan {journal.scan_id} of {target}: {len(state['completed'])}/{len(state['tasks'])} tasks already completed")
+        # Injection testing never queued before the interruption still runs after discovery
+        injection_tasks = [] if any(task["tool"] == "sqlmap" for task in state["tasks"].values()) else \
+            [task for task in generate_tasks(target) if task["tool"] == "sqlmap"]
+    else:
+        # Generate an initial list of security tasks for the target
+        tasks = generate_tasks(target)
+
+        if not tasks:
+            # If no tasks were generated (e.g., target is out of scope), log an error and return
+            logging.error("No tasks generated. The target might be out of scope.")
+            return {"error": "Target is out of scope or no valid tasks were generated."}
+        tasks = planner.plan(tasks)
+        # sqlmap waits for discovery, so it can test the endpoints found rather than just the root
+        injection_tasks = [task for task in tasks if task["tool"] == "sqlmap"]
+        tasks = [task for task in tasks if task["tool"] != "sqlmap"]
+        journal.append("scan", target=target)
+        logging.info(f"Starting scan {journal.scan_id} of {target}")
     
+    def handle_event(task, event):
+        # Start follow-up scans the moment their evidence is streamed, rather
+        # than waiting for the parent tool to exit
+        for follow_up in follow_up_tasks(task, event):
+            follow_up = planner.admit(follow_up)
+            if follow_up is not None:
+                scheduler.add_task(dict(follow_up, refresh=refresh))
+        if on_event:
+            on_event(task, event)
+
+    # Results go to the caller's report, or to this scan's own report file
+    sink = report_sink
+    if sink is None and save_report:
+        sink = ReportSink(report_path(f"scan_{journal.scan_id}"))
+
+    findings = FindingIndex()
+    timings = []  # (task_id, tool, timing) of every finished task, for the timing summary
+
+    def handle_complete(task, output, scheduler):
+        # Journal the result before queueing follow-ups, so a crash in between
+        # still leaves the completed work on disk
+        journal.append("complete", task_id=task["id"], result=output)
+        findings.extend(findings_from_result(task, output))
+        timings.append((task["id"], task["tool"], output.get("timing", {})))
+        endpoints.add_result(task, output)
+        if sink:
+            sink.write(target, task["tool"], compact_result(task["tool"], output),
+                       scan_id=journal.scan_id, task_id=task["id"], task_target=task["target"])
+        schedule_follow_ups(task, output, scheduler, refresh=refresh, admit=planner.admit)
+
+    # The initial tasks are independent of each other; follow-ups are added
+    # as their evidence arrives
+    scheduler = TaskScheduler(
+        partial(execute or execute_task, on_event=handle_event),
+        on_complete=handle_complete,
+        on_enqueue=lambda task, depends_on: journal.append("enqueue", task=task, depends_on=depends_on),
+        on_start=lambda task: journal.append("start", task_id=task["id"])
+    )
+
+    if resume:
+        # Rebuild the finished part of the scan, then queue what never completed
+        for task_id, output in state["completed"].items():
+            if task_id in state["tasks"]:
+                scheduler.restore(state["tasks"][task_id], output)
+                findings.extend(findings_from_result(state["tasks"][task_id], output))
+                endpoints.add_result(state["tasks"][task_id], output)
+        for task_id, task in state["tasks"].items():
+            if task_id not in state["completed"]:
+                scheduler.add_task(task, depends_on=state["depends_on"][task_id])
+        # Queue follow-ups a crash may have prevented from being journaled
+        for task_id, output in state["completed"].items():
+            if task_id in state["tasks"]:
+                schedule_follow_ups(state["tasks"][task_id], output, scheduler, refresh=refresh, admit=planner.admit)
+    else:
+        for task in tasks:
+            scheduler.add_task(dict(task, refresh=refresh))
+
     results = {}  # Dictionary to store results of each task
+    nmap_shards = []
+    try:
+        if injection_tasks:
+            scheduler.run()  # Discovery, follow-ups included
+            for batch in batch_injection_tasks(injection_tasks, endpoints):
+                batch = planner.admit(batch) if "urls" in batch else batch  # The unbatched task was planned already
+                if batch is not None:
+                    scheduler.add_task(dict(batch, refresh=refresh))
+        for task, output in scheduler.run():
+            if task["tool"] == "nmap" and "shards" in task:
+                nmap_shards.append(output)  # Reported once merged; each shard is already in the report
+                continue
+            results.setdefault(task["tool"], []).append(output)  # Every task's output, in the order they were added
+        if nmap_shards:
+            results.setdefault("nmap", []).append(merge_nmap_shards(target, nmap_shards))
 
-    # Iterate over each generated task and execute it
-    for task in tasks:
-        output = execute_task(task)  # Run the corresponding security tool
-        results[task["tool"]] = output  # Store the output in results dictionary
-        
-        # Dynamically update tasks based on previous results
-        if task["tool"] == "nmap" and "open" in output.get("output", ""):
-            # If Nmap finds open ports, add extra scanning tasks
-            if "80/tcp" in output.get("output", ""):
-                tasks.append({"tool": "gobuster", "target": f"http://{target}"})  # Scan HTTP if port 80 is open
-            if "443/tcp" in output.get("output", ""):
-                tasks.append({"tool": "gobuster", "target": f"https://{target}"})  # Scan HTTPS if port 443 is open
-    
-    # Generate a timestamp for the report file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_filename = f"reports/final_report_{timestamp}.json"
+        # Where the time went, so the slow stage of each target can be found
+        summary = timing_summary(timings)
+        logging.info(f"Scan {journal.scan_id} timing: {summary['stage_totals']}, slowest stage {summary['slowest_stage']}")
+        if sink:
+            sink.write(target, "timing", {"status": "success", "summary": summary},
+                       scan_id=journal.scan_id, task_id=f"{journal.scan_id}:timing")
+            if time_budget is not None:
+                sink.write(target, "plan", {"status": "success", "plan": planner.summary()},
+                           scan_id=journal.scan_id, task_id=f"{journal.scan_id}:plan")
+        write_metrics()
+        if report_sink is None:
+            get_runtime_history().flush()  # Batches flush once, when all their targets are done
+    finally:
+        if sink is not None and sink is not report_sink:
+            sink.close()
+            logging.info(f"Report for scan {journal.scan_id} saved to {sink.path}")  # Log the report location
 
-    # Save the final scan results to a JSON file
-    with open(report_filename, "w") as f:
-        json.dump(results, f, indent=4)  # Pretty-print JSON data
-    
-    logging.info(f"Final report saved to {report_filename}")  # Log the report location
+    results["findings"] = findings.to_dicts()
+    if time_budget is not None:
+        results["plan"] = planner.summary()
+        logging.info(f"Scan {journal.scan_id} skipped {len(results['plan']['skipped'])} tasks and trimmed "
+                     f"{len(results['plan']['trimmed'])} to fit its {time_budget:.0f}s budget")
+    logging.info(f"Scan {journal.scan_id} found {len(findings)} distinct findings")
     return results  # Return the final results
\ No newline at end of file
@@ -0,0 +1,148 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import (AUDIT_LOG_FILE, AUDIT_LOG_LEVEL, AUDIT_LOG_MAX_BYTES, AUDIT_LOG_BACKUPS,
+                    AUDIT_LOG_QUEUE_SIZE, AUDIT_LOG_MAX_MESSAGE)
+from agent.blob_store import get_blob_store
+from agent.metrics import registry
+
+# Scan and task the current code runs for; stamped on every record logged meanwhile
+_log_fields = contextvars.ContextVar("log_fields", default={})
+
+# Attributes every LogRecord has; anything else was passed through `extra` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+@contextmanager
+def log_context(**fields):
+    """Add fields (scan_id, task_id, tool, target, ...) to every record logged inside the block."""
+    token = _log_fields.set({**_log_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_fields.reset(token)
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+
+    Messages longer than `max_message` characters are cut; the full text goes
+    to the blob store and the record carries a "message_ref" to it. Runs on
+    the writer thread, so storing the blob never delays the logging thread.
+    """
+
+    def __init__(self, max_message=AUDIT_LOG_MAX_MESSAGE):
+        super().__init__()
+        self.max_message = max_message
+
+    def format(self, record):
+        message = record.getMessage()
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+        }
+        data.update({name: value for name, value in vars(record).items() if name not in _RECORD_ATTRIBUTES})
+        if len(message) > self.max_message:
+            try:
+                data["message_ref"] = get_blob_store().put(message)
+            except OSError:
+                pass  # The cut message is still logged
+            message = message[:self.max_message] + "..."
+        data["message"] = message
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text[-self.max_message:]
+        return json.dumps(data, default=str)
+
+class _ContextFilter(logging.Filter):
+    """Copy the log context of the logging thread onto the record before it is queued."""
+
+    def filter(self, record):
+        for name, value in _log_fields.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+class _DroppingQueueHandler(QueueHandler):
+    """Queue records for the writer thread; when the queue is full, drop them instead of blocking."""
+
+    def prepare(self, record):
+        # Merge the arguments into the message now, while they are certain to be unchanged,
+        # but leave the formatting (and any blob store write) to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None  # Tracebacks hold frames; don't keep them alive in the queue
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            registry.inc("agent_log_records_dropped", level=record.levelname)
+
+_listener = None
+_handler = None
+_path = None
+_lock = threading.Lock()
+
+def configure_audit_log(path=None, level=None, max_bytes=None, backups=None, queue_size=None):
+    """
+    Send the process's log records to the audit log, off the calling threads.
+
+    Records are stamped with the current log context and put on a bounded
+    queue; a background thread formats them as JSON lines and writes them to
+    `path` (default AUDIT_LOG_FILE), rotating it at `max_bytes` and keeping
+    `backups` old files. Calling it again for the same path keeps the running
+    setup (the Streamlit app calls it on every rerun); another path replaces it.
+
+    Returns:
+        str: The path of the audit log.
+    """
+    global _listener, _handler, _path
+    path = path or AUDIT_LOG_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _lock:
+        if _listener is not None and _path == path:
+            return path
+        shutdown_audit_log()
+        _path = path
+        file_handler = RotatingFileHandler(
+            path, maxBytes=max_bytes or AUDIT_LOG_MAX_BYTES,
+            backupCount=AUDIT_LOG_BACKUPS if backups is None else backups, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonFormatter())
+        records = queue.Queue(maxsize=queue_size or AUDIT_LOG_QUEUE_SIZE)
+        _handler = _DroppingQueueHandler(records)
+        _handler.addFilter(_ContextFilter())
+        _listener = QueueListener(records, file_handler)
+        _listener.start()
+
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(level or AUDIT_LOG_LEVEL)
+    return path
+
+def shutdown_audit_log():
+    """Write out the queued records and detach the audit log."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()  # Drains the queue first
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(shutdown_audit_log)
@@ -0,0 +1,215 @@
+import ipaddress
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import BATCH_WORKERS
+from agent.agent_graph import run_agent
+from agent.cost_model import get_runtime_history
+from agent.task_manager import is_within_scope
+from agent.journal import ScanJournal, new_scan_id
+from agent.report_sink import ReportSink, report_path
+
+def parse_network(entry):
+    """Return the network of a CIDR entry such as "10.0.0.0/24", or None if the entry is not a CIDR block."""
+    if "/" in entry and "://" not in entry:
+        try:
+            return ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            return None
+    return None
+
+def expand_entry(entry):
+    """
+    Expand a single target entry into individual targets.
+
+    A CIDR block (e.g. "10.0.0.0/24") expands to its usable host addresses;
+    anything else (domain, IP or URL) is returned unchanged.
+
+    Args:
+        entry (str): A domain, IP address, URL or CIDR block.
+
+    Yields:
+        str: Individual targets.
+    """
+    network = parse_network(entry)
+    if network is None:
+        yield entry
+    elif network.num_addresses == 1:
+        yield str(network.network_address)
+    else:
+        for host in network.hosts():
+            yield str(host)
+
+def read_entries(source):
+    """
+    Return the entries of a batch source, without expanding CIDR blocks.
+
+    Args:
+        source (str | list): A path to a target file (one entry per line,
+            "#" starts a comment), a single CIDR block or target, or a list of entries.
+
+    Returns:
+        list: The non-blank entries, stripped of comments and whitespace.
+    """
+    if isinstance(source, str):
+        if os.path.isfile(source):
+            with open(source, "r") as f:
+                entries = [line.split("#", 1)[0] for line in f]
+        else:
+            entries = [source]
+    else:
+        entries = list(source)
+    return [entry.strip() for entry in entries if entry.strip()]
+
+def in_ranges(target, ranges):
+    """Whether `target` is an IP address in one of the (first, last) address ranges."""
+    try:
+        address = ipaddress.ip_address(target)
+    except ValueError:
+        return False  # A domain or URL
+    return any(first.version == address.version and first <= address <= last for first, last in ranges)
+
+def iter_targets(source):
+    """
+    Lazily expand a batch source into unique targets.
+
+    CIDR blocks are expanded one address at a time, so a /8 never sits in
+    memory as a list. Duplicates are dropped without remembering every
+    expanded address: an address is skipped if it was listed on its own
+    before or lies in the host range of a block that was already expanded.
+
+    Args:
+        source (str | list): See read_entries.
+
+    Yields:
+        str: Unique targets in the order they are first seen.
+    """
+    seen = set()  # Targets listed on their own
+    ranges = []  # (first, last) host of each CIDR block already expanded
+    for entry in read_entries(source):
+        network = parse_network(entry)
+        if network is None or network.num_addresses == 1:
+            target = entry if network is None else str(network.network_address)
+            if target not in seen and not in_ranges(target, ranges):
+                seen.add(target)
+                yield target
+            continue
+        # Only the blocks overlapping this one can cover its hosts
+        covering = [(first, last) for first, last in ranges if first.version == network.version
+                    and first <= network.broadcast_address and last >= network.network_address]
+        first = last = None
+        for host in network.hosts():
+            if first is None:
+                first = host
+            last = host
+            target = str(host)
+            if target in seen or any(start <= host <= end for start, end in covering):
+                continue
+            yield target
+        if first is not None:
+            ranges.append((first, last))
+
+def expand_targets(source):
+    """
+    Expand a batch source into a deduplicated list of targets.
+
+    Args:
+        source (str | list): See read_entries.
+
+    Returns:
+        list: Unique targets in the order they were first seen.
+    """
+    return list(iter_targets(source))
+
+def run_batch(source, workers=BATCH_WORKERS, report_filename=None, refresh=False, batch_id=None, resume=False):
+    """
+    Scan many targets through a bounded pool of workers.
+
+    - Expands the source into individual targets as they are needed and drops out-of-scope ones.
+    - Runs up to `workers` targets at a time, each through run_agent; only a few
+      more are queued ahead, so a large CIDR block is never held in memory.
+    - Streams every task result into one combined NDJSON report as soon as it completes.
+    - Journals which targets finished, so an interrupted batch can be resumed.
+
+    Args:
+        source (str | list): Target file, CIDR block, single target or list of entries (ignored when resuming).
+        workers (int): Maximum number of targets scanned at once.
+        report_filename (str): Path of the combined report; defaults to reports/batch_<batch_id>.ndjson.
+        refresh (bool): Ignore cached tool results and re-run every tool.
+        batch_id (str): Id of the batch journal; a new id is generated if omitted.
+        resume (bool): Resume the batch `batch_id`: finished targets are skipped
+            and interrupted target scans continue where they stopped.
+
+    Returns:
+        dict: Summary with the batch id, the report path and the completed, failed and skipped targets.
+            A target whose scan returned an error (e.g. no valid tasks) counts as failed.
+    """
+    journal = ScanJournal(batch_id or new_scan_id())
+    if resume:
+        state = journal.load_batch()
+        report_filename = state["report"]
+        entries = state["entries"]
+        scan_ids = state["scan_ids"]
+        done = state["done"]
+        logging.info(f"Resuming batch {journal.scan_id}: {len(done)} targets already finished")
+    else:
+        # Journal the entries rather than their expansion; resuming expands them again
+        entries = read_entries(source)
+        if report_filename is None:
+            report_filename = report_path(f"batch_{journal.scan_id}")
+        journal.append("batch", entries=entries, report=report_filename)
+        scan_ids = {}
+        done = set()
+
+    summary = {"batch_id": journal.scan_id, "report": report_filename, "completed": [], "failed": [], "skipped": []}
+
+    def scan_target(target, scan_id, sink):
+        # Continue the target's own scan if it had already started
+        resume_scan = ScanJournal(scan_id).exists()
+        return run_agent(target, refresh=refresh, scan_id=scan_id, resume=resume_scan, report_sink=sink)
+
+    def finish(future, target, sink):
+        try:
+            result = future.result()
+            error = result.get("error") if isinstance(result, dict) else None
+        except Exception as e:
+            error = str(e)
+        if error:
+            logging.error(f"Batch scan of {target} failed: {error}")
+            sink.write(target, "agent", {"status": "failed", "error": error})
+            summary["failed"].append(target)
+        else:
+            summary["completed"].append(target)
+        journal.append("target_done", target=target)
+
+    workers = max(1, workers)
+    logging.info(f"Starting batch scan {journal.scan_id} with {workers} workers")
+    with ReportSink(report_filename) as sink, ThreadPoolExecutor(max_workers=workers) as pool:
+        summary["report"] = sink.path
+        pending = {}
+        for i, target in enumerate(iter_targets(entries)):
+            if target in done:
+                continue  # Finished before the batch was interrupted
+            if not is_within_scope(target):
+                summary["skipped"].append(target)
+                continue
+            scan_id = scan_ids.get(target)
+            if scan_id is None:
+                scan_id = f"{journal.scan_id}-{i}"
+                journal.append("target", target=target, scan_id=scan_id)
+            pending[pool.submit(scan_target, target, scan_id, sink)] = target
+
+            # Each task result is written to the report by run_agent as it
+            # completes; here we only keep track of finished targets
+            while len(pending) >= 2 * workers:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(future, pending.pop(future), sink)
+        for future in wait(pending).done:
+            finish(future, pending[future], sink)
+
+    get_runtime_history().flush()
+    if summary["skipped"]:
+        logging.warning(f"Skipped {len(summary['skipped'])} out-of-scope targets")
+    logging.info(f"Batch report saved to {sink.path}")
+    return summary
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from config import BLOB_DIR, BLOB_INLINE_BYTES, BLOB_MAX_BYTES
+
+class BlobStore:
+    """
+    Content-addressed store for raw tool output on local disk.
+
+    A blob is stored once under its SHA-256 (`<directory>/<first 2 hex>/<sha256>`),
+    so identical outputs share one file. Callers keep only the small handle
+    returned by put() - {"sha256": ..., "size": ...} - and read the content
+    back when it is actually needed.
+
+    Like the result cache, the store is bounded: a blob's modification time
+    is bumped whenever it is stored or read, and the least recently used
+    blobs are removed once the store grows past `max_bytes`. Readers treat a
+    removed blob as gone (get() returns None), and cached results whose blob
+    was removed count as cache misses.
+
+    Args:
+        directory (str): Directory holding the blobs.
+        max_bytes (int): Upper bound on the total size of all blobs.
+    """
+
+    def __init__(self, directory=BLOB_DIR, max_bytes=BLOB_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._blobs = OrderedDict()  # sha256 -> size in bytes, least recently used first
+        self._total = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+        existing = []
+        for prefix in os.listdir(self.directory):
+            subdirectory = os.path.join(self.directory, prefix)
+            if len(prefix) != 2 or not os.path.isdir(subdirectory):
+                continue
+            for name in os.listdir(subdirectory):
+                if not name.endswith(".tmp"):
+                    stat = os.stat(os.path.join(subdirectory, name))
+                    existing.append((stat.st_mtime, name, stat.st_size))
+        for _, digest, size in sorted(existing):
+            self._blobs[digest] = size
+            self._total += size
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _touch(self, digest, size):
+        """Record that a blob was stored or read, and remove the least recently used blobs past max_bytes."""
+        with self._lock:
+            self._total -= self._blobs.pop(digest, 0)
+            self._blobs[digest] = size
+            self._total += size
+            try:
+                os.utime(self._path(digest))
+            except FileNotFoundError:
+                pass
+            while self._total > self.max_bytes and len(self._blobs) > 1:
+                oldest, oldest_size = self._blobs.popitem(last=False)
+                self._total -= oldest_size
+                logging.info(f"Removing least recently used blob {oldest}")
+                try:
+                    os.remove(self._path(oldest))
+                except FileNotFoundError:
+                    pass  # Already removed by another process
+
+    def put(self, data):
+        """
+        Store a blob (str or bytes) and return its handle.
+
+        Returns:
+            dict: {"sha256": hex digest of the content, "size": size in bytes}
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8", errors="replace")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)  # Atomic, readers never see partial blobs
+        self._touch(digest, len(data))
+        return {"sha256": digest, "size": len(data)}
+
+    def put_file(self, source, chunk_size=1024 * 1024):
+        """
+        Store the rest of a binary file object as a blob, copying it in chunks.
+
+        Unlike put(), the content is never held in memory as a whole.
+
+        Returns:
+            dict: {"sha256": hex digest of the content, "size": size in bytes}
+        """
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.directory, f"incoming.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: source.read(chunk_size), b""):
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+        path = self._path(digest.hexdigest())
+        if os.path.exists(path):
+            os.remove(tmp_path)  # Already stored
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        self._touch(digest.hexdigest(), size)
+        return {"sha256": digest.hexdigest(), "size": size}
+
+    def exists(self, handle):
+        return os.path.exists(self._path(handle["sha256"]))
+
+    def open(self, handle):
+        """Open a blob for reading (binary), marking it as recently used."""
+        f = open(self._path(handle["sha256"]), "rb")
+        self._touch(handle["sha256"], handle.get("size", 0))
+        return f
+
+    def get(self, handle):
+        """
+        Read a blob back as text.
+
+        Returns:
+            str: The content, or None if the blob is no longer on disk.
+        """
+        try:
+            with self.open(handle) as f:
+                return f.read().decode("utf-8", errors="replace")
+        except FileNotFoundError:
+            return None
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_blob_store():
+    """Return the process-wide blob store, creating it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = BlobStore()
+        return _default_store
+
+def offload_output(result, inline_bytes=BLOB_INLINE_BYTES):
+    """
+    Move a large raw "output" out of a result and into the blob store.
+
+    The result keeps an "output_ref" handle instead, so results passed
+    between tasks, journaled, cached and reported stay small. Outputs up to
+    `inline_bytes` (short messages, compact tables) stay inline.
+
+    Returns:
+        dict: The same result, modified in place.
+    """
+    output = result.get("output")
+    if isinstance(output, str) and len(output) > inline_bytes:
+        result["output_ref"] = get_blob_store().put(output)
+        del result["output"]
+    return result
+
+def load_output(result):
+    """
+    Return the raw output of a result, reading it from the blob store if it was offloaded.
+
+    Returns:
+        str: The output, "" if the result has none, or None if its blob is missing.
+    """
+    if "output_ref" in result:
+        return get_blob_store().get(result["output_ref"])
+    return result.get("output", "")
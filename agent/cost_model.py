@@ -0,0 +1,191 @@
+import atexit
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+from agent.task_manager import extract_host, parse_port_spec
+from agent.result_cache import normalize_target
+from agent.wordlists import get_registry
+from config import RUNTIME_HISTORY_FILE, RUNTIME_HISTORY_WEIGHT, RUNTIME_HISTORY_FLUSH_SECONDS, DEFAULT_TASK_ESTIMATES, DEFAULT_WORDLIST
+
+# Ports nmap scans when it is given no port list (its default top ports)
+NMAP_DEFAULT_PORTS = 1000
+
+# Estimated duration of a tool that has neither history nor a configured estimate
+FALLBACK_ESTIMATE = 60.0
+
+def target_class(target):
+    """
+    Classify a target for the runtime history.
+
+    Returns:
+        str: "network" (CIDR range), "ip" or "domain", prefixed with the URL
+        scheme for web targets (e.g. "https:domain").
+    """
+    scheme = target.split("://", 1)[0].lower() if "://" in target else ""
+    if not scheme and "/" in target:
+        kind = "network"
+    else:
+        try:
+            ipaddress.ip_address(extract_host(target))
+            kind = "ip"
+        except ValueError:
+            kind = "domain"
+    return f"{scheme}:{kind}" if scheme else kind
+
+def work_units(task):
+    """
+    Size of a task's work, which its duration is taken to be proportional to.
+
+    Ports times hosts for nmap, wordlist entries (of the task's shard, after
+    any "wordlist_limit") for gobuster/ffuf, URLs for a batched sqlmap run,
+    and 1 for other tools.
+
+    Returns:
+        int: The number of units, or None if it can't be told (unknown wordlist, bad port list).
+    """
+    tool = task["tool"]
+    if tool == "nmap":
+        try:
+            ports = len(parse_port_spec(task["ports"])) if task.get("ports") else NMAP_DEFAULT_PORTS
+        except ValueError:
+            return None
+        hosts = 1
+        if "/" in task["target"]:
+            try:
+                hosts = ipaddress.ip_network(task["target"], strict=False).num_addresses
+            except ValueError:
+                pass
+        return ports * hosts
+    if tool in ("gobuster", "ffuf"):
+        try:
+            wordlist = get_registry().get(task.get("wordlist", DEFAULT_WORDLIST))
+        except KeyError:
+            return None
+        start, stop = wordlist.shard_bounds(task.get("shard", 0), task.get("shards", 1), task.get("wordlist_limit"))
+        return stop - start
+    if tool == "sqlmap" and task.get("urls"):
+        return len(task["urls"])
+    return 1
+
+class RuntimeHistory:
+    """
+    Persistent per-(tool, target) and per-(tool, target class) runtime history.
+
+    Each key keeps a moving average of the duration of successful runs and of
+    the duration per work unit (see work_units), so a run over a trimmed or
+    sharded wordlist still informs the estimate for the full list. The
+    history is one JSON file. Recorded runs update the in-memory history at
+    once and are written out at most every `flush_interval` seconds (and by
+    flush()); writing merges them into what other processes recorded in the
+    meantime rather than overwriting it.
+
+    Args:
+        path (str): The history file.
+        weight (float): Weight of the latest run in the moving averages.
+        flush_interval (float): Seconds between writes of the history file.
+    """
+
+    def __init__(self, path=RUNTIME_HISTORY_FILE, weight=RUNTIME_HISTORY_WEIGHT, flush_interval=RUNTIME_HISTORY_FLUSH_SECONDS):
+        self.path = path
+        self.weight = weight
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._pending = []  # (task, seconds, units) of runs not yet written
+        self._flushed = time.monotonic()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logging.warning(f"Ignoring unreadable runtime history {self.path}: {str(e)}")
+            return {}
+
+    def _average(self, previous, value):
+        """Exponential moving average; the first value starts it."""
+        return value if previous is None else previous + self.weight * (value - previous)
+
+    @staticmethod
+    def _keys(task):
+        """History keys of a task, the most specific first."""
+        tool = task["tool"]
+        return [f"{tool}|{normalize_target(task['target'])}", f"{tool}|class:{target_class(task['target'])}"]
+
+    def _apply(self, entries, task, seconds, units):
+        for key in self._keys(task):
+            entry = entries.setdefault(key, {"runs": 0})
+            entry["runs"] += 1
+            entry["seconds"] = self._average(entry.get("seconds"), seconds)
+            if units:
+                entry["per_unit"] = self._average(entry.get("per_unit"), seconds / units)
+
+    def record(self, task, seconds):
+        """Fold the duration of a successful run of `task` into its history."""
+        units = work_units(task)
+        with self._lock:
+            self._apply(self._entries, task, seconds, units)
+            self._pending.append((task, seconds, units))
+            due = time.monotonic() - self._flushed >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the runs recorded since the last flush to the history file."""
+        with self._lock:
+            if not self._pending:
+                return
+            entries = self._load()  # Pick up what other processes recorded
+            for task, seconds, units in self._pending:
+                self._apply(entries, task, seconds, units)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+            self._entries = entries
+            self._pending = []
+            self._flushed = time.monotonic()
+
+    def stats(self, task):
+        """Return the history of the task's target, else of its target class, else None."""
+        with self._lock:
+            return next((self._entries[key] for key in self._keys(task) if key in self._entries), None)
+
+    def estimate(self, task):
+        """
+        Estimate how long a task will run, in seconds.
+
+        Uses the task's own history where there is some, then that of its
+        target class, then DEFAULT_TASK_ESTIMATES; estimates scale with the
+        task's work units, so a trimmed wordlist scan is estimated shorter.
+        """
+        units = work_units(task)
+        stats = self.stats(task)
+        if stats and stats.get("per_unit") is not None and units is not None:
+            return stats["per_unit"] * units
+        seconds = stats["seconds"] if stats else DEFAULT_TASK_ESTIMATES.get(task["tool"], FALLBACK_ESTIMATE)
+        if task.get("wordlist_limit") is not None and units is not None:
+            full = work_units({key: value for key, value in task.items() if key != "wordlist_limit"})
+            if full:
+                seconds *= units / full
+        return seconds
+
+_default_history = None
+_default_history_lock = threading.Lock()
+
+def get_runtime_history():
+    """Return the process-wide runtime history, loading it on first use."""
+    global _default_history
+    with _default_history_lock:
+        if _default_history is None:
+            _default_history = RuntimeHistory()
+            atexit.register(_default_history.flush)  # Runs recorded since the last flush
+        return _default_history
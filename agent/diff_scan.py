@@ -0,0 +1,266 @@
+import glob
+import logging
+import os
+from agent.agent_graph import execute_task, follow_up_tasks, merge_nmap_shards
+from agent.task_manager import generate_tasks, extract_host
+from agent.findings import Finding, FindingIndex, findings_from_result, compact_result, url_location
+from agent.journal import new_scan_id
+from agent.report_sink import ReportSink, ReportReader, report_path, report_dir
+from agent.scheduler import TaskScheduler
+from agent.metrics import write_metrics
+from agent.cost_model import get_runtime_history
+from agent.audit_log import log_context
+from agent.endpoints import EndpointSet, batch_injection_tasks
+
+# Report records that are not tool results
+SUMMARY_TOOLS = ("timing", "delta", "plan")
+
+# Port details that, when they change, make a service count as changed
+SERVICE_FIELDS = ("service", "tunnel", "product")
+
+def find_baseline(target, directory=None, exclude=()):
+    """
+    Find the most recent report with results for `target` (in report_dir() by default).
+
+    Both single-target (scan_*) and batch (batch_*) reports are searched.
+
+    Returns:
+        str: Path of the report, or None if no report covers the target.
+    """
+    directory = report_dir() if directory is None else directory
+    paths = [path for path in glob.glob(os.path.join(directory, "*.ndjson*"))
+             if not path.endswith(".idx") and os.path.exists(f"{path}.idx") and path not in exclude]
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        if target in ReportReader(path).targets():
+            return path
+    return None
+
+def load_baseline(path, target):
+    """
+    Read the tool results a report holds for `target`.
+
+    Returns:
+        list: Report records ({"tool", "task_target", "result", ...}) of the tool results.
+    """
+    return [record for record in ReportReader(path).read(target) if record["tool"] not in SUMMARY_TOOLS]
+
+def record_findings(records):
+    """Merge the findings of report records into one index."""
+    return FindingIndex(
+        Finding.from_dict(data)
+        for record in records
+        for data in record["result"].get("findings", [])
+    )
+
+def services(findings):
+    """Map each open port to its service details: (host, port) -> {service, tunnel, product}."""
+    return {
+        (finding.host, finding.port): {name: finding.detail.get(name, "") for name in SERVICE_FIELDS}
+        for finding in findings if finding.kind == "port"
+    }
+
+def diff_services(before, after):
+    """Compare two service maps (see services())."""
+    return {
+        "added": sorted(set(after) - set(before)),
+        "removed": sorted(set(before) - set(after)),
+        "changed": sorted(key for key in set(before) & set(after) if before[key] != after[key]),
+    }
+
+def diff_findings(before, after):
+    """
+    Compare two sets of findings by (host, port, path, status).
+
+    Returns:
+        dict: "added" and "removed" findings (as dicts) and the number left "unchanged".
+    """
+    before = {finding.key: finding for finding in before}
+    after = {finding.key: finding for finding in after}
+    return {
+        "added": [finding.to_dict() for key, finding in after.items() if key not in before],
+        "removed": [finding.to_dict() for key, finding in before.items() if key not in after],
+        "unchanged": len(before.keys() & after.keys()),
+    }
+
+def changed_services(service_delta, target):
+    """
+    Return the (host, port) of every service added or changed, named as the web tasks' URLs name them.
+
+    For a single named target nmap reports the host by address, while the
+    web tools scan the name (see follow_up_tasks), so the target's host
+    stands in; for a range of hosts each service keeps its own address.
+    """
+    named = None if "/" in target else extract_host(target).lower()
+    return {(named or host, port) for host, port in service_delta["added"] + service_delta["changed"]}
+
+def plan_rescan(web_tasks, changed, previous):
+    """
+    Split the web tasks into tasks to run and previous records to carry forward.
+
+    A task is re-run when the service its URL points to is new or changed, or
+    when the previous report has no successful result for it. Otherwise its
+    previous results (all shards included) are reused as they are.
+
+    Args:
+        web_tasks (list): Web tool tasks the full pipeline would run now.
+        changed (set): (host, port) of the services added or changed (see changed_services).
+        previous (list): Records of the previous report.
+
+    Returns:
+        tuple: (tasks to run, records to carry forward)
+    """
+    previous_by_task = {}
+    for record in previous:
+        if record["result"].get("status") == "success":
+            previous_by_task.setdefault((record["tool"], record.get("task_target")), []).append(record)
+
+    run, carried = [], []
+    reuse = {}  # (tool, target) -> carry forward; decided once for all shards of a task
+    for task in web_tasks:
+        key = (task["tool"], task["target"])
+        if key not in reuse:
+            host, port, _ = url_location(task["target"])
+            reuse[key] = (host, port) not in changed and key in previous_by_task
+            if reuse[key]:
+                carried.extend(previous_by_task[key])
+        if not reuse[key]:
+            run.append(task)
+    return run, carried
+
+def run_diff_scan(target, baseline=None, save_report=True, refresh=False, scan_id=None, on_event=None):
+    """
+    Re-scan a target, re-running expensive tools only where its services changed.
+
+    - Loads the latest report for the target (or `baseline`).
+    - Runs a fresh nmap pass (all of its shards) and compares its open services with the previous ones.
+    - Re-runs gobuster/ffuf/sqlmap only for web services that are new or changed
+      (or that have no usable previous result); the previous results of
+      unchanged services are carried forward into the new report. A re-run
+      sqlmap tests the endpoints the scan's gobuster/ffuf results hold, in batches.
+    - Adds a delta of the services and findings added or removed since the
+      previous report, as a "delta" record in the report and under "delta".
+
+    Without a previous report this is a normal full scan of every web service
+    nmap finds, and everything counts as added.
+
+    Args:
+        target (str): The domain or IP address to re-scan.
+        baseline (str): Report to compare against; the latest report for the target if omitted.
+        save_report (bool): Write the new report to reports/scan_<scan_id>.ndjson.
+        refresh (bool): Ignore cached results for the tools that are re-run.
+        scan_id (str): Id of the new scan; generated if omitted.
+        on_event (callable): Optional callback ``(task, event)`` for live progress (see execute_task).
+
+    Returns:
+        dict: Results per tool name (re-run and carried forward), the scan's
+        "findings", the "delta" and the "baseline" report used.
+    """
+    scan_id = scan_id or new_scan_id()
+    with log_context(scan_id=scan_id):
+        return _run_diff_scan(target, baseline, save_report, refresh, scan_id, on_event)
+
+def _run_diff_scan(target, baseline, save_report, refresh, scan_id, on_event):
+    """Run one differential re-scan inside its log context; see run_diff_scan."""
+    tasks = generate_tasks(target)
+    if not tasks:
+        logging.error("No tasks generated. The target might be out of scope.")
+        return {"error": "Target is out of scope or no valid tasks were generated."}
+
+    baseline = baseline or find_baseline(target)
+    previous = load_baseline(baseline, target) if baseline else []
+    baseline_scan_id = next((record.get("scan_id") for record in previous if record.get("scan_id")), None)
+    logging.info(f"Differential scan {scan_id} of {target} against {baseline or 'no previous report'}")
+
+    sink = ReportSink(report_path(f"scan_{scan_id}")) if save_report else None
+    results = {}
+    findings = FindingIndex()
+    endpoints = EndpointSet()
+
+    def record(task, result, **fields):
+        results.setdefault(task["tool"], []).append(result)
+        findings.extend(findings_from_result(task, result))
+        endpoints.add_result(task, result)
+        if sink:
+            sink.write(target, task["tool"], compact_result(task["tool"], result), scan_id=scan_id,
+                       task_id=task["id"], task_target=task["target"], **fields)
+
+    try:
+        # The quick pass: nmap (every shard of it) always runs fresh, and its services decide what else runs
+        nmap_scheduler = TaskScheduler(
+            lambda task: execute_task(task, on_event=on_event),
+            on_complete=lambda task, result, scheduler: record(task, result)
+        )
+        for task in tasks:
+            if task["tool"] == "nmap":
+                task_id = f"nmap#{task['shard'] + 1}/{task['shards']}" if "shard" in task else "nmap"
+                nmap_scheduler.add_task(dict(task, id=task_id, refresh=True))
+        nmap_runs = nmap_scheduler.run()
+        if len(nmap_runs) > 1:
+            results["nmap"] = [merge_nmap_shards(target, [result for _, result in nmap_runs])]
+        nmap_result = results["nmap"][0]
+        service_delta = diff_services(services(record_findings(previous)), services(findings))
+
+        # The web tasks of a full scan: the default ones plus a gobuster per web service found
+        web_tasks = {}
+        follow_ups = [follow_up for nmap_task, result in nmap_runs for port in result.get("ports", [])
+                      for follow_up in follow_up_tasks(nmap_task, dict(port, type="port"))]
+        for task in [task for task in tasks if task["tool"] != "nmap"] + follow_ups:
+            task_id = task.get("id") or f"{task['tool']}:{task['target']}"
+            if "shard" in task and "#" not in task_id:
+                task_id += f"#{task['shard'] + 1}/{task['shards']}"
+            web_tasks.setdefault(task_id, dict(task, id=task_id))
+        web_tasks = list(web_tasks.values())
+
+        if nmap_result.get("status") == "success":
+            to_run, carried = plan_rescan(web_tasks, changed_services(service_delta, target), previous)
+        else:
+            # Without fresh services nothing can be compared; re-run everything
+            logging.warning(f"Nmap failed for {target}, re-running every web tool")
+            to_run, carried = web_tasks, []
+        logging.info(f"Differential scan {scan_id}: re-running {len(to_run)} tasks, carrying forward {len(carried)} results")
+
+        for previous_record in carried:
+            task = {"id": previous_record.get("task_id") or previous_record["tool"], "tool": previous_record["tool"],
+                    "target": previous_record.get("task_target") or target}
+            record(task, dict(previous_record["result"], carried_forward=True), carried_from=previous_record.get("scan_id"))
+
+        # sqlmap runs last, over the endpoints of the re-run and the carried-forward results
+        injection_tasks = [task for task in to_run if task["tool"] == "sqlmap"]
+        to_run = [task for task in to_run if task["tool"] != "sqlmap"]
+        scheduler = TaskScheduler(
+            lambda task: execute_task(task, on_event=on_event),
+            on_complete=lambda task, result, scheduler: record(task, result)
+        )
+        for task in to_run:
+            scheduler.add_task(dict(task, refresh=refresh))
+        scheduler.run()
+        if injection_tasks:
+            batches = batch_injection_tasks(injection_tasks, endpoints)
+            for task in batches:
+                scheduler.add_task(dict(task, refresh=refresh))
+            scheduler.run()
+            to_run += batches
+
+        delta = {
+            "baseline": baseline,
+            "baseline_scan_id": baseline_scan_id,
+            "services": {name: [{"host": host, "port": port} for host, port in keys] for name, keys in service_delta.items()},
+            "findings": diff_findings(record_findings(previous), findings),
+            "rerun": sorted(task["id"] for task in to_run),
+            "carried_forward": len(carried),
+        }
+        if sink:
+            sink.write(target, "delta", {"status": "success", "delta": delta}, scan_id=scan_id, task_id=f"{scan_id}:delta")
+        write_metrics()
+        get_runtime_history().flush()
+    finally:
+        if sink is not None:
+            sink.close()
+            logging.info(f"Report for scan {scan_id} saved to {sink.path}")
+
+    logging.info(f"Differential scan {scan_id}: {len(delta['findings']['added'])} findings added, "
+                 f"{len(delta['findings']['removed'])} removed")
+    results["findings"] = findings.to_dicts()
+    results["delta"] = delta
+    results["baseline"] = baseline
+    return results
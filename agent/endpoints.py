@@ -0,0 +1,127 @@
+import logging
+import re
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl
+from agent.findings import findings_from_result, DEFAULT_PORTS
+from config import SQLMAP_BATCH_SIZE, SQLMAP_MAX_ENDPOINTS
+
+def is_testable(status):
+    """Whether a page with this HTTP status is worth testing for injection (not missing, forbidden or failing)."""
+    return status is not None and 200 <= int(status) < 400
+
+def endpoint_signature(url):
+    """
+    Identify an endpoint by what sqlmap would test on it.
+
+    Scheme and host are case-insensitive, the default port and a trailing
+    "/" don't count, and of the query only the parameter names do, so
+    "/item.php?id=1" and "/item.php?id=2" are the same endpoint.
+
+    Returns:
+        tuple: (scheme, host, port, path, sorted parameter names)
+    """
+    parts = urlsplit(url if "://" in url else f"https://{url}")
+    scheme = parts.scheme.lower()
+    path = re.sub("/+", "/", parts.path).rstrip("/") or "/"
+    names = sorted({name for name, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    return scheme, (parts.hostname or "").lower(), parts.port or DEFAULT_PORTS.get(scheme), path, tuple(names)
+
+def endpoint_urls(task, result):
+    """
+    Return the URLs of the pages a finished gobuster or ffuf task discovered.
+
+    ffuf hits keep their full URL (query included); gobuster paths, and the
+    findings of results read back from a report (which keep no raw hits), are
+    resolved against the task's target. Pages that answered with an error
+    status are left out.
+    """
+    if result.get("status") != "success":
+        return []
+    if task["tool"] == "ffuf" and "hits" in result:
+        return [hit["url"] for hit in result["hits"] if is_testable(hit.get("status"))]
+    if task["tool"] in ("gobuster", "ffuf"):
+        parts = urlsplit(task["target"])
+        return [urlunsplit((parts.scheme, parts.netloc, finding.path, "", ""))
+                for finding in findings_from_result(task, result)
+                if finding.kind == "path" and is_testable(finding.status)]
+    return []
+
+class EndpointSet:
+    """
+    The distinct endpoints a scan discovered, for injection testing.
+
+    URLs are deduplicated by endpoint_signature, keeping the first URL seen
+    for each endpoint. Thread-safe, so tasks can add their URLs as they finish.
+    """
+
+    def __init__(self):
+        self._urls = {}  # signature -> first URL seen
+        self._lock = threading.Lock()
+
+    def add(self, url):
+        with self._lock:
+            self._urls.setdefault(endpoint_signature(url), url)
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def add_result(self, task, result):
+        """Add the URLs discovered by a finished task (see endpoint_urls)."""
+        self.update(endpoint_urls(task, result))
+
+    def urls(self, seed=None, limit=SQLMAP_MAX_ENDPOINTS):
+        """
+        Return up to `limit` endpoint URLs: `seed` first, then the endpoints
+        with query parameters, then the rest, each in discovery order.
+        """
+        with self._lock:
+            endpoints = dict(self._urls)
+        ordered = [seed] if seed else []
+        skip = {endpoint_signature(seed)} if seed else set()
+        ordered += [url for signature, url in endpoints.items() if signature[4] and signature not in skip]
+        ordered += [url for signature, url in endpoints.items() if not signature[4] and signature not in skip]
+        return ordered[:limit]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._urls)
+
+def batch_injection_tasks(tasks, endpoints, batch_size=SQLMAP_BATCH_SIZE):
+    """
+    Replace sqlmap tasks held back until discovery finished with batches over the endpoints found.
+
+    Args:
+        tasks (list): The held-back sqlmap tasks.
+        endpoints (EndpointSet): The endpoints the scan discovered.
+
+    Returns:
+        list: The batch tasks (see batch_sqlmap_tasks).
+    """
+    batches = []
+    for task in tasks:
+        urls = endpoints.urls(seed=task["target"])
+        logging.info(f"Testing {len(urls)} distinct endpoints of {task['target']} for SQL injection")
+        batches.extend(batch_sqlmap_tasks(task, urls, batch_size))
+    return batches
+
+def batch_sqlmap_tasks(task, urls, batch_size=SQLMAP_BATCH_SIZE):
+    """
+    Split the endpoints of a sqlmap task into tasks of up to `batch_size` URLs each.
+
+    Each batch runs as one sqlmap process over a bulk file of its URLs (see
+    run_sqlmap). When there is nothing to test but the task's own target,
+    the task is returned unchanged.
+
+    Returns:
+        list: Task dictionaries; batch tasks carry the "urls" they test.
+    """
+    if not urls or list(urls) == [task["target"]]:
+        return [task]
+    batch_size = max(1, batch_size)
+    batches = [list(urls[start:start + batch_size]) for start in range(0, len(urls), batch_size)]
+    base_id = task.get("id") or f"sqlmap:{task['target']}"
+    if len(batches) == 1:
+        return [dict(task, id=base_id, urls=batches[0])]
+    return [dict(task, id=f"{base_id}#{number}/{len(batches)}", urls=batch)
+            for number, batch in enumerate(batches, 1)]
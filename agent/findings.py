@@ -0,0 +1,208 @@
+import sys
+import threading
+from urllib.parse import urlsplit
+from agent.parsers import get_parser
+from agent.blob_store import load_output
+
+# Tools whose findings fully describe their result; their raw output is left out of reports
+STRUCTURED_TOOLS = ("nmap", "gobuster", "ffuf")
+
+# Raw result fields that findings replace in reports (an "output_ref" to the raw output is kept)
+RAW_FIELDS = ("output", "ports", "hits")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def url_location(url):
+    """Split a URL into (host, port, path), filling in the scheme's default port."""
+    parts = urlsplit(url if "://" in url else f"https://{url}")
+    port = parts.port or DEFAULT_PORTS.get(parts.scheme)
+    return (parts.hostname or "").lower(), port, parts.path or "/"
+
+class Finding:
+    """
+    One normalized discovery, whichever tool reported it.
+
+    A finding is identified by (host, port, path, status): an open port has
+    an empty path and its state as status, a discovered path its HTTP status.
+    Host, path and string statuses are interned, so the many findings of a
+    large scan share their repeated strings.
+
+    Args:
+        kind (str): "port", "path" or "injection".
+        host (str): Host name or IP address.
+        port (int): Port number (None if unknown).
+        path (str): URL path, or "" for ports.
+        status: HTTP status code, port state or "injectable".
+        tool (str): Tool that reported the finding.
+        detail (dict): Extra, tool-specific information (service, size, parameters, ...).
+    """
+
+    __slots__ = ("kind", "host", "port", "path", "status", "tools", "detail")
+
+    def __init__(self, kind, host, port, path="", status=None, tool=None, detail=None):
+        self.kind = sys.intern(kind)
+        self.host = sys.intern(host.lower())
+        self.port = port
+        self.path = sys.intern(path)
+        self.status = _intern(status)
+        self.tools = [tool] if tool else []
+        self.detail = detail or {}
+
+    @property
+    def key(self):
+        return (self.host, self.port, self.path, self.status)
+
+    def merge(self, other):
+        """Fold another report of the same finding into this one."""
+        for tool in other.tools:
+            if tool not in self.tools:
+                self.tools.append(tool)
+        for name, value in other.detail.items():
+            current = self.detail.get(name)
+            if isinstance(current, list) and isinstance(value, list):
+                current.extend(item for item in value if item not in current)
+            elif current in (None, ""):
+                self.detail[name] = value
+
+    def to_dict(self):
+        data = {"kind": self.kind, "host": self.host, "port": self.port, "path": self.path,
+                "status": self.status, "tools": list(self.tools)}
+        if self.detail:
+            data["detail"] = dict(self.detail)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        finding = cls(data["kind"], data["host"], data.get("port"), data.get("path", ""),
+                      data.get("status"), detail=dict(data.get("detail") or {}))
+        finding.tools = list(data.get("tools", []))
+        return finding
+
+    def __repr__(self):
+        return f"Finding({self.kind}, {self.host}:{self.port}{self.path}, {self.status}, {self.tools})"
+
+def finding_from_event(task, event):
+    """
+    Convert a parsed tool event (see agent.parsers) into a Finding.
+
+    Returns:
+        Finding: The finding, or None for events that are not findings (e.g. closed ports).
+    """
+    tool = task.get("tool")
+    kind = event.get("type")
+    if kind == "port":
+        if event["state"] != "open":
+            return None
+        detail = {name: event[name] for name in ("protocol", "service", "tunnel", "product") if event.get(name)}
+        return Finding("port", event["host"], event["port"], "", event["state"], tool, detail)
+    if kind == "path":
+        host, port, base = url_location(task["target"])
+        path = f"{base.rstrip('/')}/{event['path'].lstrip('/')}"
+        return Finding("path", host, port, path, event["status"], tool)
+    if kind == "hit":
+        host, port, path = url_location(event["url"])
+        detail = {name: event[name] for name in ("length", "words", "lines", "redirectlocation") if name in event}
+        return Finding("path", host, port, path, event.get("status"), tool, detail)
+    if kind == "injection":
+        host, port, path = url_location(event.get("url") or task["target"])
+        return Finding("injection", host, port, path, "injectable", tool,
+                       {"parameters": [f"{event['parameter']} ({event['place']})"]})
+    return None
+
+def _result_events(tool, result):
+    """Yield the parsed events of a finished tool result."""
+    if tool == "nmap":
+        for port in result.get("ports", []):
+            yield dict(port, type="port")
+    elif tool == "ffuf":
+        for hit in result.get("hits", []):
+            yield dict(hit, type="hit")
+    else:
+        parser = get_parser(tool)
+        for line in (load_output(result) or "").splitlines():
+            yield from parser.feed(line)
+
+def findings_from_result(task, result):
+    """
+    Extract the findings of a finished task.
+
+    Results that already carry findings (e.g. from the cache) are converted
+    back from their dicts; otherwise the tool's structured fields or output
+    are parsed. Overlapping reports within one result are merged.
+
+    Returns:
+        list: Finding objects, in the order they were first reported.
+    """
+    if result.get("status") != "success":
+        return []
+    if "findings" in result:
+        return [Finding.from_dict(data) for data in result["findings"]]
+    index = FindingIndex()
+    for event in _result_events(task.get("tool"), result):
+        finding = finding_from_event(task, event)
+        if finding:
+            index.add(finding)
+    return list(index)
+
+def compact_result(tool, result):
+    """Return the result as written to reports: raw output is dropped once findings describe it."""
+    if tool not in STRUCTURED_TOOLS or "findings" not in result:
+        return result
+    return {name: value for name, value in result.items() if name not in RAW_FIELDS}
+
+class FindingIndex:
+    """
+    Deduplicating index of findings, keyed by (host, port, path, status).
+
+    When several tools (or several tasks) report the same finding, the
+    reports are merged into one entry listing every tool. Safe to fill from
+    concurrent task callbacks.
+    """
+
+    def __init__(self, findings=()):
+        self._findings = {}
+        self._lock = threading.Lock()
+        self.extend(findings)
+
+    def add(self, finding):
+        """Add a finding; returns True if it was new, False if it was merged into an existing one."""
+        with self._lock:
+            existing = self._findings.get(finding.key)
+            if existing is None:
+                self._findings[finding.key] = finding
+                return True
+            existing.merge(finding)
+            return False
+
+    def extend(self, findings):
+        for finding in findings:
+            self.add(finding)
+
+    def __len__(self):
+        return len(self._findings)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._findings.values()))
+
+    def to_dicts(self):
+        return [finding.to_dict() for finding in self]
+
+def format_findings(findings):
+    """Render findings as a compact text table."""
+    lines = []
+    for finding in findings:
+        if finding.kind == "port":
+            where = f"{finding.host}:{finding.port}"
+            info = finding.detail.get("service", "")
+        elif finding.kind == "injection":
+            where = f"{finding.host}:{finding.port}{finding.path}"
+            info = ", ".join(finding.detail.get("parameters", []))
+        else:
+            where = f"{finding.host}:{finding.port}{finding.path}"
+            info = finding.detail.get("redirectlocation", "")
+        lines.append(f"{finding.kind:<10}{str(finding.status):<12}{where:<50}{info:<20}{','.join(finding.tools)}".rstrip())
+    return "\n".join(lines) if lines else "No findings"
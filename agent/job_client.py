@@ -0,0 +1,170 @@
+import http.client
+import json
+import socket
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, quote
+from config import JOB_SERVICE_URL
+
+# Address the service listens on when none is configured
+DEFAULT_SERVICE_URL = "http://127.0.0.1:8765"
+
+# Job priority: lower numbers run first
+DEFAULT_PRIORITY = 10
+
+# Longest a single result request waits on the service before polling again (seconds)
+MAX_WAIT = 30
+
+def parse_address(url):
+    """
+    Split a job service address into its transport and location.
+
+    Returns:
+        tuple: ("tcp", (host, port)) for "http://host:port", ("unix", path) for "unix:///path/to.sock".
+    """
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        return "unix", parts.path
+    if parts.scheme == "http":
+        return "tcp", (parts.hostname or "127.0.0.1", parts.port or urlsplit(DEFAULT_SERVICE_URL).port)
+    raise ValueError(f"Unsupported job service address: {url} (use http://host:port or unix:///path)")
+
+class JobServiceError(Exception):
+    """The job service rejected a request (unknown job, out-of-scope target, ...)."""
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+class JobServiceClient:
+    """
+    Client of the local job service (see agent.job_service).
+
+    Args:
+        url (str): Service address, "http://host:port" or "unix:///path/to.sock".
+        timeout (float): Socket timeout of a request, in seconds.
+    """
+
+    def __init__(self, url=None, timeout=10):
+        self.url = url or JOB_SERVICE_URL or DEFAULT_SERVICE_URL
+        self.transport, self.location = parse_address(self.url)
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None, timeout=None):
+        timeout = timeout or self.timeout
+        if self.transport == "unix":
+            conn = _UnixHTTPConnection(self.location, timeout)
+        else:
+            conn = http.client.HTTPConnection(*self.location, timeout=timeout)
+        try:
+            body = json.dumps(payload).encode() if payload is not None else None
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = json.loads(response.read() or b"{}")
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise JobServiceError(data.get("error", f"HTTP {response.status}"))
+        return data
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def submit(self, request):
+        """Submit a job request; returns the job's status (including its "job_id")."""
+        return self._request("POST", "/jobs", request)
+
+    def submit_task(self, tool, target, priority=DEFAULT_PRIORITY, refresh=False, **options):
+        """Run one tool on one target; identical in-flight runs are shared."""
+        return self.submit(dict(options, tool=tool, target=target, priority=priority, refresh=refresh))
+
+    def submit_scan(self, target, priority=DEFAULT_PRIORITY, refresh=False):
+        """Run a full scan (all tools plus follow-ups) of one target."""
+        return self.submit({"scan": target, "priority": priority, "refresh": refresh})
+
+    def status(self, job_id):
+        return self._request("GET", f"/jobs/{quote(job_id)}")
+
+    def result(self, job_id, wait=0):
+        """Return the job's status and, once it finished, its "result"; waits up to `wait` seconds for it."""
+        wait = min(wait, MAX_WAIT)
+        return self._request("GET", f"/jobs/{quote(job_id)}/result?wait={wait}", timeout=self.timeout + wait)
+
+    def cancel(self, job_id):
+        return self._request("DELETE", f"/jobs/{quote(job_id)}")
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finished (or `timeout` seconds passed); returns its last status and result."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = MAX_WAIT if deadline is None else max(0, deadline - time.monotonic())
+            job = self.result(job_id, wait=min(MAX_WAIT, remaining))
+            if job["done"] or (deadline is not None and time.monotonic() >= deadline):
+                return job
+
+class RemoteJob:
+    """
+    A Streamlit scan run by the job service: one service job per task.
+
+    Offers the read interface of agent.jobs.ScanJob (snapshot() and done()).
+    """
+
+    def __init__(self, client, job_id, tasks):
+        self.job_id = job_id
+        self._client = client
+        self._tasks = tasks  # task_id -> (service job id, tool, target)
+        self._last = None
+
+    def snapshot(self):
+        tasks = OrderedDict()
+        results = {}
+        for task_id, (service_id, tool, target) in self._tasks.items():
+            job = self._client.result(service_id)
+            state = job["status"]
+            if job["done"]:
+                result = job.get("result") or {"status": "failed", "error": job.get("error") or state}
+                results[task_id] = result
+                state = result.get("status", "failed")
+            tasks[task_id] = {"tool": tool, "target": target, "state": state, "lines": job["lines"]}
+        self._last = {
+            "job_id": self.job_id,
+            "status": "completed" if len(results) == len(tasks) else "running",
+            "error": None,
+            "done": len(results),
+            "total": len(tasks),
+            "tasks": tasks,
+            "results": results,
+        }
+        return self._last
+
+    def done(self):
+        snapshot = self._last or self.snapshot()
+        return snapshot["done"] == snapshot["total"]
+
+class RemoteJobManager:
+    """Drop-in for agent.jobs.JobManager that runs scans on the job service."""
+
+    def __init__(self, client, priority=DEFAULT_PRIORITY):
+        self._client = client
+        self._priority = priority
+        self._jobs = {}
+
+    def submit(self, tasks, refresh=False):
+        members = OrderedDict()
+        for i, task in enumerate(tasks):
+            options = {name: value for name, value in task.items() if name not in ("id", "tool", "target")}
+            job = self._client.submit_task(task["tool"], task["target"], priority=self._priority, refresh=refresh, **options)
+            members[task.get("id") or f"{task['tool']}-{i}"] = (job["job_id"], task["tool"], task["target"])
+        job_id = "+".join(service_id for service_id, _, _ in members.values())
+        self._jobs[job_id] = RemoteJob(self._client, job_id, members)
+        return job_id
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
@@ -0,0 +1,520 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from config import SERVICE_WORKERS, JOB_WORKERS, DEFAULT_WORDLIST
+from agent.agent_graph import execute_task, run_agent, task_cache_key
+from agent.jobs import LIVE_LINES, MAX_FINISHED_JOBS
+from agent.job_client import parse_address, DEFAULT_PRIORITY, MAX_WAIT
+from agent.journal import new_scan_id
+from agent.task_manager import is_within_scope, parse_port_spec
+from agent.wordlists import get_registry
+from agent.process import run_cancellable
+
+TOOLS = ("nmap", "gobuster", "ffuf", "sqlmap")
+
+# Options a task request may set, per tool; anything else is rejected
+TASK_OPTIONS = {
+    "nmap": ("ports", "shard", "shards"),
+    "gobuster": ("wordlist", "shard", "shards", "wordlist_limit"),
+    "ffuf": ("wordlist", "shard", "shards", "wordlist_limit"),
+    "sqlmap": ("urls",),
+}
+
+# An nmap port list: port numbers and ranges separated by commas, nothing else
+PORT_SPEC = re.compile(r"\d{1,5}(-\d{1,5})?(,\d{1,5}(-\d{1,5})?)*")
+
+# Largest request body the service accepts
+MAX_BODY_BYTES = 1024 * 1024
+
+def check_target(target):
+    """
+    Check that a requested target is a single in-scope argument.
+
+    Targets end up on tool command lines, so one containing whitespace or
+    starting with "-" could smuggle in options of its own.
+
+    Raises:
+        ValueError: If the target is malformed or out of scope.
+    """
+    if not isinstance(target, str) or not target or target.startswith("-") or any(c.isspace() for c in target):
+        raise ValueError(f"Invalid target: {target!r}")
+    if not is_within_scope(target):
+        raise ValueError(f"Target is out of scope: {target}")
+
+def task_body(request):
+    """
+    Build the task of a single-tool request, accepting only the options its tool takes.
+
+    Port lists must be plain nmap port specs, every sqlmap URL must be in
+    scope, and wordlists are looked up by name in the wordlist registry.
+
+    Returns:
+        dict: The task (without "refresh").
+
+    Raises:
+        ValueError: For unknown tools or options, and invalid or out-of-scope values.
+    """
+    tool = request.get("tool")
+    if tool not in TOOLS:
+        raise ValueError(f"Unknown tool: {tool}")
+    check_target(request.get("target"))
+    allowed = TASK_OPTIONS[tool]
+    unknown = sorted(set(request) - {"id", "priority", "refresh", "tool", "target"} - set(allowed))
+    if unknown:
+        raise ValueError(f"Unsupported options for {tool}: {', '.join(unknown)}")
+    body = {"tool": tool, "target": request["target"]}
+    body.update({name: request[name] for name in allowed if name in request})
+
+    if "ports" in body:
+        ports = body["ports"]
+        if not isinstance(ports, str) or not PORT_SPEC.fullmatch(ports):
+            raise ValueError(f"Invalid port list: {ports!r}")
+        parse_port_spec(ports)  # Ranges within 1-65535
+    if "urls" in body:
+        if not isinstance(body["urls"], list):
+            raise ValueError("urls must be a list")
+        for url in body["urls"]:
+            check_target(url)
+    if "wordlist" in body:
+        name = body["wordlist"]
+        if name != DEFAULT_WORDLIST and name not in get_registry().names():
+            raise ValueError(f"Unknown wordlist: {name!r}")
+    for name in ("shard", "shards", "wordlist_limit"):
+        if name in body and (not isinstance(body[name], int) or isinstance(body[name], bool) or body[name] < 0):
+            raise ValueError(f"Invalid {name}: {body[name]!r}")
+    if body.get("shard", 0) >= body.get("shards", 1):
+        raise ValueError(f"Invalid shard {body.get('shard')} of {body.get('shards')}")
+    return body
+
+class Execution:
+    """
+    One run of a tool, shared by every job that asked for the same (tool, target, args).
+
+    Jobs subscribe while the run is queued or running; when the last
+    subscriber leaves, a run that has not started yet is dropped and a
+    running one is cancelled, which kills its tool process tree.
+    """
+
+    __slots__ = ("key", "task", "priority", "state", "future", "listeners", "subscribers", "cancel")
+
+    def __init__(self, key, task, priority, future):
+        self.key = key
+        self.task = task
+        self.priority = priority
+        self.state = "queued"  # queued -> running -> done, or cancelled
+        self.future = future
+        self.listeners = []  # on_event callbacks of the subscribed jobs
+        self.subscribers = 0
+        self.cancel = threading.Event()  # Set to kill the running tool
+
+    def on_event(self, task, event):
+        # Runs on the worker thread; copy the list as jobs may join meanwhile
+        for listener in list(self.listeners):
+            listener(task, event)
+
+class ServiceJob:
+    """
+    A job submitted to the service: one tool run ("task") or a full scan of a target ("scan").
+
+    Args:
+        job_id (str): Id returned to the client.
+        kind (str): "task" or "scan".
+        request (dict): The task ({"tool", "target", options...}) or {"target"} of the scan.
+        priority (int): Lower numbers run first.
+    """
+
+    def __init__(self, job_id, kind, request, priority):
+        self.job_id = job_id
+        self.kind = kind
+        self.request = request
+        self.priority = priority
+        self.status = "queued"  # queued -> running -> completed / failed, or cancelled
+        self.shared = False  # Joined a run another job had already started
+        self.scan_id = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.lines = deque(maxlen=LIVE_LINES)
+        self.execution = None
+        self.runner = None  # asyncio task driving the job
+        self.pending = set()  # Futures of the tool runs a scan job is waiting for
+
+    def on_event(self, task, event):
+        if event["type"] == "line":
+            self.lines.append(event["line"])
+
+    def finish(self, status, result=None, error=None):
+        if self.done():
+            return
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+
+    def done(self):
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_dict(self, result=False):
+        status = self.status
+        if status == "queued" and self.execution is not None and self.execution.state == "running":
+            status = "running"
+        data = {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "request": self.request,
+            "priority": self.priority,
+            "status": status,
+            "done": self.done(),
+            "shared": self.shared,
+            "scan_id": self.scan_id,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+            "lines": list(self.lines),
+        }
+        if result:
+            data["result"] = self.result
+        return data
+
+class JobService:
+    """
+    Local asyncio job service: every client's tool runs share one bounded worker pool.
+
+    Tool runs wait in a priority queue and at most `workers` of them run at
+    once, whichever client asked for them. Identical in-flight runs (same
+    tool, normalized target and arguments) are coalesced: the second request
+    joins the first run instead of starting another ("single-flight"), and a
+    more urgent request moves the shared run up the queue. Full scans run
+    their orchestration (run_agent) on a thread and send every tool run
+    through the same pool, so two users scanning the same target share one
+    nmap run.
+
+    Args:
+        workers (int): Tool runs executing at the same time.
+        scan_workers (int): Full scans orchestrated at the same time.
+    """
+
+    def __init__(self, workers=SERVICE_WORKERS, scan_workers=JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="service-tool")
+        self._scan_pool = ThreadPoolExecutor(max_workers=max(1, scan_workers), thread_name_prefix="service-scan")
+        self._loop = None
+        self._queue = None  # (priority, sequence, Execution); created in start()
+        self._sequence = itertools.count()
+        self._inflight = {}  # single-flight key -> Execution
+        self._jobs = OrderedDict()  # job_id -> ServiceJob, oldest first
+        self._worker_tasks = []
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for worker in self._worker_tasks:
+            worker.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._pool.shutdown(wait=False)
+        self._scan_pool.shutdown(wait=False)
+
+    def stats(self):
+        states = [execution.state for execution in self._inflight.values()]
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            "jobs": len(self._jobs),
+        }
+
+    def _key(self, task):
+        """Single-flight key of a task: its cache key, plus whether cached results may be used."""
+        key = task_cache_key(task)
+        return f"{key}:{int(bool(task.get('refresh')))}" if key else None
+
+    def _enqueue(self, execution):
+        self._queue.put_nowait((execution.priority, next(self._sequence), execution))
+
+    def _forget(self, execution):
+        if execution.key and self._inflight.get(execution.key) is execution:
+            del self._inflight[execution.key]
+
+    def _join(self, task, priority, listener=None):
+        """Subscribe to the in-flight run of `task`, queueing a new run if there is none."""
+        key = self._key(task)
+        execution = self._inflight.get(key) if key else None
+        shared = execution is not None
+        if execution is None:
+            execution = Execution(key, task, priority, self._loop.create_future())
+            if key:
+                self._inflight[key] = execution
+            self._enqueue(execution)
+        elif priority < execution.priority and execution.state == "queued":
+            # Queue it again at the higher priority; the stale entry is skipped
+            execution.priority = priority
+            self._enqueue(execution)
+        execution.subscribers += 1
+        if listener is not None:
+            execution.listeners.append(listener)
+        return execution, shared
+
+    def _leave(self, execution, listener=None):
+        execution.subscribers -= 1
+        if listener is not None and listener in execution.listeners:
+            execution.listeners.remove(listener)
+        if execution.subscribers == 0 and execution.state == "queued":
+            # Nobody wants the result any more
+            execution.state = "cancelled"
+            self._forget(execution)
+            execution.future.cancel()
+        elif execution.subscribers == 0 and execution.state == "running":
+            # Stop the tool; later requests for the same run start a fresh one
+            logging.info(f"Cancelling service run of {execution.task.get('tool')} on {execution.task.get('target')}")
+            self._forget(execution)
+            execution.cancel.set()
+
+    async def _worker(self):
+        while True:
+            _, _, execution = await self._queue.get()
+            if execution.state != "queued":
+                continue  # Cancelled, or already started from a higher-priority entry
+            execution.state = "running"
+            try:
+                result = await self._loop.run_in_executor(
+                    self._pool, run_cancellable, execution.cancel, execute_task, dict(execution.task), execution.on_event
+                )
+            except Exception as e:
+                logging.error(f"Service run of {execution.task.get('tool')} on {execution.task.get('target')} failed: {str(e)}")
+                result = {"status": "failed", "error": str(e)}
+            execution.state = "done"
+            self._forget(execution)
+            if not execution.future.done():
+                execution.future.set_result(result)
+
+    async def _run_shared(self, task, priority, listener=None, job=None):
+        """Run a task through the shared pool and return (a copy of) its result."""
+        execution, shared = self._join(task, priority, listener)
+        if job is not None:
+            job.shared = job.shared or shared
+            if job.kind == "task":
+                job.execution = execution
+        try:
+            # Shielded: a subscriber going away must not cancel a run others wait for
+            return dict(await asyncio.shield(execution.future))
+        finally:
+            self._leave(execution, listener)
+
+    def _execute_blocking(self, task, on_event=None, job=None):
+        """execute_task replacement for the scans' own schedulers: waits on the shared pool."""
+        if job.done():
+            return {"status": "failed", "error": "Job cancelled"}
+        listener = None
+        if on_event is not None:
+            # Events carry the scan's own task, not the one that started a shared run
+            def listener(_, event):
+                on_event(task, event)
+        future = asyncio.run_coroutine_threadsafe(self._run_shared(task, job.priority, listener, job), self._loop)
+        job.pending.add(future)
+        try:
+            return future.result()
+        except CancelledError:
+            return {"status": "failed", "error": "Job cancelled"}
+        finally:
+            job.pending.discard(future)
+
+    async def _run_task_job(self, job):
+        try:
+            result = await self._run_shared(job.request, job.priority, job.on_event, job)
+        except asyncio.CancelledError:
+            job.finish("cancelled")
+            return
+        job.finish("completed" if result.get("status") == "success" else "failed", result, result.get("error"))
+
+    async def _run_scan_job(self, job):
+        job.status = "running"
+        job.scan_id = new_scan_id()
+        scan = partial(
+            run_agent, job.request["target"], on_event=job.on_event, refresh=job.request["refresh"],
+            scan_id=job.scan_id, execute=partial(self._execute_blocking, job=job)
+        )
+        try:
+            result = await self._loop.run_in_executor(self._scan_pool, scan)
+        except asyncio.CancelledError:
+            # The scan thread keeps draining, but starts no further tool runs
+            job.finish("cancelled")
+            return
+        except Exception as e:
+            logging.error(f"Service scan {job.job_id} failed: {str(e)}")
+            job.finish("failed", error=str(e))
+            return
+        job.finish("failed" if "error" in result else "completed", result, result.get("error"))
+
+    def submit(self, request):
+        """
+        Queue a job; must be called on the service's event loop.
+
+        Args:
+            request (dict): {"tool", "target", options...} to run one tool, or
+                {"scan": target} for a full scan; both take optional
+                "priority" (lower runs first) and "refresh" keys.
+
+        Returns:
+            ServiceJob: The new job.
+
+        Raises:
+            ValueError: For malformed requests, unknown tools or options and invalid or out-of-scope targets.
+        """
+        if not isinstance(request, dict):
+            raise ValueError("Job request must be a JSON object")
+        priority = int(request.get("priority", DEFAULT_PRIORITY))
+        refresh = bool(request.get("refresh", False))
+        if "scan" in request:
+            kind, target = "scan", request["scan"]
+            check_target(target)
+            body = {"target": target, "refresh": refresh}
+        else:
+            kind, target = "task", request.get("target")
+            body = task_body(request)
+            body["refresh"] = refresh
+
+        job = ServiceJob(secrets.token_hex(6), kind, body, priority)
+        self._jobs[job.job_id] = job
+        self._prune()
+        job.runner = self._loop.create_task(self._run_scan_job(job) if kind == "scan" else self._run_task_job(job))
+        logging.info(f"Service job {job.job_id}: {kind} of {target} (priority {priority})")
+        return job
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond MAX_FINISHED_JOBS."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Its runs that no other job shares are dropped if they
+        had not started, and their tools are killed if they had.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None and not job.done():
+            job.finish("cancelled")
+            job.runner.cancel()
+            for future in list(job.pending):
+                future.cancel()  # The tool runs of a scan
+        return job
+
+    async def wait(self, job, timeout):
+        if not job.done():
+            await asyncio.wait({job.runner}, timeout=timeout)
+        return job
+
+    async def handle(self, method, path, query, body):
+        """Answer one API request; returns (HTTP status, JSON payload)."""
+        parts = [part for part in path.split("/") if part]
+        if parts == ["health"] and method == "GET":
+            return 200, self.stats()
+        if parts == ["jobs"] and method == "GET":
+            return 200, {"jobs": [job.to_dict() for job in self._jobs.values()]}
+        if parts == ["jobs"] and method == "POST":
+            try:
+                job = self.submit(json.loads(body or b"{}"))
+            except (ValueError, TypeError) as e:
+                return 400, {"error": str(e)}
+            return 202, job.to_dict()
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self._jobs.get(parts[1])
+            if job is None:
+                return 404, {"error": f"Unknown job: {parts[1]}"}
+            if len(parts) == 2 and method == "GET":
+                return 200, job.to_dict()
+            if len(parts) == 2 and method == "DELETE":
+                return 200, self.cancel(job.job_id).to_dict()
+            if parts[2] == "result" and method == "GET":
+                try:
+                    wait = min(float(query.get("wait", ["0"])[0]), MAX_WAIT)
+                except ValueError:
+                    return 400, {"error": "wait must be a number of seconds"}
+                if wait > 0:
+                    await self.wait(job, wait)
+                return (200 if job.done() else 202), job.to_dict(result=True)
+        return 404, {"error": f"No route for {method} {path}"}
+
+    async def _handle_connection(self, reader, writer):
+        """Serve one HTTP/1.1 request (the connection is closed after the response)."""
+        try:
+            method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY_BYTES:
+                status, payload = 413, {"error": "Request body too large"}
+            else:
+                body = await reader.readexactly(length) if length else b""
+                url = urlsplit(target)
+                status, payload = await self.handle(method.upper(), url.path, parse_qs(url.query), body)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, payload = 400, {"error": "Malformed request"}
+        except Exception as e:
+            logging.error(f"Job service request failed: {str(e)}")
+            status, payload = 500, {"error": str(e)}
+
+        data = json.dumps(payload, default=str).encode()
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n")
+        try:
+            writer.write(head.encode("latin-1") + data)
+            await writer.drain()
+        except ConnectionError:
+            pass  # The client went away
+        finally:
+            writer.close()
+
+    async def listen(self, address):
+        """Start serving the API on an "http://host:port" or "unix:///path" address; returns the server."""
+        transport, location = parse_address(address)
+        if transport == "unix":
+            if os.path.exists(location):
+                os.unlink(location)  # Left behind by a previous run
+            server = await asyncio.start_unix_server(self._handle_connection, path=location)
+        else:
+            server = await asyncio.start_server(self._handle_connection, *location)
+        logging.info(f"Job service listening on {address} with {self.workers} workers")
+        return server
+
+async def serve(address, workers=SERVICE_WORKERS):
+    """Run the job service until cancelled."""
+    service = JobService(workers)
+    await service.start()
+    server = await service.listen(address)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+def run_service(address, workers=SERVICE_WORKERS):
+    """Blocking entry point used by `main.py --serve`."""
+    try:
+        asyncio.run(serve(address, workers))
+    except KeyboardInterrupt:
+        logging.info("Job service stopped")
@@ -0,0 +1,169 @@
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import JOB_WORKERS, JOB_SERVICE_URL
+from agent.agent_graph import execute_task
+from agent.scheduler import TaskScheduler
+from agent.job_client import JobServiceClient, RemoteJobManager
+
+# Output lines kept per task for live progress
+LIVE_LINES = 15
+
+# Finished jobs kept for status queries; older ones are forgotten first
+MAX_FINISHED_JOBS = 20
+
+class ScanJob:
+    """
+    State of one background scan: per-task progress, partial output and results.
+
+    Updated from the worker threads; read it through snapshot().
+    """
+
+    def __init__(self, job_id, tasks):
+        self.job_id = job_id
+        self.status = "queued"  # queued -> running -> completed / failed
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+        self._tasks = OrderedDict(
+            (task["id"], {"tool": task["tool"], "target": task["target"], "state": "queued", "lines": deque(maxlen=LIVE_LINES)})
+            for task in tasks
+        )
+        self._results = {}  # task_id -> result
+
+    def on_start(self, task):
+        with self._lock:
+            self._tasks[task["id"]]["state"] = "running"
+
+    def on_event(self, task, event):
+        if event["type"] != "line":
+            return
+        with self._lock:
+            self._tasks[task["id"]]["lines"].append(event["line"])
+
+    def on_complete(self, task, result, scheduler):
+        with self._lock:
+            self._tasks[task["id"]]["state"] = result.get("status", "failed")
+            self._results[task["id"]] = result
+
+    def start(self):
+        with self._lock:
+            self.status = "running"
+
+    def finish(self, error=None):
+        with self._lock:
+            self.status = "failed" if error else "completed"
+            self.error = error
+            self.finished = time.time()
+
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def snapshot(self):
+        """
+        Return a consistent copy of the job state.
+
+        Returns:
+            dict: "job_id", "status", "error", "done" (finished tasks), "total",
+            "tasks" (task_id -> tool, target, state and last output lines) and
+            "results" (task_id -> result of every finished task).
+        """
+        with self._lock:
+            tasks = {task_id: dict(info, lines=list(info["lines"])) for task_id, info in self._tasks.items()}
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "error": self.error,
+                "done": len(self._results),
+                "total": len(tasks),
+                "tasks": tasks,
+                "results": dict(self._results),
+            }
+
+class JobManager:
+    """
+    Runs scans in the background so callers (e.g. the Streamlit app) never block on them.
+
+    The manager lives for the whole process, so a job keeps running and stays
+    queryable across Streamlit script reruns. Each job runs its tasks through
+    the task scheduler; up to `max_jobs` jobs run at once.
+
+    Args:
+        max_jobs (int): Number of jobs running at the same time.
+    """
+
+    def __init__(self, max_jobs=JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="scan-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # job_id -> ScanJob, oldest first
+
+    def submit(self, tasks, refresh=False):
+        """
+        Start a scan of the given tasks in the background.
+
+        Args:
+            tasks (list): Task dictionaries ({"tool", "target", ...}).
+            refresh (bool): Ignore cached tool results.
+
+        Returns:
+            str: The id of the new job.
+        """
+        tasks = [dict(task, id=task.get("id") or f"{task['tool']}-{i}", refresh=refresh) for i, task in enumerate(tasks)]
+        job = ScanJob(secrets.token_hex(6), tasks)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._pool.submit(self._run, job, tasks)
+        logging.info(f"Submitted background job {job.job_id} with {len(tasks)} tasks")
+        return job.job_id
+
+    def _run(self, job, tasks):
+        job.start()
+        try:
+            scheduler = TaskScheduler(
+                partial(execute_task, on_event=job.on_event),
+                on_complete=job.on_complete,
+                on_start=job.on_start
+            )
+            for task in tasks:
+                scheduler.add_task(task)
+            scheduler.run()
+            job.finish()
+        except Exception as e:
+            logging.error(f"Background job {job.job_id} failed: {str(e)}")
+            job.finish(str(e))
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond MAX_FINISHED_JOBS."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Return the job with the given id, or None if it is unknown (or was pruned)."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """
+    Return the process-wide job manager.
+
+    With JOB_SERVICE_URL set, scans run on the shared job service (see
+    agent.job_service) instead of in this process.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            if JOB_SERVICE_URL:
+                _manager = RemoteJobManager(JobServiceClient(JOB_SERVICE_URL))
+            else:
+                _manager = JobManager()
+        return _manager
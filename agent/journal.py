@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from config import JOURNAL_DIR
+
+def new_scan_id():
+    """Generate a unique, sortable scan id such as "20250223_125619_3fa2c1"."""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(3)}"
+
+class ScanJournal:
+    """
+    Append-only, crash-safe journal of a scan.
+
+    Every event is written as one JSON line and flushed to disk (fsync) before
+    the call returns, so a scan that dies halfway leaves a journal describing
+    exactly which tasks were queued, started and completed, and with what output.
+
+    Events:
+        {"event": "scan", "target": ...}                       header of a single-target scan
+        {"event": "batch", "entries": [...], "report": ...}    header of a batch scan (targets and CIDR blocks, unexpanded)
+        {"event": "enqueue", "task": {...}, "depends_on": []}  a task was queued
+        {"event": "start", "task_id": ...}                     a task started running
+        {"event": "complete", "task_id": ..., "result": {...}} a task finished
+        {"event": "target", "target": ..., "scan_id": ...}     a batch target started
+        {"event": "target_done", "target": ...}                a batch target finished
+
+    Args:
+        scan_id (str): Id of the scan; the journal lives in JOURNAL_DIR/<scan_id>.jsonl.
+        directory (str): Directory holding the journals (defaults to JOURNAL_DIR).
+    """
+
+    def __init__(self, scan_id, directory=None):
+        directory = directory or JOURNAL_DIR
+        self.scan_id = scan_id
+        self.path = os.path.join(directory, f"{scan_id}.jsonl")
+        self._lock = threading.Lock()
+        self._tail_checked = False
+        os.makedirs(directory, exist_ok=True)
+
+    def exists(self):
+        """Check whether anything has been journaled for this scan yet."""
+        return os.path.exists(self.path)
+
+    def append(self, event, **fields):
+        """Durably append one event to the journal."""
+        record = dict(fields, event=event, ts=time.time())
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            if not self._tail_checked:
+                line = self._terminate_partial_line() + line
+                self._tail_checked = True
+            with open(self.path, "a") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _terminate_partial_line(self):
+        """Return a newline if the journal ends mid-line (a crash during a write), else ""."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                return "" if f.read(1) == b"\n" else "\n"
+        except OSError:
+            return ""  # Missing or empty journal
+
+    def events(self):
+        """
+        Read back all events in order.
+
+        A partially written last line (the process died mid-write) is skipped.
+        """
+        events = []
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    logging.warning(f"Skipping damaged journal line in {self.path}")
+        return events
+
+    def load(self):
+        """
+        Rebuild the state of a single-target scan from its journal.
+
+        Returns:
+            dict: "target", "tasks" (task_id -> task, in enqueue order),
+            "depends_on" (task_id -> list of ids) and "completed" (task_id -> result).
+        """
+        state = {"target": None, "tasks": {}, "depends_on": {}, "completed": {}}
+        for event in self.events():
+            kind = event.get("event")
+            if kind == "scan":
+                state["target"] = event["target"]
+            elif kind == "enqueue":
+                task = event["task"]
+                state["tasks"].setdefault(task["id"], task)
+                state["depends_on"].setdefault(task["id"], event.get("depends_on", []))
+            elif kind == "complete":
+                state["completed"][event["task_id"]] = event["result"]
+        return state
+
+    def load_batch(self):
+        """
+        Rebuild the state of a batch scan from its journal.
+
+        Returns:
+            dict: "entries" (the batch's targets and CIDR blocks, unexpanded),
+            "report", "scan_ids" (target -> per-target scan id) and "done"
+            (set of finished targets).
+        """
+        state = {"entries": [], "report": None, "scan_ids": {}, "done": set()}
+        for event in self.events():
+            kind = event.get("event")
+            if kind == "batch":
+                # Journals written before entries were recorded list the expanded targets
+                state["entries"] = event.get("entries", event.get("targets", []))
+                state["report"] = event.get("report")
+            elif kind == "target":
+                state["scan_ids"][event["target"]] = event["scan_id"]
+            elif kind == "target_done":
+                state["done"].add(event["target"])
+        return state
+
+    def kind(self):
+        """Return "scan" or "batch" depending on the journal header, or None if it is empty."""
+        for event in self.events():
+            if event.get("event") in ("scan", "batch"):
+                return event["event"]
+        return None
@@ -0,0 +1,234 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_FILE
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)
+
+class TaskSpan:
+    """
+    Timing of one task, filled in by execute_task, run_command and the parsers.
+
+    Times are in seconds. `subprocess` covers every attempt of the tool,
+    `backoff` the sleeps between retries and `parse` the time spent turning
+    output into records; lines parsed while the tool runs count as parse
+    time only (see timed).
+    """
+
+    __slots__ = ("tool", "target", "status", "started", "total", "subprocess", "backoff", "parse",
+                 "attempts", "output_bytes", "cached")
+
+    def __init__(self, tool, target):
+        self.tool = tool
+        self.target = target
+        self.status = "unknown"
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.subprocess = 0.0
+        self.backoff = 0.0
+        self.parse = 0.0
+        self.attempts = 0
+        self.output_bytes = 0
+        self.cached = False
+
+    def to_dict(self):
+        return {
+            "total": round(self.total, 4),
+            "subprocess": round(self.subprocess, 4),
+            "backoff": round(self.backoff, 4),
+            "parse": round(self.parse, 4),
+            "attempts": self.attempts,
+            "retries": max(0, self.attempts - 1),
+            "output_bytes": self.output_bytes,
+            "cached": self.cached,
+        }
+
+_current = threading.local()
+
+def current_span():
+    """Return the span of the task running on this thread, or None."""
+    return getattr(_current, "span", None)
+
+@contextmanager
+def task_span(tool, target):
+    """Time a task; run_command and the parsers add to the span while it is open."""
+    span = TaskSpan(tool, target)
+    previous = current_span()
+    _current.span = span
+    try:
+        yield span
+    finally:
+        _current.span = previous
+        span.total = time.perf_counter() - span.started
+        registry.record_span(span)
+
+@contextmanager
+def timed(stage):
+    """
+    Add the time spent in the block to `stage` ("subprocess", "backoff" or "parse") of the current span.
+
+    Stages don't overlap: time spent in a nested timed block (e.g. parsing
+    output lines while the tool is still running) counts only toward the
+    inner stage, so the stages of a task add up to at most its total.
+    """
+    frames = _current.__dict__.setdefault("frames", [])  # Open timed blocks of this thread
+    nested = [0.0]  # Time spent in blocks nested in this one
+    frames.append(nested)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        frames.pop()
+        if frames:
+            frames[-1][0] += elapsed
+        span = current_span()
+        if span is not None:
+            setattr(span, stage, getattr(span, stage) + elapsed - nested[0])
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, exported in the OpenMetrics text format.
+
+    Metrics are labelled by tool (and, for task counts, by status).
+    """
+
+    COUNTERS = {
+        "agent_tasks": "Finished tasks",
+        "agent_command_attempts": "Tool invocations, including retries",
+        "agent_command_retries": "Tool invocations that were retries",
+        "agent_tool_output_bytes": "Bytes of tool output read",
+        "agent_cache_hits": "Tasks answered from the result cache",
+        "agent_log_records_dropped": "Log records dropped because the audit log queue was full",
+    }
+    HISTOGRAMS = {
+        "agent_task_duration_seconds": "Time from task start to result",
+        "agent_task_queue_wait_seconds": "Time a task waited in the scheduler queue",
+        "agent_subprocess_duration_seconds": "Time spent running the tool, all attempts together",
+        "agent_retry_backoff_seconds": "Time spent sleeping between retries",
+        "agent_parse_duration_seconds": "Time spent parsing tool output",
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0] * len(BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def record_span(self, span):
+        """Fold a finished task span into the metrics."""
+        tool = span.tool or "unknown"
+        self.inc("agent_tasks", tool=tool, status=span.status)
+        self.observe("agent_task_duration_seconds", span.total, tool=tool)
+        if span.cached:
+            self.inc("agent_cache_hits", tool=tool)
+            return
+        self.inc("agent_command_attempts", span.attempts, tool=tool)
+        self.inc("agent_command_retries", max(0, span.attempts - 1), tool=tool)
+        self.inc("agent_tool_output_bytes", span.output_bytes, tool=tool)
+        self.observe("agent_subprocess_duration_seconds", span.subprocess, tool=tool)
+        self.observe("agent_retry_backoff_seconds", span.backoff, tool=tool)
+        self.observe("agent_parse_duration_seconds", span.parse, tool=tool)
+
+    def render(self):
+        """Return all metrics in the OpenMetrics text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+        lines = []
+        for name, help_text in self.COUNTERS.items():
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"# HELP {name} {help_text}")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}_total{_labels(labels)} {value}")
+        for name, help_text in self.HISTOGRAMS.items():
+            lines.append(f"# TYPE {name} histogram")
+            lines.append(f"# HELP {name} {help_text}")
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(BUCKETS, histogram):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', float(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {round(histogram[-2], 6)}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram[-1]}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+# Shared by every task in the process
+registry = MetricsRegistry()
+
+def write_metrics(path=None):
+    """Atomically write the current metrics to an OpenMetrics text file (default METRICS_FILE)."""
+    path = path or METRICS_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Scans in one process may write at once
+    with open(tmp_path, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+    return path
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the audit log
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve the metrics on http://<host>:<port>/ from a background thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+def timing_summary(timings):
+    """
+    Summarize the timing of a scan's tasks for the report.
+
+    Args:
+        timings (list): (task_id, tool, timing dict) for every finished task.
+
+    Returns:
+        dict: Totals per stage, the slowest stage and the slowest tasks.
+    """
+    stages = ("queue_wait", "subprocess", "backoff", "parse")
+    totals = {stage: round(sum(timing.get(stage, 0) for _, _, timing in timings), 4) for stage in stages}
+    slowest = sorted(timings, key=lambda entry: entry[2].get("total", 0), reverse=True)[:5]
+    return {
+        "tasks": len(timings),
+        "retries": sum(timing.get("retries", 0) for _, _, timing in timings),
+        "output_bytes": sum(timing.get("output_bytes", 0) for _, _, timing in timings),
+        "stage_totals": totals,
+        "slowest_stage": max(totals, key=totals.get) if timings else None,
+        "slowest_tasks": [{"task_id": task_id, "tool": tool, **timing} for task_id, tool, timing in slowest],
+    }
@@ -0,0 +1,213 @@
+import json
+import re
+import xml.etree.ElementTree as ET
+from typing import NamedTuple
+
+# Strip terminal escape sequences (gobuster and ffuf colour their progress output)
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+class PortRecord(NamedTuple):
+    """A single port/service entry from an nmap scan."""
+    host: str
+    port: int
+    protocol: str
+    state: str
+    service: str
+    tunnel: str
+    product: str
+
+    def is_web(self):
+        """Check whether the port runs an HTTP(S) service, whatever its port number."""
+        return self.service.startswith("http")
+
+    def url_scheme(self):
+        """Return "https" for TLS-wrapped web services and "http" otherwise."""
+        if self.tunnel == "ssl" or self.service in ("https", "https-alt"):
+            return "https"
+        return "http"
+
+def port_record(host, port_elem):
+    """Build a PortRecord from an nmap XML <port> element."""
+    state = port_elem.find("state")
+    service = port_elem.find("service")
+    return PortRecord(
+        host=host,
+        port=int(port_elem.get("portid")),
+        protocol=port_elem.get("protocol", "tcp"),
+        state=state.get("state", "") if state is not None else "",
+        service=service.get("name", "") if service is not None else "",
+        tunnel=service.get("tunnel", "") if service is not None else "",
+        product=service.get("product", "") if service is not None else ""
+    )
+
+def host_address(host_elem):
+    """Return the IP address of an nmap XML <address> element, or None for MAC addresses."""
+    if host_elem.get("addrtype") in ("ipv4", "ipv6"):
+        return host_elem.get("addr")
+    return None
+
+def parse_nmap_xml(source):
+    """
+    Parse nmap XML output into port records without building the whole tree.
+
+    Elements are discarded as soon as each host has been processed, so memory
+    stays flat even for large multi-host scan files.
+
+    Args:
+        source (str | file): Path to, or file object of, nmap XML output (``-oX``).
+
+    Yields:
+        PortRecord: One record per reported port.
+    """
+    root = None
+    host = ""
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+        if elem.tag == "address":
+            host = host_address(elem) or host
+        elif elem.tag == "port":
+            yield port_record(host, elem)
+        elif elem.tag == "host":
+            host = ""
+            root.clear()  # Drop the finished host and everything below it
+
+def format_port_records(records):
+    """Render port records as a compact, nmap-style text table."""
+    lines = []
+    current_host = None
+    for record in records:
+        if record.host != current_host:
+            current_host = record.host
+            lines.append(f"Nmap scan report for {record.host}")
+            lines.append(f"{'PORT':<10}{'STATE':<10}SERVICE")
+        lines.append(f"{f'{record.port}/{record.protocol}':<10}{record.state:<10}{record.service}")
+    return "\n".join(lines) if lines else "No ports reported"
+
+class NmapXmlParser:
+    """Incrementally parse nmap XML output (``-oX -``) into port events."""
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._parser = ET.XMLPullParser(events=("end",))
+        self._host = ""
+
+    def feed(self, line):
+        """Parse one line of nmap XML output and return the port events it completes."""
+        if line.startswith("<?xml"):
+            self._reset()  # A retried run starts a new document
+        try:
+            self._parser.feed(line + "\n")
+            events = []
+            for _, elem in self._parser.read_events():
+                if elem.tag == "address":
+                    self._host = host_address(elem) or self._host
+                elif elem.tag == "port":
+                    events.append(dict(port_record(self._host, elem)._asdict(), type="port"))
+                elif elem.tag == "host":
+                    self._host = ""
+                    elem.clear()
+            return events
+        except ET.ParseError:
+            return []  # Ignore output that is not well-formed XML (e.g. warnings)
+
+class GobusterLineParser:
+    """Incrementally parse gobuster dir output into discovered path events."""
+
+    PATH_LINE = re.compile(r"^(/\S*)\s+\(Status:\s*(\d+)\)")
+
+    def feed(self, line):
+        """Parse one line of gobuster output and return the events it contains."""
+        match = self.PATH_LINE.match(ANSI_ESCAPE.sub("", line).strip())
+        if not match:
+            return []
+        return [{"type": "path", "path": match.group(1), "status": int(match.group(2))}]
+
+# Fields kept from each ffuf result; the rest (raw input, content type, ...) is dropped
+FFUF_HIT_FIELDS = ("url", "status", "length", "words", "lines", "redirectlocation", "duration")
+
+def ffuf_hit(line):
+    """
+    Parse one line of ffuf ``-json`` output into a compact hit record.
+
+    Returns:
+        dict: The FFUF_HIT_FIELDS of the result, or None for lines that are not results.
+    """
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict) or "url" not in entry:
+        return None
+    return {field: entry[field] for field in FFUF_HIT_FIELDS if entry.get(field) not in (None, "")}
+
+def format_ffuf_hits(hits):
+    """Render ffuf hits as a compact text table."""
+    if not hits:
+        return "No results found"
+    lines = [f"{'STATUS':<8}{'LENGTH':<10}{'WORDS':<8}URL"]
+    for hit in hits:
+        lines.append(f"{hit.get('status', ''):<8}{hit.get('length', ''):<10}{hit.get('words', ''):<8}{hit['url']}")
+    return "\n".join(lines)
+
+class FfufJsonParser:
+    """Incrementally parse ffuf ``-json`` output into hit events."""
+
+    def feed(self, line):
+        """Parse one line of ffuf output and return the hit event it contains, if any."""
+        hit = ffuf_hit(line)
+        return [dict(hit, type="hit")] if hit else []
+
+class SqlmapLineParser:
+    """
+    Incrementally parse sqlmap output into injectable parameter events.
+
+    When sqlmap tests several URLs (a bulk file, or the forms of a page) it
+    announces each one ("GET http://..."); events then carry the "url" they
+    were found on.
+    """
+
+    PARAMETER_LINE = re.compile(r"^Parameter:\s*(.+?)\s+\((\w[\w ]*)\)$")
+    TARGET_LINE = re.compile(r"^(?:GET|POST|PUT)\s+(https?://\S+)$")
+
+    def __init__(self):
+        self.url = None
+
+    def feed(self, line):
+        """Parse one line of sqlmap output and return the events it contains."""
+        line = ANSI_ESCAPE.sub("", line).strip()
+        target = self.TARGET_LINE.match(line)
+        if target:
+            self.url = target.group(1)
+            return []
+        match = self.PARAMETER_LINE.match(line)
+        if not match:
+            return []
+        event = {"type": "injection", "parameter": match.group(1), "place": match.group(2)}
+        if self.url:
+            event["url"] = self.url
+        return [event]
+
+class NullParser:
+    """Parser for tools whose streamed output carries no structured events."""
+
+    def feed(self, line):
+        return []
+
+PARSERS = {
+    "nmap": NmapXmlParser,
+    "gobuster": GobusterLineParser,
+    "ffuf": FfufJsonParser,
+    "sqlmap": SqlmapLineParser,
+}
+
+def get_parser(tool):
+    """Return a fresh incremental output parser for the given tool."""
+    return PARSERS.get(tool, NullParser)()
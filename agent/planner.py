@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from agent.cost_model import get_runtime_history, work_units
+from agent.task_manager import extract_host
+from config import MAX_WORKERS, TOOL_CONCURRENCY, MIN_WORDLIST_FRACTION
+
+# Tools whose scans can be trimmed to a leading part of their wordlist
+TRIMMABLE_TOOLS = ("gobuster", "ffuf")
+
+def task_label(task):
+    """Name of a task in plans and reports: its id, or tool:target (plus its shard) before it has one."""
+    if task.get("id"):
+        return task["id"]
+    label = f"{task['tool']}:{task['target']}"
+    if "shard" in task:
+        label += f"#{task['shard'] + 1}/{task['shards']}"
+    return label
+
+class ScanPlanner:
+    """
+    Orders a scan's tasks by estimated cost and fits them into a time budget.
+
+    Task durations come from the runtime history (see agent.cost_model).
+    Tasks are ordered longest critical path first: the task's own estimate,
+    plus for nmap the gobuster follow-ups it will start. With a `budget` the
+    scheduler is simulated (MAX_WORKERS and the per-tool limits) and every
+    task that would end past the budget is trimmed (gobuster/ffuf run over
+    the leading part of their wordlist, down to MIN_WORDLIST_FRACTION of it)
+    or skipped. Follow-up tasks found while the scan runs are admitted against
+    the time left (see admit). Trimmed and skipped tasks are listed in summary().
+
+    Args:
+        budget (float): Seconds the scan may take; None only orders the tasks.
+        history (RuntimeHistory): Source of estimates; the process-wide history if omitted.
+        max_workers (int): Global cap on running tasks, as in TaskScheduler.
+        tool_limits (dict): Per-tool concurrency limits, as in TaskScheduler.
+    """
+
+    def __init__(self, budget=None, history=None, max_workers=MAX_WORKERS, tool_limits=None):
+        self.budget = budget
+        self.history = history or get_runtime_history()
+        self.max_workers = max(1, max_workers)
+        self.tool_limits = dict(TOOL_CONCURRENCY if tool_limits is None else tool_limits)
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._planned = {}  # label -> estimate (seconds) of every task let through
+        self._admitted = {}  # label -> follow-up task as admitted
+        self._trimmed = []
+        self._skipped = {}  # label -> skip record
+
+    def critical_path(self, task):
+        """Estimated seconds from the start of a task until the follow-ups it triggers are done."""
+        path = self.history.estimate(task)
+        if task["tool"] == "nmap":
+            path += self.history.estimate({"tool": "gobuster", "target": f"https://{extract_host(task['target'])}"})
+        return path
+
+    def _fit(self, task, estimate, available):
+        """
+        Fit a task into `available` seconds.
+
+        Returns:
+            tuple: (task, estimate), with the task trimmed if needed, or (None, reason) if it can't fit.
+        """
+        if estimate <= available:
+            return task, estimate
+        if task["tool"] in TRIMMABLE_TOOLS:
+            entries = work_units(task)
+            keep = int(entries * available / estimate) if entries and available > 0 else 0
+            if keep and keep >= MIN_WORDLIST_FRACTION * entries:
+                trimmed = dict(task, wordlist_limit=keep)
+                self._trimmed.append({"task": task_label(task), "tool": task["tool"], "target": task["target"],
+                                      "entries": entries, "kept": keep})
+                return trimmed, self.history.estimate(trimmed)
+        return None, f"estimated {estimate:.0f}s, {max(0.0, available):.0f}s left in the budget"
+
+    def _skip(self, task, estimate, reason):
+        label = task_label(task)
+        logging.warning(f"Skipping {label} to stay within the {self.budget:.0f}s budget: {reason}")
+        self._skipped[label] = {"task": label, "tool": task["tool"], "target": task["target"],
+                                "estimate": round(estimate, 1), "reason": reason}
+
+    def plan(self, tasks):
+        """
+        Order (and, with a budget, trim or drop) the initial tasks of a scan.
+
+        Returns:
+            list: The tasks to run, in the order to queue them.
+        """
+        ordered = sorted(tasks, key=self.critical_path, reverse=True)
+        planned = []
+        worker_free = [0.0] * self.max_workers  # When each simulated worker is next free
+        tool_free = {}  # tool -> when each of its slots is next free
+        with self._lock:
+            for task in ordered:
+                estimate = self.history.estimate(task)
+                if self.budget is None:
+                    self._planned[task_label(task)] = estimate
+                    planned.append(task)
+                    continue
+                limit = self.tool_limits.get(task["tool"])
+                slots = tool_free.setdefault(task["tool"], [0.0] * max(1, limit)) if limit is not None else [0.0]
+                worker = min(range(len(worker_free)), key=worker_free.__getitem__)
+                slot = min(range(len(slots)), key=slots.__getitem__)
+                start = max(worker_free[worker], slots[slot])
+                fitted, fitted_estimate = self._fit(task, estimate, self.budget - start)
+                if fitted is None:
+                    self._skip(task, estimate, fitted_estimate)
+                    continue
+                worker_free[worker] = slots[slot] = start + fitted_estimate
+                self._planned[task_label(task)] = fitted_estimate
+                planned.append(fitted)
+        return planned
+
+    def admit(self, task):
+        """
+        Decide whether a follow-up task found during the scan still fits in the time left.
+
+        Returns:
+            dict: The task (possibly trimmed), or None if it is skipped.
+        """
+        if self.budget is None:
+            return task
+        label = task_label(task)
+        with self._lock:
+            if label in self._admitted:
+                return self._admitted[label]  # The same follow-up seen again (live and in the final result)
+            if label in self._skipped:
+                return None
+            estimate = self.history.estimate(task)
+            available = self.budget - (time.monotonic() - self.started)
+            fitted, fitted_estimate = self._fit(task, estimate, available)
+            if fitted is None:
+                self._skip(task, estimate, fitted_estimate)
+                return None
+            self._admitted[label] = fitted
+            self._planned[label] = fitted_estimate
+            return fitted
+
+    def summary(self):
+        """The plan for reports: budget, estimated seconds per task, and the trimmed and skipped tasks."""
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "estimates": {label: round(estimate, 1) for label, estimate in self._planned.items()},
+                "trimmed": list(self._trimmed),
+                "skipped": list(self._skipped.values()),
+            }
@@ -0,0 +1,159 @@
+import contextvars
+import errno
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from agent.blob_store import get_blob_store
+from config import TOOL_OUTPUT_MEMORY_BYTES, TOOL_CPU_SECONDS, TOOL_MEMORY_BYTES
+
+class CommandCancelled(Exception):
+    """Raised when a running command is killed because its task was cancelled."""
+
+# Cancellation event of the task running in the current context (see cancel_scope)
+_cancel_event = contextvars.ContextVar("cancel_event", default=None)
+
+@contextmanager
+def cancel_scope(event):
+    """Kill every command started inside the block (on this thread) once `event` is set."""
+    token = _cancel_event.set(event)
+    try:
+        yield event
+    finally:
+        _cancel_event.reset(token)
+
+def current_cancel_event():
+    """Return the cancellation event of the running task, or None."""
+    return _cancel_event.get()
+
+def run_cancellable(event, function, *args, **kwargs):
+    """Call `function` inside cancel_scope(event); for executor threads, which don't inherit context."""
+    with cancel_scope(event):
+        return function(*args, **kwargs)
+
+def command_args(command):
+    """
+    Split a command line into an argument list, so it runs without a shell.
+
+    On Windows the command line is passed to the process as it is.
+    """
+    if isinstance(command, (list, tuple)):
+        return list(command)
+    return shlex.split(command) if os.name == "posix" else command
+
+# Run as `python -c _LIMIT_SHIM <cpu seconds> <address space bytes> <program> [args...]`: sets the
+# limits on itself, then replaces itself with the program (same pid, same process group)
+_LIMIT_SHIM = (
+    "import os, resource, sys\n"
+    "cpu, memory = int(sys.argv[1]), int(sys.argv[2])\n"
+    "if cpu: resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))\n"
+    "if memory: resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n"
+    "os.execv(sys.argv[3], sys.argv[3:])\n"
+)
+
+def limited_args(args, cpu_seconds, memory_bytes):
+    """
+    Wrap an argument list so the program runs under CPU-time and address-space limits.
+
+    The limits are set by a small Python shim that then execs the program,
+    rather than by a preexec_fn, which isn't safe to use when other threads
+    are running (the scheduler starts tools from many threads at once).
+
+    Raises:
+        FileNotFoundError: If the program is not installed.
+    """
+    program = shutil.which(args[0])
+    if program is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), args[0])
+    return [sys.executable, "-I", "-S", "-c", _LIMIT_SHIM, str(cpu_seconds or 0), str(memory_bytes or 0), program] + args[1:]
+
+def spawn(command, cpu_seconds=TOOL_CPU_SECONDS, memory_bytes=TOOL_MEMORY_BYTES, **popen_args):
+    """
+    Start a tool process without a shell, as the leader of its own process group.
+
+    Everything the tool starts in turn stays in that group, so
+    kill_process_tree() can stop all of it. On POSIX systems the CPU time
+    (seconds) and address space (bytes) of the process can be limited
+    (see limited_args); 0 means unlimited.
+
+    Returns:
+        subprocess.Popen: The process.
+
+    Raises:
+        FileNotFoundError: If the tool is not installed.
+    """
+    args = command_args(command)
+    if os.name == "posix":
+        popen_args["start_new_session"] = True
+        if cpu_seconds or memory_bytes:
+            args = limited_args(args, cpu_seconds, memory_bytes)
+    else:
+        popen_args["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    return subprocess.Popen(args, **popen_args)
+
+def kill_process_tree(process):
+    """Kill a process started by spawn() together with everything it started."""
+    if os.name == "posix":
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass  # The whole group has already exited
+    else:
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+        process.kill()
+
+class OutputBuffer:
+    """
+    Captured output of a command, held in memory up to `max_memory` bytes.
+
+    Past that, everything is written to an anonymous temporary file instead,
+    so a chatty tool can't push its whole output into memory. Spilled output
+    is moved to the blob store with to_blob() rather than read back.
+
+    Args:
+        max_memory (int): Bytes kept in memory before spilling to disk (default TOOL_OUTPUT_MEMORY_BYTES).
+    """
+
+    def __init__(self, max_memory=None):
+        self.max_memory = TOOL_OUTPUT_MEMORY_BYTES if max_memory is None else max_memory
+        self.size = 0
+        self._chunks = []
+        self._file = None
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    def write(self, text):
+        data = text.encode("utf-8", errors="replace")
+        self.size += len(data)
+        if self._file is None and self.size > self.max_memory:
+            self._file = tempfile.TemporaryFile()
+            self._file.writelines(self._chunks)
+            self._chunks = []
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._chunks.append(data)
+
+    def getvalue(self):
+        """Return the output as text; only for output that was not spilled."""
+        if self.spilled:
+            raise ValueError("Output was spilled to disk; use to_blob()")
+        return b"".join(self._chunks).decode("utf-8", errors="replace")
+
+    def to_blob(self):
+        """Copy the output into the blob store and return its handle."""
+        if not self.spilled:
+            return get_blob_store().put(b"".join(self._chunks))
+        self._file.seek(0)
+        return get_blob_store().put_file(self._file)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._chunks = []
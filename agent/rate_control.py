@@ -0,0 +1,101 @@
+import logging
+import threading
+from typing import NamedTuple
+from config import ADAPTIVE_CONCURRENCY, TOOL_THREADS, HOST_RPS_BUDGET, HOST_RATE_SHARES, LATENCY_TARGET
+from agent.retry import HOST_FAILURES
+
+# Multiplicative decrease applied to threads and rate when a host struggles
+DECREASE_FACTOR = 0.5
+
+# Lowest request rate an invocation is ever given
+MIN_RATE = 1.0
+
+class ToolSettings(NamedTuple):
+    """Thread count and request rate for one tool invocation."""
+    host: str
+    tool: str
+    threads: int
+    rate: float  # Requests per second; None when rate limiting is off
+
+class ConcurrencyController:
+    """
+    AIMD controller for the thread count and request rate of each tool against each host.
+
+    Every invocation asks for its settings with acquire() and reports how it
+    went with release(). A clean run increases the tool's thread count for
+    that host by a fixed step and the host's request rate by a tenth of the
+    budget (additive increase); a network error, a timeout or a latency above
+    `latency_target` halves both (multiplicative decrease). The host's rate,
+    capped at `host_budget`, is handed out to the invocations running against
+    the host: each one gets 1/`shares` of it, or what running invocations have
+    left of it, and returns its share on release(). A tool's rate is fixed on
+    its command line for the whole run, so the rates of the invocations
+    running against a host never add up to more than the host's rate (beyond
+    MIN_RATE per invocation started while the budget is all taken).
+
+    Args:
+        tool_threads (dict): (minimum, initial, maximum) threads per tool.
+        host_budget (float): Maximum requests per second per host, across all tools.
+        shares (int): Number of invocations the host's rate is split between.
+        latency_target (float): Mean response time (seconds) above which tools back off.
+        enabled (bool): When off, every invocation gets the tool's initial thread count and no rate limit.
+    """
+
+    def __init__(self, tool_threads=None, host_budget=HOST_RPS_BUDGET, latency_target=LATENCY_TARGET,
+                 enabled=ADAPTIVE_CONCURRENCY, shares=HOST_RATE_SHARES):
+        self.tool_threads = dict(TOOL_THREADS if tool_threads is None else tool_threads)
+        self.host_budget = host_budget
+        self.shares = max(1, shares)
+        self.latency_target = latency_target
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._threads = {}  # (host, tool) -> current thread count
+        self._rates = {}  # host -> current requests per second for all tools together
+        self._allocated = {}  # host -> requests per second handed to running invocations
+
+    def _limits(self, tool):
+        return self.tool_threads.get(tool, (1, 1, 1))
+
+    def acquire(self, host, tool):
+        """Register an invocation of `tool` against `host` and return its settings."""
+        minimum, initial, maximum = self._limits(tool)
+        if not self.enabled:
+            return ToolSettings(host, tool, initial, None)
+        with self._lock:
+            threads = self._threads.setdefault((host, tool), initial)
+            host_rate = self._rates.setdefault(host, self.host_budget)
+            allocated = self._allocated.get(host, 0.0)
+            rate = round(max(MIN_RATE, min(host_rate / self.shares, host_rate - allocated)), 1)
+            self._allocated[host] = allocated + rate
+        return ToolSettings(host, tool, threads, rate)
+
+    def release(self, settings, failure=None, latency=None):
+        """
+        Finish an invocation and adapt the settings for its host.
+
+        Args:
+            settings (ToolSettings): What acquire() returned.
+            failure (str): Failure class of the invocation (see agent.retry), None on success.
+            latency (float): Mean response time observed by the tool, in seconds, if known.
+        """
+        if not self.enabled:
+            return
+        host, tool = settings.host, settings.tool
+        minimum, _, maximum = self._limits(tool)
+        congested = failure in HOST_FAILURES or (latency is not None and latency > self.latency_target)
+        with self._lock:
+            self._allocated[host] = max(0.0, self._allocated.get(host, 0.0) - settings.rate)
+            threads = self._threads.get((host, tool), minimum)
+            rate = self._rates.get(host, self.host_budget)
+            if congested:
+                threads = max(minimum, int(threads * DECREASE_FACTOR))
+                rate = max(MIN_RATE, rate * DECREASE_FACTOR)
+                logging.info(f"Backing off {tool} on {host}: {threads} threads, {rate:.1f} req/s")
+            elif failure is None:
+                threads = min(maximum, threads + max(1, maximum // 10))
+                rate = min(self.host_budget, rate + self.host_budget / 10)
+            self._threads[(host, tool)] = threads
+            self._rates[host] = rate
+
+# Shared by every tool in the process, so concurrent scans of one host share its budget
+rate_controller = ConcurrencyController()
@@ -0,0 +1,155 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from config import REPORT_COMPRESSION, REPORT_DIR
+
+try:
+    import zstandard  # Optional: only needed for zstd-compressed reports
+except ImportError:
+    zstandard = None
+
+EXTENSIONS = {"": ".ndjson", "gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+def report_dir():
+    """Return the directory scan reports are written to (REPORT_DIR)."""
+    return REPORT_DIR
+
+def report_path(name, compression=REPORT_COMPRESSION, directory=None):
+    """Build the path of a report file (in report_dir() by default), with the extension matching its compression."""
+    directory = report_dir() if directory is None else directory
+    return os.path.join(directory, f"{name}{EXTENSIONS.get(compression or '', '.ndjson')}")
+
+def compression_of(path):
+    """Infer the compression of a report file from its extension."""
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return ""
+
+def _compress(data, compression):
+    if compression == "gzip":
+        return gzip.compress(data)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+def _decompress(data, compression):
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+class ReportSink:
+    """
+    Streaming report writer: one NDJSON record per task result, written as it completes.
+
+    With compression enabled every record is its own gzip member or zstd
+    frame. The file as a whole is still a valid .gz/.zst stream, yet any
+    single record can be read back by seeking to its offset. A side index
+    (`<report>.idx`, NDJSON as well) stores the offset and length of each
+    record by target and tool.
+
+    Args:
+        path (str): Report file; appended to if it already exists (e.g. a resumed scan).
+        compression (str): "" for plain NDJSON, "gzip" or "zstd". Inferred from the path if omitted.
+    """
+
+    def __init__(self, path, compression=None):
+        if compression is None:
+            compression = compression_of(path)
+        if compression == "zstd" and zstandard is None:
+            logging.warning("zstandard is not installed, writing a gzip report instead")
+            compression = "gzip"
+            path = path[:-len(".zst")] + ".gz" if path.endswith(".zst") else path
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.compression = compression
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._data = open(path, "ab")
+        self._index = open(self.index_path, "a")
+
+    def write(self, target, tool, result, **fields):
+        """
+        Append one task result to the report and record where it was written.
+
+        Args:
+            target (str): The scanned target the result belongs to.
+            tool (str): The tool that produced the result.
+            result (dict): The task result.
+            **fields: Extra fields stored with the record (e.g. scan_id, task_id).
+        """
+        record = dict(fields, target=target, tool=tool, result=result, ts=time.time())
+        data = _compress((json.dumps(record) + "\n").encode(), self.compression)
+        with self._lock:
+            offset = self._data.tell()
+            self._data.write(data)
+            self._data.flush()
+            entry = {"target": target, "tool": tool, "offset": offset, "length": len(data)}
+            if "task_id" in fields:
+                entry["task_id"] = fields["task_id"]
+            self._index.write(json.dumps(entry) + "\n")
+            self._index.flush()
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ReportReader:
+    """
+    Random access to a report written by ReportSink.
+
+    Only the small side index is read up front; individual records are read
+    by seeking to their offset, so a single result can be shown without
+    parsing the whole report.
+
+    Args:
+        path (str): The report file (not the .idx file).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.compression = compression_of(path)
+        self.entries = []
+        with open(f"{path}.idx", "r") as f:
+            for line in f:
+                try:
+                    self.entries.append(json.loads(line))
+                except ValueError:
+                    continue  # A record still being written by a running scan
+
+    def targets(self):
+        """Return the targets in the report, in the order they first appear."""
+        return list(dict.fromkeys(entry["target"] for entry in self.entries))
+
+    def tools(self, target):
+        """Return the tools with results for a target."""
+        return list(dict.fromkeys(entry["tool"] for entry in self.entries if entry["target"] == target))
+
+    def read(self, target, tool=None):
+        """
+        Read the records of one target, optionally limited to one tool.
+
+        Returns:
+            list: Full report records ({"target", "tool", "result", ...}).
+        """
+        records = []
+        with open(self.path, "rb") as f:
+            for entry in self.entries:
+                if entry["target"] != target or (tool is not None and entry["tool"] != tool):
+                    continue
+                f.seek(entry["offset"])
+                records.append(json.loads(_decompress(f.read(entry["length"]), self.compression)))
+        return records
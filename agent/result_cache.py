@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from agent.blob_store import get_blob_store
+from config import CACHE_DIR, CACHE_MAX_BYTES, CACHE_TTLS
+
+def normalize_target(target):
+    """
+    Normalize a target so equivalent spellings share a cache entry.
+
+    The scheme and host are lowercased and trailing slashes are dropped, e.g.
+    "HTTPS://Example.com/" and "https://example.com" map to the same key.
+    """
+    target = target.strip()
+    scheme, sep, rest = target.partition("://")
+    if not sep:
+        scheme, rest = "", target
+    host, slash, path = rest.partition("/")
+    normalized = f"{scheme.lower()}://{host.lower()}" if sep else host.lower()
+    if path.rstrip("/"):
+        normalized += slash + path.rstrip("/")
+    return normalized
+
+_file_hashes = {}  # (path, mtime_ns, size) -> sha256, so unchanged wordlists are hashed once
+
+def file_hash(path):
+    """Return the SHA-256 of a file's content, reusing the result while the file is unchanged."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+def make_key(tool, target, arguments, options=None, wordlist_hash=None):
+    """
+    Build the cache key for one tool invocation.
+
+    Args:
+        tool (str): Tool name.
+        target (str): Target as passed to the tool (normalized here).
+        arguments (str): The tool's full fixed argument set.
+        options (dict): Per-task options that change the invocation.
+        wordlist_hash (str): Content hash of the wordlist, for wordlist-driven tools.
+
+    Returns:
+        str: A hex digest identifying the invocation.
+    """
+    material = json.dumps(
+        [tool, normalize_target(target), arguments, options or {}, wordlist_hash],
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+class ResultCache:
+    """
+    On-disk cache of tool results with per-tool TTLs and size-bounded LRU eviction.
+
+    Each entry is one JSON file named after its key. Files are written
+    atomically, and an entry's modification time is bumped on every hit so the
+    least recently used entries are evicted first once the cache grows past
+    `max_bytes`.
+
+    Args:
+        directory (str): Directory holding the cache entries.
+        max_bytes (int): Upper bound on the total size of all entries.
+        ttls (dict): Time-to-live in seconds per tool name.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, ttls=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        existing = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, name))
+                existing.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+            self._total += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _forget(self, key):
+        """Remove an entry from the index and from disk."""
+        self._total -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass  # Already evicted by another process
+
+    def get(self, key, tool):
+        """
+        Look up a cached result.
+
+        Returns:
+            dict: The cached result, or None on a miss, an expired entry, or
+            an entry whose raw output was removed from the blob store.
+        """
+        try:
+            with open(self._path(key), "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        with self._lock:
+            if time.time() - entry.get("created", 0) > self.ttls.get(tool, 0):
+                self._forget(key)  # Expired
+                return None
+            if "output_ref" in entry["result"] and not get_blob_store().exists(entry["result"]["output_ref"]):
+                self._forget(key)  # Its raw output is gone
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            try:
+                os.utime(self._path(key))  # Record the access for LRU ordering
+            except FileNotFoundError:
+                pass
+        return entry["result"]
+
+    def put(self, key, tool, result):
+        """Store a result and evict the least recently used entries if the cache is too large."""
+        if self.ttls.get(tool, 0) <= 0:
+            return  # Caching is disabled for this tool
+
+        data = json.dumps({"tool": tool, "created": time.time(), "result": result})
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))  # Atomic, readers never see partial entries
+
+        with self._lock:
+            self._total -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total += len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                logging.info(f"Evicting cached result {oldest}")
+                self._forget(oldest)
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide result cache, creating it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
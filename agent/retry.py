@@ -0,0 +1,145 @@
+import logging
+import random
+import subprocess
+import threading
+import time
+from agent.process import CommandCancelled
+from config import RETRY_BASE_DELAY, RETRY_MAX_DELAY, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+
+# Failure classes reported by classify_failure
+MISSING_BINARY = "missing_binary"
+BAD_ARGUMENTS = "bad_arguments"
+TRANSIENT_NETWORK = "transient_network"
+TIMEOUT = "timeout"
+UNKNOWN = "unknown"
+CIRCUIT_OPEN = "circuit_open"
+CANCELLED = "cancelled"
+
+# Failures that may go away on their own; everything else fails immediately.
+# Unclassified failures keep being retried, as they were before classification.
+RETRYABLE = {TRANSIENT_NETWORK, TIMEOUT, UNKNOWN}
+
+# Failures that say something about the target host rather than our invocation
+HOST_FAILURES = {TRANSIENT_NETWORK, TIMEOUT}
+
+NETWORK_PATTERNS = (
+    "connection refused",
+    "connection reset",
+    "connection timed out",
+    "i/o timeout",
+    "no route to host",
+    "network is unreachable",
+    "temporary failure in name resolution",
+    "name or service not known",
+    "no such host",
+    "could not resolve",
+    "tls handshake",
+    "unable to connect",
+)
+
+ARGUMENT_PATTERNS = (
+    "flag provided but not defined",
+    "unknown flag",
+    "unknown option",
+    "invalid option",
+    "invalid argument",
+    "unrecognized arguments",
+    "no such file or directory",
+    "usage:",
+)
+
+def classify_failure(returncode=None, stderr="", exception=None):
+    """
+    Classify a failed command so the retry engine knows whether retrying can help.
+
+    Args:
+        returncode (int): Exit code of the command, if it ran.
+        stderr (str): Error output of the command.
+        exception (Exception): Exception raised while running the command, if any.
+
+    Returns:
+        str: One of MISSING_BINARY, BAD_ARGUMENTS, TRANSIENT_NETWORK, TIMEOUT, CANCELLED or UNKNOWN.
+    """
+    if isinstance(exception, subprocess.TimeoutExpired):
+        return TIMEOUT
+    if isinstance(exception, CommandCancelled):
+        return CANCELLED
+    if isinstance(exception, FileNotFoundError) or returncode in (126, 127):
+        return MISSING_BINARY  # The tool is not installed or not executable
+
+    text = (stderr or str(exception or "")).lower()
+    if "command not found" in text:
+        return MISSING_BINARY
+    if any(pattern in text for pattern in NETWORK_PATTERNS):
+        return TRANSIENT_NETWORK
+    if any(pattern in text for pattern in ARGUMENT_PATTERNS):
+        return BAD_ARGUMENTS
+    return UNKNOWN
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """
+    Return the delay before retry number `attempt` (starting at 0).
+
+    Uses exponential backoff with full jitter, so concurrent workers retrying
+    against the same host spread out instead of retrying in lockstep.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker shared by all tools.
+
+    After `threshold` consecutive network failures or timeouts against a host,
+    the circuit opens and every command against that host fails fast for
+    `reset_seconds`. After that one trial command is let through: success
+    closes the circuit, another failure opens it again.
+
+    Args:
+        threshold (int): Consecutive host failures that open the circuit.
+        reset_seconds (float): How long the circuit stays open.
+    """
+
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = {}  # host -> consecutive host failures
+        self._opened_at = {}  # host -> time the circuit opened
+        self._trial_running = set()  # hosts with a half-open trial in flight
+
+    def allow(self, host):
+        """Check whether a command against `host` may run now."""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at < self.reset_seconds or host in self._trial_running:
+                return False
+            self._trial_running.add(host)  # Half-open: let a single trial through
+            return True
+
+    def record_success(self, host):
+        """Close the circuit for `host` after a successful command."""
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._trial_running.discard(host)
+
+    def record_failure(self, host, kind):
+        """Count a failed command against `host`; only network failures and timeouts count."""
+        with self._lock:
+            was_trial = host in self._trial_running
+            self._trial_running.discard(host)
+            if kind not in HOST_FAILURES:
+                if was_trial:
+                    self._opened_at.pop(host, None)  # The host answered, the command was at fault
+                    self._failures.pop(host, None)
+                return
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if was_trial or self._failures[host] >= self.threshold:
+                if host not in self._opened_at or was_trial:
+                    logging.warning(f"Circuit opened for {host} after {self._failures[host]} failures")
+                self._opened_at[host] = time.monotonic()
+
+# Shared by every tool in the process, so one unresponsive host stops all of them
+circuit_breaker = CircuitBreaker()
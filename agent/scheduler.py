@@ -0,0 +1,180 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import MAX_WORKERS, TOOL_CONCURRENCY
+from agent.metrics import registry
+
+class TaskScheduler:
+    """
+    Dependency-aware scheduler that runs security tasks concurrently.
+
+    Tasks form a dependency graph: a task becomes ready once every task it
+    depends on has finished (successfully or not), and ready tasks are started
+    as long as both the global worker cap and the per-tool limit allow it.
+    Tasks may be added while the scheduler is running, which is how follow-up
+    scans triggered by earlier results (e.g. gobuster after nmap) are queued.
+
+    Args:
+        execute (callable): Function that runs a single task dict and returns its result dict.
+        max_workers (int): Global cap on the number of tasks running at once.
+        tool_limits (dict): Maximum number of concurrent tasks per tool name.
+        on_complete (callable): Optional callback ``(task, result, scheduler)``
+            invoked after each task finishes; it may add new tasks.
+        on_enqueue (callable): Optional callback ``(task, depends_on)`` invoked
+            when a new task is queued.
+        on_start (callable): Optional callback ``(task)`` invoked right before a task runs.
+    """
+
+    def __init__(self, execute, max_workers=MAX_WORKERS, tool_limits=None, on_complete=None,
+                 on_enqueue=None, on_start=None):
+        self.execute = execute
+        self.max_workers = max(1, max_workers)
+        self.tool_limits = dict(TOOL_CONCURRENCY if tool_limits is None else tool_limits)
+        self.on_complete = on_complete
+        self.on_enqueue = on_enqueue
+        self.on_start = on_start
+
+        self._cond = threading.Condition()
+        self._tasks = {}  # task_id -> task dict, in insertion order
+        self._deps = {}  # task_id -> set of task ids it waits for
+        self._pending = []  # task ids that have not been started yet
+        self._results = {}  # task_id -> result dict
+        self._running = {}  # tool -> number of running tasks
+        self._active = 0  # total number of running tasks
+        self._counter = 0
+        self._enqueued_at = {}  # task_id -> time the task was queued
+        self._context = contextvars.copy_context()
+
+    def add_task(self, task, depends_on=()):
+        """
+        Queue a task for execution.
+
+        Args:
+            task (dict): Task with at least a "tool" and a "target" key.
+            depends_on (iterable): Ids of tasks that must finish before this one starts.
+
+        Returns:
+            str: The id assigned to the task.
+        """
+        with self._cond:
+            self._counter += 1
+            task_id = task.get("id") or f"{task['tool']}-{self._counter}"
+            if task_id in self._tasks:
+                return task_id  # Already queued, don't run the same task twice
+
+            task = dict(task, id=task_id)
+            self._tasks[task_id] = task
+            self._deps[task_id] = set(depends_on)
+            # Report the task before it can be dispatched, so listeners always
+            # see a task queued before it starts
+            if self.on_enqueue:
+                self.on_enqueue(task, sorted(self._deps[task_id]))
+            self._pending.append(task_id)
+            self._enqueued_at[task_id] = time.perf_counter()
+            self._cond.notify_all()
+        return task_id
+
+    def restore(self, task, result):
+        """
+        Register a task that already finished (e.g. in an interrupted run).
+
+        The task counts as finished for dependency purposes, is included in
+        the results of run() and will not be queued again by add_task.
+
+        Args:
+            task (dict): The finished task, including its "id".
+            result (dict): The result it produced.
+        """
+        with self._cond:
+            self._tasks.setdefault(task["id"], dict(task))
+            self._deps.setdefault(task["id"], set())
+            self._results[task["id"]] = result
+            self._cond.notify_all()
+
+    def _is_ready(self, task_id):
+        """Check whether all dependencies of a task have finished."""
+        return all(dep in self._results for dep in self._deps[task_id])
+
+    def _has_capacity(self, tool):
+        """Check the global worker cap and the per-tool limit."""
+        if self._active >= self.max_workers:
+            return False
+        limit = self.tool_limits.get(tool)
+        return limit is None or self._running.get(tool, 0) < max(1, limit)
+
+    def _dispatch_ready(self, pool):
+        """Start every ready task that fits within the concurrency limits."""
+        for task_id in list(self._pending):
+            if self._active >= self.max_workers:
+                break
+            task = self._tasks[task_id]
+            if not self._is_ready(task_id) or not self._has_capacity(task["tool"]):
+                continue
+            self._pending.remove(task_id)
+            self._active += 1
+            self._running[task["tool"]] = self._running.get(task["tool"], 0) + 1
+            # Tasks run in a copy of run()'s context, so they share its log context (scan id)
+            pool.submit(self._context.copy().run, self._run_task, task_id, task)
+
+    def _fail_unresolvable(self):
+        """Fail pending tasks whose dependencies can never be satisfied."""
+        for task_id in self._pending:
+            missing = sorted(self._deps[task_id] - set(self._results))
+            logging.error(f"Task {task_id} has unresolved dependencies: {missing}")
+            self._results[task_id] = {
+                "status": "failed",
+                "error": f"Unresolved dependencies: {', '.join(missing)}"
+            }
+        self._pending = []
+
+    def _run_task(self, task_id, task):
+        """Execute one task in a worker thread and record its result."""
+        queue_wait = time.perf_counter() - self._enqueued_at.get(task_id, time.perf_counter())
+        registry.observe("agent_task_queue_wait_seconds", queue_wait, tool=task["tool"])
+        try:
+            if self.on_start:
+                self.on_start(task)
+            result = self.execute(task)
+        except Exception as e:
+            logging.error(f"Task {task_id} raised an exception: {str(e)}")
+            result = {"status": "failed", "error": str(e)}
+        if isinstance(result, dict):
+            # Time spent waiting for dependencies and a free worker
+            result["timing"] = dict(result.get("timing", {}), queue_wait=round(queue_wait, 4))
+
+        # Let the callback queue follow-up tasks before this one is marked as
+        # finished, so the scheduler never sees an empty queue in between
+        if self.on_complete:
+            try:
+                self.on_complete(task, result, self)
+            except Exception as e:
+                logging.error(f"Completion callback failed for task {task_id}: {str(e)}")
+
+        with self._cond:
+            self._results[task_id] = result
+            self._active -= 1
+            self._running[task["tool"]] -= 1
+            self._cond.notify_all()
+
+    def run(self):
+        """
+        Run all queued tasks (and any tasks added along the way) to completion.
+
+        Returns:
+            list: ``(task, result)`` pairs in the order the tasks were added.
+        """
+        self._context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            with self._cond:
+                while self._pending or self._active:
+                    self._dispatch_ready(pool)
+                    if self._pending and not self._active:
+                        # Nothing is running and nothing could start: the
+                        # remaining tasks wait on ids that will never finish
+                        self._fail_unresolvable()
+                        break
+                    self._cond.wait()
+
+        return [(task, self._results[task_id]) for task_id, task in self._tasks.items()]
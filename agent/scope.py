@@ -0,0 +1,124 @@
+import ipaddress
+import threading
+from bisect import bisect_right
+import config
+
+class DomainTrie:
+    """
+    Suffix trie over reversed domain labels.
+
+    "api.example.com" is stored as com -> example -> api, so a lookup walks
+    the target's labels from the right and matches an allowed domain and all
+    of its subdomains in time proportional to the number of labels.
+    """
+
+    def __init__(self, domains=()):
+        self._root = {}
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain):
+        node = self._root
+        for label in reversed(domain.split(".")):
+            node = node.setdefault(label, {})
+        node[None] = True  # Marks the end of an allowed domain
+
+    def contains(self, host):
+        """Check whether `host` is an allowed domain or a subdomain of one."""
+        node = self._root
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if None in node:
+                return True
+        return False
+
+class NetworkIntervals:
+    """
+    Sorted, merged integer intervals of allowed networks for one IP version.
+
+    Membership is a single binary search over the interval start addresses.
+    """
+
+    def __init__(self, networks=()):
+        intervals = sorted((int(n.network_address), int(n.broadcast_address)) for n in networks)
+        self.starts = []
+        self.ends = []
+        for start, end in intervals:
+            if self.ends and start <= self.ends[-1] + 1:
+                self.ends[-1] = max(self.ends[-1], end)  # Merge overlapping or adjacent ranges
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def contains(self, address):
+        value = int(address)
+        i = bisect_right(self.starts, value) - 1
+        return i >= 0 and value <= self.ends[i]
+
+class ScopeIndex:
+    """
+    Precompiled allowlist for fast scope checks.
+
+    Args:
+        domains (iterable): Allowed domains; their subdomains are allowed as well.
+        networks (iterable): Allowed IP addresses and CIDR blocks. Entries that
+            are not valid addresses are matched as exact strings.
+    """
+
+    def __init__(self, domains=(), networks=()):
+        self.domains = DomainTrie(d.strip().lower() for d in domains if d.strip())
+        parsed = {4: [], 6: []}
+        self.exact = set()
+        for entry in networks:
+            entry = entry.strip()
+            if not entry:
+                continue
+            try:
+                network = ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                self.exact.add(entry.lower())
+                continue
+            parsed[network.version].append(network)
+        self.networks = {version: NetworkIntervals(nets) for version, nets in parsed.items()}
+
+    def contains(self, host):
+        """Check whether a bare host name or IP address (see task_manager.extract_host) is in scope."""
+        if host in self.exact:
+            return True
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return self.domains.contains(host)
+        return self.networks[address.version].contains(address)
+
+# (ALLOWED_DOMAINS list, ALLOWED_IPS list, index built from them), swapped as one tuple
+_state = (None, None, None)
+_index_lock = threading.Lock()
+
+def get_scope_index():
+    """
+    Return the scope index for the current configuration.
+
+    The index is built once and rebuilt only when `config.ALLOWED_DOMAINS` or
+    `config.ALLOWED_IPS` is replaced by another list. Telling that costs two
+    identity checks, not a pass over the allowlist; after changing either
+    list in place, call reload_scope_index().
+    """
+    global _state
+    domains, ips, index = _state
+    if domains is config.ALLOWED_DOMAINS and ips is config.ALLOWED_IPS:
+        return index
+    with _index_lock:
+        domains, ips = config.ALLOWED_DOMAINS, config.ALLOWED_IPS
+        if _state[0] is not domains or _state[1] is not ips:
+            _state = (domains, ips, ScopeIndex(domains, ips))
+        return _state[2]
+
+def reload_scope_index():
+    """Rebuild the scope index from the current configuration (e.g. after editing the allowlist in place)."""
+    global _state
+    with _index_lock:
+        _state = (None, None, None)
+    return get_scope_index()
@@ -1,76 +1,218 @@
-import subprocess  # For running shell commands
+import subprocess  # For running tool commands
 import logging  # For logging events and errors
-from config import MAX_RETRIES  # Importing the retry limit from config file
+import threading  # For draining stderr and enforcing timeouts while streaming
+import time  # For backing off between retries
+from config import MAX_RETRIES, MAX_TIMEOUT_RETRIES, DEFAULT_WORDLIST, TOOL_STDERR_MAX_BYTES, REPORT_DIR  # Importing the retry limits, default wordlist, stderr bound and report directory from config file
 import os  # For file and directory operations
 from pathlib import Path  # For handling file paths
+from agent.parsers import parse_nmap_xml, format_port_records, ffuf_hit, format_ffuf_hits, PortRecord  # For structured nmap and ffuf results
+from agent.retry import classify_failure, backoff_delay, circuit_breaker, RETRYABLE, TIMEOUT, CIRCUIT_OPEN  # For the retry policy
+from agent.task_manager import extract_host  # For keying the circuit breaker by host
+from agent.wordlists import get_registry  # For named, normalized wordlists
+from agent.rate_control import rate_controller  # For adaptive per-host thread counts and request rates
+from agent.metrics import current_span, timed  # For per-task timing spans
+from agent.process import spawn, kill_process_tree, OutputBuffer, CommandCancelled, current_cancel_event  # For running tools without a shell
+from agent.blob_store import get_blob_store  # For reading output too large to keep in memory
 import shutil  # For checking if required tools are installed
-import json  # For handling JSON output from ffuf
+import io  # For parsing nmap XML output held in memory
+import tempfile  # For the URL lists of bulk sqlmap runs
 from datetime import datetime  # For timestamping reports
 
 # Ensure the logs and reports directories exist
 os.makedirs("logs", exist_ok=True)
-os.makedirs("reports", exist_ok=True)
+os.makedirs(REPORT_DIR, exist_ok=True)
 
-# Configure logging (logs will be written to logs/audit.log)
-logging.basicConfig(
-    filename="logs/audit.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# Seconds between checks of a running command's timeout and cancellation
+WATCHDOG_INTERVAL = 0.2
+
+# Seconds sqlmap waits for a response before it gives up on a request (its --timeout)
+SQLMAP_REQUEST_TIMEOUT = 30
+
+# Logging goes to the audit log once an entry point calls agent.audit_log.configure_audit_log()
 
 def get_wordlist_path():
-    """Retrieve the path to the wordlist file, creating it if it does not exist."""
-    wordlist_path = os.path.expanduser("~/wordlists/common.txt")  # Define the wordlist path
-    
-    if not os.path.exists(wordlist_path):
-        os.makedirs(os.path.dirname(wordlist_path), exist_ok=True)  # Create directory if needed
-        with open(wordlist_path, 'w') as f:
-            # Write common directory names to the wordlist
-            f.write("admin\nlogin\nwp-admin\napi\ntest\ndev\n")
-    
-    return wordlist_path  # Return the path to the wordlist file
+    """Retrieve the path to the default wordlist, registering it if it does not exist yet."""
+    return get_registry().get(DEFAULT_WORDLIST).path  # Normalized list from the wordlist registry
+
+def stream_command(command, on_line=None, timeout=300, capture=True, cancel=None):
+    """
+    Run a tool command and hand each line of its stdout to `on_line` as soon as it is printed.
+
+    The tool runs without a shell, as the leader of its own process group
+    (see agent.process.spawn), so a timeout or cancellation kills it together
+    with every process it started. Stderr is drained in a background thread
+    so a chatty tool cannot block on a full pipe; only its last
+    TOOL_STDERR_MAX_BYTES are kept. Captured stdout stays in memory up to
+    TOOL_OUTPUT_MEMORY_BYTES and spills to a temporary file past that.
+
+    Args:
+        command (str): The command line to execute.
+        on_line (callable): Optional callback receiving each stdout line (without the newline).
+        timeout (int): Seconds before the process is killed.
+        capture (bool): Keep stdout in the result. Turn off when `on_line`
+            consumes the output, so large outputs are never held at all.
+        cancel (threading.Event): Kills the command when set; defaults to the
+            cancellation event of the running task (see agent.process.cancel_scope).
+
+    Returns:
+        subprocess.CompletedProcess: The exit code and the stdout (empty when
+        not captured) and stderr text. Stdout that spilled to disk is moved to
+        the blob store instead; its handle is then in `stdout_ref` and stdout is empty.
+
+    Raises:
+        subprocess.TimeoutExpired: If the command ran longer than `timeout` seconds.
+        CommandCancelled: If `cancel` was set while the command ran.
+        FileNotFoundError: If the tool is not installed.
+    """
+    cancel = cancel or current_cancel_event()
+    process = spawn(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        bufsize=1  # Line-buffered so output arrives as it is produced
+    )
+
+    stderr_tail = []
+
+    def read_stderr():
+        tail = ""
+        for chunk in iter(lambda: process.stderr.read(8192), ""):
+            tail = (tail + chunk)[-TOOL_STDERR_MAX_BYTES:]
+        stderr_tail.append(tail)
+
+    stderr_reader = threading.Thread(target=read_stderr, daemon=True)
+    stderr_reader.start()
+
+    finished = threading.Event()
+    stopped = []  # Why the watchdog killed the process: "timeout" or "cancelled"
+
+    def watchdog():
+        deadline = time.monotonic() + timeout
+        while not finished.is_set():
+            if cancel is not None and cancel.is_set():
+                stopped.append("cancelled")
+            elif time.monotonic() >= deadline:
+                stopped.append("timeout")
+            else:
+                finished.wait(min(WATCHDOG_INTERVAL, max(0.0, deadline - time.monotonic())))
+                continue
+            kill_process_tree(process)
+            return
+
+    watcher = threading.Thread(target=watchdog, daemon=True)
+    watcher.start()
+
+    output = OutputBuffer() if capture else None
+    output_bytes = 0
+    try:
+        try:
+            for line in process.stdout:
+                output_bytes += len(line)
+                if output is not None:
+                    output.write(line)
+                if on_line:
+                    on_line(line.rstrip("\n"))
+            process.wait()
+        finally:
+            finished.set()
+            if process.poll() is None:
+                kill_process_tree(process)  # Don't leave the tool running if the caller bailed out
+                process.wait()
+            watcher.join()
+            stderr_reader.join()
+            process.stdout.close()
+            process.stderr.close()
+            span = current_span()
+            if span is not None:
+                span.output_bytes += output_bytes
+
+        if "cancelled" in stopped:
+            raise CommandCancelled(f"Command cancelled: {command}")
+        if "timeout" in stopped:
+            raise subprocess.TimeoutExpired(command, timeout)
+        stdout, stdout_ref = "", None
+        if output is not None and output.spilled:
+            stdout_ref = output.to_blob()
+        elif output is not None:
+            stdout = output.getvalue()
+    finally:
+        if output is not None:
+            output.close()  # Removes the spill file
+
+    result = subprocess.CompletedProcess(command, process.returncode, stdout, "".join(stderr_tail))
+    result.stdout_ref = stdout_ref
+    return result
+
+def run_command(command, retries=MAX_RETRIES, on_line=None, host=None, capture=True):
+    """
+    Execute a tool command with retry logic and error handling, streaming stdout to `on_line`.
+
+    Failures are classified first: a missing binary or bad arguments fail
+    immediately, while network errors and timeouts are retried with
+    exponential backoff and jitter (timeouts at most MAX_TIMEOUT_RETRIES times).
+    When `host` is given, the shared circuit breaker stops running commands
+    against a host that keeps failing. With `capture` off, stdout only goes
+    to `on_line` and the returned output is empty. Output too large to keep
+    in memory is returned as an "output_ref" blob handle instead of "output".
 
-def run_command(command, retries=MAX_RETRIES):
-    """Execute a shell command with retry logic and error handling."""
+    Returns:
+        dict: {"status": "success", "output": ...} or
+        {"status": "failed", "error": ..., "failure": <failure class>}.
+    """
     attempt = 0
-    while attempt < retries:
+    timeouts = 0
+    span = current_span()  # Timing of the task this command belongs to, if any
+    while True:
+        if host and not circuit_breaker.allow(host):
+            error_msg = f"Circuit open for {host}, not running: {command}"
+            logging.error(error_msg)
+            return {"status": "failed", "error": error_msg, "failure": CIRCUIT_OPEN}
+
+        if span is not None:
+            span.attempts += 1
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,  # Capture stdout and stderr
-                text=True,
-                timeout=300  # Set a timeout of 5 minutes
-            )
+            with timed("subprocess"):
+                result = stream_command(
+                    command,
+                    on_line=on_line,  # Feed output to the caller while the tool runs
+                    timeout=300,  # Set a timeout of 5 minutes
+                    capture=capture
+                )
             
             if result.returncode == 0:  # Check if command executed successfully
                 logging.info(f"Command succeeded: {command}")
+                if host:
+                    circuit_breaker.record_success(host)
+                if getattr(result, "stdout_ref", None):
+                    return {"status": "success", "output_ref": result.stdout_ref}  # Too large to hold in memory
                 return {"status": "success", "output": result.stdout}
-            else:
-                error_msg = f"Command failed: {result.stderr}"
-                logging.error(error_msg)
-                attempt += 1
-                if attempt < retries:
-                    logging.info(f"Retrying command ({attempt}/{retries}): {command}")
-                else:
-                    return {"status": "failed", "error": error_msg}
-                    
-        except subprocess.TimeoutExpired:
+            failure = classify_failure(result.returncode, result.stderr)
+            error_msg = f"Command failed ({failure}): {result.stderr}"
+        except subprocess.TimeoutExpired as e:
+            failure = classify_failure(exception=e)
             error_msg = f"Command timed out after 300 seconds: {command}"
-            logging.error(error_msg)
-            attempt += 1
-            if attempt < retries:
-                logging.info(f"Retrying command ({attempt}/{retries}): {command}")
-            else:
-                return {"status": "failed", "error": error_msg}
+        except CommandCancelled as e:
+            failure = classify_failure(exception=e)
+            error_msg = str(e)
         except Exception as e:
+            failure = classify_failure(exception=e)
             error_msg = f"Error executing command {command}: {str(e)}"
-            logging.error(error_msg)
-            attempt += 1
-            if attempt < retries:
-                logging.info(f"Retrying command ({attempt}/{retries}): {command}")
-            else:
-                return {"status": "failed", "error": error_msg}
+
+        logging.error(error_msg)
+        if host:
+            circuit_breaker.record_failure(host, failure)
+
+        attempt += 1
+        if failure == TIMEOUT:
+            timeouts += 1
+        if failure not in RETRYABLE or attempt >= retries or timeouts > MAX_TIMEOUT_RETRIES:
+            return {"status": "failed", "error": error_msg, "failure": failure}
+
+        delay = backoff_delay(attempt - 1)
+        logging.info(f"Retrying command ({attempt}/{retries}) in {delay:.1f}s: {command}")
+        with timed("backoff"):
+            time.sleep(delay)
 
 def check_environment():
     """Verify that all required tools are installed, logging any missing ones."""
@@ -87,25 +229,173 @@ def check_environment():
             return False
     return True
 
-def run_nmap(target):
-    """Run an Nmap scan on the target."""
-    command = f"nmap -Pn {target}"
-    return run_command(command)
+def nmap_command(target, ports=None):
+    """Build the Nmap command line for a target, optionally limited to a port list ("22,80,8000-8100")."""
+    command = "nmap -Pn -oX -"  # Write machine-readable XML to stdout
+    if ports:
+        command += f" -p {ports}"
+    return f"{command} {target}"
+
+def gobuster_command(target, wordlist, threads=50, rate=None):
+    """Build the Gobuster command line for a target URL and wordlist, optionally limited to `rate` requests per second."""
+    command = f"gobuster dir -u {target} -w {wordlist} -t {threads}"
+    if rate:
+        command += f" --delay {int(1000 * threads / rate)}ms"  # Per-thread delay between requests
+    return command
+
+def ffuf_command(target, wordlist, threads=40, rate=None):
+    """Build the FFUF command line for a target URL (ending in "/") and wordlist, optionally limited to `rate` requests per second."""
+    return (
+        f"ffuf "
+        f"-u {target}FUZZ "
+        f"-w {wordlist} "
+        f"-mc 200,301,302,403 "  # Match codes
+        f"-json "  # Print each result as one JSON line on stdout
+        f"-noninteractive "  # Don't read from stdin
+        f"-r "  # Follow redirects
+        f"-t {threads} "  # Number of threads
+        f"-timeout 10 "  # Timeout in seconds
+        f"-recursion "  # Enable recursion
+        f"-recursion-depth 2"  # Set recursion depth
+        + (f" -rate {max(1, int(rate))}" if rate else "")  # Requests per second
+    )
+
+def sqlmap_command(target, threads=4, rate=None, bulk_file=None):
+    """
+    Build the SQLMap command line for a target URL, optionally limited to `rate` requests per second.
+
+    With a `bulk_file` (one URL per line) sqlmap tests every URL in it instead,
+    including the forms on those pages.
+    """
+    source = f"-m {bulk_file} --forms" if bulk_file else f"-u {target}"
+    return (
+        f"sqlmap {source} "
+        "--batch "  # Run in batch mode (no user input)
+        "--random-agent "  # Use a random user agent
+        "--level 1 "  # Set testing level
+        "--risk 1 "  # Set risk level
+        f"--threads {threads} "  # Use multiple threads
+        f"--timeout {SQLMAP_REQUEST_TIMEOUT}"  # Set timeout
+        + (f" --delay {threads / rate:.2f}" if rate else "")  # Seconds between requests of each thread
+    )
+
+def command_signature(tool):
+    """
+    Return a tool's full argument set, with placeholders for the per-run values.
+
+    Used as part of the result cache key, so changing any fixed argument of a
+    tool invalidates its cached results. Thread counts and request rates are
+    tuned per run (see agent.rate_control) and don't change the results, so
+    they are left out.
+    """
+    if tool == "nmap":
+        return nmap_command("<target>")
+    elif tool == "gobuster":
+        return gobuster_command("<target>", "<wordlist>", "<threads>")
+    elif tool == "ffuf":
+        return ffuf_command("<target>/", "<wordlist>", "<threads>")
+    elif tool == "sqlmap":
+        return sqlmap_command("<target>", "<threads>")
+    return None
+
+def run_nmap(target, on_line=None, ports=None):
+    """Run an Nmap scan on the target (and ports) and parse its XML output into port records."""
+    command = nmap_command(target, ports)
+    result = run_command(command, on_line=on_line, host=extract_host(target))
+    if result.get("status") != "success":
+        return result
+
+    try:
+        with timed("parse"):
+            if "output_ref" in result:
+                with get_blob_store().open(result["output_ref"]) as f:
+                    records = list(parse_nmap_xml(f))  # Streamed from disk, never read into memory
+            else:
+                records = list(parse_nmap_xml(io.StringIO(result["output"])))
+    except Exception as e:
+        logging.error(f"Error parsing nmap XML output: {str(e)}")
+        return result  # Keep the raw output so nothing is lost
+
+    # Replace the raw XML with a compact table plus the structured records
+    result.pop("output_ref", None)
+    result["output"] = format_port_records(records)
+    result["ports"] = [record._asdict() for record in records]
+    return result
 
-def run_gobuster(target):
-    """Run Gobuster for directory enumeration using a predefined wordlist."""
-    wordlist = get_wordlist_path()
+def merge_nmap_results(results):
+    """
+    Merge the results of the shards of one nmap scan into a single result.
+
+    Port records reported by several shards (e.g. overlapping port lists)
+    appear once, and the port table is rebuilt from the merged records. The
+    merged scan succeeds if any shard did; the errors of failed shards are
+    listed under "shard_errors", so a partial result is still visible.
+
+    Returns:
+        dict: The merged result, with its merged "ports" and the number of "shards".
+    """
+    records = {}
+    errors = []
+    for result in results:
+        if result.get("status") != "success":
+            errors.append(result.get("error", "unknown error"))
+            continue
+        for port in result.get("ports", []):
+            records.setdefault((port["host"], port["port"], port["protocol"]), port)
+
+    ports = [records[key] for key in sorted(records)]
+    merged = {"status": "success" if len(errors) < len(results) else "failed", "shards": len(results)}
+    if merged["status"] == "success":
+        merged["output"] = format_port_records(PortRecord(**port) for port in ports)
+        merged["ports"] = ports
+    else:
+        merged["error"] = "; ".join(errors)
+    if errors:
+        merged["shard_errors"] = errors
+    return merged
+
+def estimate_latency(elapsed, requests, threads, rate=None):
+    """
+    Estimate the mean response time of a run that reports none from its duration.
+
+    Each of the `threads` sends its share of the `requests` one after the
+    other, waiting the rate-limit delay (threads / rate) between them.
+
+    Returns:
+        float: Seconds per request, or None if it can't be told.
+    """
+    if not requests or elapsed <= 0:
+        return None
+    return max(0.0, elapsed * threads / requests - (threads / rate if rate else 0.0))
+
+def run_gobuster(target, on_line=None, wordlist=None):
+    """Run Gobuster for directory enumeration using the given (or the default) wordlist file."""
+    wordlist = wordlist or get_wordlist_path()
     
     # Fix double protocol issue
     target = target.replace('https://https://', 'https://')
     
-    command = f"gobuster dir -u {target} -w {wordlist} -t 50"
-    logging.info(f"Running gobuster with command: {command}")
-    return run_command(command)
+    host = extract_host(target)
+    settings = rate_controller.acquire(host, "gobuster")
+    result = {"status": "failed"}
+    latency = None
+    try:
+        command = gobuster_command(target, wordlist, settings.threads, settings.rate)
+        logging.info(f"Running gobuster with command: {command}")
+        started = time.monotonic()
+        result = run_command(command, on_line=on_line, host=host)
+        # Gobuster reports no response times; derive them from the run time (one request per entry),
+        # taking the entry count from the registry rather than reading the list again
+        requests = get_registry().entries(wordlist)
+        if result.get("status") == "success" and requests:
+            latency = estimate_latency(time.monotonic() - started, requests, settings.threads, settings.rate)
+        return result
+    finally:
+        rate_controller.release(settings, result.get("failure"), latency)
 
-def run_ffuf(target):
-    """Run FFUF for directory fuzzing with optimized settings."""
-    wordlist = get_wordlist_path()
+def run_ffuf(target, on_line=None, wordlist=None):
+    """Run FFUF for directory fuzzing with optimized settings, using the given (or the default) wordlist file."""
+    wordlist = wordlist or get_wordlist_path()
     
     # Ensure proper URL formatting
     if not target.startswith(('http://', 'https://')):
@@ -119,81 +409,70 @@ def run_ffuf(target):
     if not target.endswith('/'):
         target = f"{target}/"
     
-    # Create a unique output filename
-    output_file = f"ffuf_output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    
-    # Build FFUF command with additional parameters
-    command = (
-        f"ffuf "
-        f"-u {target}FUZZ "
-        f"-w {wordlist} "
-        f"-mc 200,301,302,403 "  # Match codes
-        f"-c "  # Enable colors
-        f"-v "  # Verbose output
-        f"-r "  # Follow redirects
-        f"-t 40 "  # Number of threads
-        f"-timeout 10 "  # Timeout in seconds
-        f"-o {output_file} "  # Save output to JSON
-        f"-of json "  # Output format as JSON
-        f"-recursion "  # Enable recursion
-        f"-recursion-depth 2"  # Set recursion depth
-    )
-    
+    host = extract_host(target)
+    settings = rate_controller.acquire(host, "ffuf")
+    command = ffuf_command(target, wordlist, settings.threads, settings.rate)
     logging.info(f"Running ffuf with command: {command}")
-    
-    # Execute the command
-    result = run_command(command)
-    
-    # Try to read the JSON output file if it exists
+
+    # Results stream in as JSON lines and are reduced to compact records as
+    # they arrive; the raw output is never kept, so recursive runs with tens
+    # of thousands of hits stay small. Keyed by URL, so a retried run that
+    # reports the same hits again doesn't duplicate them.
+    hits = {}
+    durations = []  # Response times reported by ffuf, fed back to the rate controller
+
+    def collect(line):
+        with timed("parse"):
+            hit = ffuf_hit(line)
+        if hit:
+            durations.append(hit.pop("duration", 0) / 1e9)  # Reported in nanoseconds
+            hits[hit["url"]] = hit
+        if on_line:
+            on_line(line)
+
+    result = {"status": "failed"}
     try:
-        if os.path.exists(output_file):
-            with open(output_file, "r") as f:
-                ffuf_json = json.load(f)
-                
-                # Format the output for better readability
-                formatted_output = []
-                if "results" in ffuf_json:
-                    for entry in ffuf_json["results"]:
-                        url = entry.get("url", "N/A")
-                        status = entry.get("status", "N/A")
-                        length = entry.get("length", "N/A")
-                        words = entry.get("words", "N/A")
-                        lines = entry.get("lines", "N/A")
-                        
-                        formatted_output.append(
-                            f"Found: {url}\n"
-                            f"Status: {status}\n"
-                            f"Length: {length}\n"
-                            f"Words: {words}\n"
-                            f"Lines: {lines}\n"
-                            f"{'-' * 40}"
-                        )
-                
-                if formatted_output:
-                    result["output"] = "\n".join(formatted_output)
-                else:
-                    result["output"] = "No results found"
-                    
-            # Clean up the temporary file
-            os.remove(output_file)
-    except Exception as e:
-        logging.error(f"Error processing ffuf output: {str(e)}")
-        if result.get("status") == "success":
-            result["output"] = result.get("output", "No results found")
-    
-    logging.info(f"FFUF output: {result.get('output', '')}")
+        result = run_command(command, on_line=collect, host=host, capture=False)
+    finally:
+        latency = sum(durations) / len(durations) if durations else None
+        rate_controller.release(settings, result.get("failure"), latency)
+    if result["status"] == "success":
+        result["hits"] = list(hits.values())
+        result["output"] = format_ffuf_hits(result["hits"])
+
+    logging.info(f"FFUF found {len(hits)} results for {target}")
     return result
 
-def run_sqlmap(target):
-    """Run SQLMap with automated SQL injection testing."""
-    command = (
-        f"sqlmap -u {target} "
-        "--batch "  # Run in batch mode (no user input)
-        "--random-agent "  # Use a random user agent
-        "--level 1 "  # Set testing level
-        "--risk 1 "  # Set risk level
-        "--threads 4 "  # Use multiple threads
-        "--timeout 30"  # Set timeout
-    )
-    logging.info(f"Running sqlmap with command: {command}")
-    return run_command(command)
\ No newline at end of file
+def run_sqlmap(target, on_line=None, urls=None):
+    """
+    Run SQLMap with automated SQL injection testing.
+
+    Given `urls`, one sqlmap process tests all of them (through a temporary
+    bulk file) rather than just the target.
+    """
+    host = extract_host(target)
+    settings = rate_controller.acquire(host, "sqlmap")
+    result = {"status": "failed"}
+    bulk_file = None
+    timeouts = []  # Requests sqlmap gave up on after SQLMAP_REQUEST_TIMEOUT seconds
+
+    def watch(line):
+        if "connection timed out" in line.lower():
+            timeouts.append(line)
+        if on_line:
+            on_line(line)
+
+    try:
+        if urls:
+            with tempfile.NamedTemporaryFile("w", suffix=".txt", prefix="sqlmap-", delete=False) as f:
+                f.write("\n".join(urls) + "\n")
+                bulk_file = f.name
+        command = sqlmap_command(target, settings.threads, settings.rate, bulk_file)
+        logging.info(f"Running sqlmap with command: {command}")
+        result = run_command(command, on_line=watch, host=host)
+        return result
+    finally:
+        if bulk_file:
+            os.remove(bulk_file)
+        # sqlmap reports no response times, only the requests that timed out
+        rate_controller.release(settings, result.get("failure"), SQLMAP_REQUEST_TIMEOUT if timeouts else None)
\ No newline at end of file
@@ -1,5 +1,28 @@
+import ipaddress
 import logging
-from config import ALLOWED_DOMAINS, ALLOWED_IPS
+from agent.scope import get_scope_index
+from config import WORDLIST_SHARDS, NMAP_PORTS, NMAP_PORT_SHARDS, NMAP_HOST_SHARDS
+
+# Port range split when nmap is sharded without an explicit port list
+ALL_PORTS = "1-65535"
+
+def extract_host(target):
+    """
+    Reduce a target (URL, host:port, domain or IP) to its bare, lowercase host name or IP.
+    """
+    # Remove protocol (http:// or https://) if present
+    if "://" in target:
+        target = target.split("://", 1)[1]
+
+    # Remove any URL paths or query parameters
+    target = target.split("/")[0].split("?")[0].strip().lower()
+
+    # Remove a port, taking care not to cut IPv6 addresses
+    if target.startswith("["):
+        return target[1:].split("]")[0]
+    if target.count(":") == 1:
+        target = target.split(":")[0]
+    return target
 
 def is_within_scope(target):
     """
@@ -8,40 +31,145 @@ def is_within_scope(target):
     The function ensures that:
     - Only allowed domains and IPs are processed.
     - Subdomains of allowed domains are considered within scope.
+    - IP addresses inside allowed CIDR blocks are considered within scope.
     - Protocols (http://, https://) are removed before checking.
-    - Query parameters and paths are ignored for scope verification.
+    - Query parameters, paths and ports are ignored for scope verification.
     """
 
-    # Remove protocol (http:// or https://) if present
-    if target.startswith(('http://', 'https://')):
-        target = target.split('://')[-1]  # Extract the part after '://'
+    # Remove protocol, paths, query parameters and ports, and normalize case
+    target = extract_host(target)
+    logging.debug(f"Checking scope for: {target}")
 
-    # Remove any URL paths or query parameters
-    target = target.split('/')[0].split('?')[0]  # Keep only the domain or IP
+    # Look the host up in the precompiled allowlist (domain suffix trie and IP network intervals)
+    if get_scope_index().contains(target):
+        return True
 
-    # Normalize target: strip whitespace and convert to lowercase
-    target = target.strip().lower()
+    # If none of the conditions matched, log a warning and return False
+    logging.warning(f"Target {target} is out of the defined scope.")
+    return False
 
-    # Normalize allowed domains and IPs for comparison
-    allowed_domains = [d.strip().lower() for d in ALLOWED_DOMAINS]
-    allowed_ips = [ip.strip() for ip in ALLOWED_IPS]
+def shard_task(task, shards=None):
+    """
+    Split a wordlist-driven task (gobuster, ffuf) into one task per wordlist shard.
 
-    # Log the details for debugging
-    logging.info(f"Checking scope for: {target}")
-    logging.info(f"Allowed domains: {allowed_domains}")
+    The shards of one target can then run in parallel workers. Other tasks, and
+    all tasks when sharding is off (WORDLIST_SHARDS = 1), are returned unchanged.
 
-    # Direct match check
-    if target in allowed_domains or target in allowed_ips:
-        return True
+    Returns:
+        List of task dictionaries; shard tasks carry "shard" and "shards" keys.
+    """
+    shards = WORDLIST_SHARDS if shards is None else shards
+    if task["tool"] not in ("gobuster", "ffuf") or shards <= 1:
+        return [task]
+    sharded = []
+    for shard in range(shards):
+        shard_task = dict(task, shard=shard, shards=shards)
+        if "id" in task:
+            shard_task["id"] = f"{task['id']}#{shard + 1}/{shards}"
+        sharded.append(shard_task)
+    return sharded
+
+def parse_port_spec(spec):
+    """
+    Expand an nmap port list ("22,80,8000-8100") into a sorted list of port numbers.
 
-    # Check if the target is a subdomain of an allowed domain
-    for domain in allowed_domains:
-        if target.endswith(f".{domain}") or target == domain:
-            return True
+    Raises:
+        ValueError: If the list holds anything but port numbers and ranges within 1-65535.
+    """
+    ports = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= 65535:
+            raise ValueError(f"Invalid port range: {part}")
+        ports.update(range(first, last + 1))
+    return sorted(ports)
+
+def format_port_spec(ports):
+    """Collapse sorted port numbers back into an nmap port list, e.g. [22, 80, 81, 82] -> "22,80-82"."""
+    ranges = []
+    for port in ports:
+        if ranges and port == ranges[-1][1] + 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+def split_port_spec(spec, shards):
+    """
+    Partition an nmap port list into up to `shards` lists of contiguous ports of about equal size.
 
-    # If none of the conditions matched, log a warning and return False
-    logging.warning(f"Target {target} is out of the defined scope.")
-    return False
+    Returns:
+        list: Port list strings; fewer than `shards` if there are fewer ports than shards.
+    """
+    ports = parse_port_spec(spec)
+    shards = max(1, min(shards, len(ports)))
+    size, extra = divmod(len(ports), shards)
+    specs, start = [], 0
+    for shard in range(shards):
+        end = start + size + (1 if shard < extra else 0)
+        specs.append(format_port_spec(ports[start:end]))
+        start = end
+    return specs
+
+def split_hosts(target, shards):
+    """
+    Split a CIDR network target into equal sub-networks, one per host shard.
+
+    The network is split into the largest power of two of sub-networks not
+    above `shards` (and never below single addresses). Other targets (domain
+    names, single IPs) can't be split and are returned as they are.
+
+    Returns:
+        list: Target strings.
+    """
+    if "/" not in target or shards <= 1:
+        return [target]
+    try:
+        network = ipaddress.ip_network(target, strict=False)
+    except ValueError:
+        return [target]
+    prefixlen_diff = min(shards.bit_length() - 1, network.max_prefixlen - network.prefixlen)
+    return [str(subnet) for subnet in network.subnets(prefixlen_diff=prefixlen_diff)]
+
+def shard_nmap_task(task, port_shards=None, host_shards=None, ports=None):
+    """
+    Split an nmap task into one task per port range and host sub-network.
+
+    Each shard scans its own slice of the ports (NMAP_PORTS, or all ports
+    when the ports are sharded without a list) on its own part of the hosts,
+    so the shards of one target can run as parallel nmap processes; their
+    results are merged back into one (see agent.task_executor.merge_nmap_results).
+    With sharding off (NMAP_PORT_SHARDS = NMAP_HOST_SHARDS = 1) the task is
+    returned unchanged, apart from the configured port list.
+
+    Returns:
+        List of task dictionaries; shard tasks carry "ports", "shard" and "shards" keys.
+    """
+    port_shards = NMAP_PORT_SHARDS if port_shards is None else port_shards
+    host_shards = NMAP_HOST_SHARDS if host_shards is None else host_shards
+    ports = NMAP_PORTS if ports is None else ports
+
+    hosts = split_hosts(task["target"], host_shards)
+    if port_shards > 1:
+        port_specs = split_port_spec(ports or ALL_PORTS, port_shards)
+    else:
+        port_specs = [ports]
+
+    if len(hosts) * len(port_specs) == 1:
+        return [dict(task, ports=ports)] if ports else [task]
+    shards = len(hosts) * len(port_specs)
+    sharded = []
+    for shard, (host, spec) in enumerate((host, spec) for host in hosts for spec in port_specs):
+        shard_task = dict(task, target=host, shard=shard, shards=shards)
+        if spec:
+            shard_task["ports"] = spec
+        if "id" in task:
+            shard_task["id"] = f"{task['id']}#{shard + 1}/{shards}"
+        sharded.append(shard_task)
+    return sharded
 
 def generate_tasks(target):
     """
@@ -50,6 +178,8 @@ def generate_tasks(target):
     - Cleans up the target URL for scope verification.
     - Checks if the target is within the allowed scope.
     - Assigns appropriate scanning tools (Nmap, Gobuster, FFUF, SQLMap).
+    - Splits wordlist scans into WORDLIST_SHARDS parallel tasks, and the nmap scan
+      into NMAP_PORT_SHARDS x NMAP_HOST_SHARDS port-range and sub-network tasks.
     - Ensures proper handling of protocols.
 
     Returns:
@@ -77,13 +207,11 @@ def generate_tasks(target):
     web_target = f"https://{base_target}"
 
     # Add an Nmap scan for network reconnaissance
-    tasks.append({"tool": "nmap", "target": base_target})
+    tasks.extend(shard_nmap_task({"tool": "nmap", "target": base_target}))
 
     # Add web-based scans using different tools
-    tasks.extend([
-        {"tool": "gobuster", "target": web_target},  # Directory brute-force
-        {"tool": "ffuf", "target": web_target},      # Fuzzing
-        {"tool": "sqlmap", "target": web_target}     # SQL injection testing
-    ])
+    tasks.extend(shard_task({"tool": "gobuster", "target": web_target}))  # Directory brute-force
+    tasks.extend(shard_task({"tool": "ffuf", "target": web_target}))      # Fuzzing
+    tasks.append({"tool": "sqlmap", "target": web_target})                 # SQL injection testing
 
     return tasks
\ No newline at end of file
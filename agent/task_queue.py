@@ -0,0 +1,400 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import TASK_QUEUE_DB, LEASE_SECONDS, MAX_TASK_ATTEMPTS, WORKER_POLL_INTERVAL
+from agent.agent_graph import execute_task, follow_up_tasks, merge_nmap_shards
+from agent.task_manager import generate_tasks
+from agent.findings import FindingIndex, findings_from_result, compact_result
+from agent.journal import new_scan_id
+from agent.report_sink import ReportSink, report_path
+from agent.metrics import timing_summary, write_metrics
+from agent.cost_model import get_runtime_history
+from agent.audit_log import log_context
+from agent.endpoints import EndpointSet, batch_injection_tasks
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    scan_id TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    scan_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    task TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    enqueued REAL NOT NULL,
+    finished REAL,
+    PRIMARY KEY (scan_id, task_id)
+);
+CREATE INDEX IF NOT EXISTS tasks_by_state ON tasks (state, enqueued);
+"""
+
+class TaskQueue:
+    """
+    Durable task queue shared by scanner workers, backed by one SQLite file.
+
+    Workers claim a task with a lease (visibility timeout): the task stays
+    theirs while they renew the lease with heartbeat(). A task whose lease
+    expires (the worker died or hung) is handed to the next worker that asks,
+    up to `max_attempts` times before it fails. Tasks are identified by
+    (scan_id, task_id), so enqueueing the same follow-up twice adds it once.
+    A task can also be held back until the rest of its scan is finished
+    (see release_held).
+
+    States: (held ->) queued -> leased -> done / failed.
+
+    Args:
+        path (str): SQLite database file; every worker of a scan must use the same one.
+        lease_seconds (float): Lease length, renewed by heartbeat().
+        max_attempts (int): Claims of a task before an expiring lease fails it.
+    """
+
+    def __init__(self, path=TASK_QUEUE_DB, lease_seconds=LEASE_SECONDS, max_attempts=MAX_TASK_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._local = threading.local()  # One connection per thread
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")  # Readers don't block the workers' writes
+        db.executescript(SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")  # Take the write lock up front, so two claims never pick the same row
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def create_scan(self, scan_id, target):
+        self._db().execute("INSERT OR IGNORE INTO scans (scan_id, target, created) VALUES (?, ?, ?)",
+                           (scan_id, target, time.time()))
+
+    def scan_target(self, scan_id):
+        row = self._db().execute("SELECT target FROM scans WHERE scan_id = ?", (scan_id,)).fetchone()
+        return row[0] if row else None
+
+    def enqueue(self, scan_id, task, held=False):
+        """
+        Queue a task (it must have an "id"); returns False if the scan already has it.
+
+        A `held` task is not handed to workers until release_held() replaces it.
+        """
+        cursor = self._db().execute(
+            "INSERT OR IGNORE INTO tasks (scan_id, task_id, task, state, enqueued) VALUES (?, ?, ?, ?, ?)",
+            (scan_id, task["id"], json.dumps(task), "held" if held else "queued", time.time())
+        )
+        return cursor.rowcount == 1
+
+    def release_held(self, scan_id, expand):
+        """
+        Once a scan has nothing queued or running, queue the tasks its held tasks expand to.
+
+        `expand(held, finished)` gets the held tasks and the (task, result)
+        pairs of the finished ones, and returns the tasks to queue in their
+        place. It runs under the queue's write lock, so the held tasks are
+        released exactly once and the scan never looks finished in between.
+
+        Returns:
+            list: The tasks queued, empty if the scan is not ready or holds nothing.
+        """
+        with self._transaction() as db:
+            states = dict(db.execute("SELECT state, COUNT(*) FROM tasks WHERE scan_id = ? GROUP BY state",
+                                     (scan_id,)).fetchall())
+            if not states.get("held") or states.get("queued") or states.get("leased"):
+                return []
+            held = [json.loads(task) for (task,) in db.execute(
+                "SELECT task FROM tasks WHERE scan_id = ? AND state = 'held' ORDER BY enqueued, rowid", (scan_id,))]
+            finished = [(json.loads(task), json.loads(result)) for task, result in db.execute(
+                "SELECT task, result FROM tasks WHERE scan_id = ? AND state IN ('done', 'failed') ORDER BY enqueued, rowid",
+                (scan_id,))]
+            tasks = expand(held, finished)
+            db.execute("DELETE FROM tasks WHERE scan_id = ? AND state = 'held'", (scan_id,))
+            now = time.time()
+            for task in tasks:
+                db.execute("INSERT OR IGNORE INTO tasks (scan_id, task_id, task, enqueued) VALUES (?, ?, ?, ?)",
+                           (scan_id, task["id"], json.dumps(task), now))
+        return tasks
+
+    def _expire(self, db, now):
+        """Fail tasks that used up their attempts and hand the other expired leases back to the queue."""
+        failed = {"status": "failed", "error": f"Lease expired {self.max_attempts} times, giving up"}
+        db.execute(
+            "UPDATE tasks SET state = 'failed', result = ?, finished = ?, lease_owner = NULL "
+            "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (json.dumps(failed), now, now, self.max_attempts)
+        )
+        return db.execute(
+            "UPDATE tasks SET state = 'queued', lease_owner = NULL, lease_expires = NULL "
+            "WHERE state = 'leased' AND lease_expires < ?", (now,)
+        ).rowcount
+
+    def requeue_expired(self):
+        """Re-queue tasks whose lease expired; returns how many were re-queued."""
+        with self._transaction() as db:
+            count = self._expire(db, time.time())
+        if count:
+            logging.warning(f"Re-queued {count} tasks with expired leases")
+        return count
+
+    def claim(self, worker_id):
+        """
+        Lease the oldest queued task to `worker_id`.
+
+        Returns:
+            tuple: (scan_id, task), or None if nothing is queued.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            self._expire(db, now)
+            row = db.execute(
+                "SELECT scan_id, task_id, task FROM tasks WHERE state = 'queued' ORDER BY enqueued, rowid LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE tasks SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE scan_id = ? AND task_id = ?",
+                (worker_id, now + self.lease_seconds, row[0], row[1])
+            )
+        return row[0], json.loads(row[2])
+
+    def heartbeat(self, scan_id, task_id, worker_id):
+        """Renew a lease; returns False if the worker no longer holds it."""
+        cursor = self._db().execute(
+            "UPDATE tasks SET lease_expires = ? WHERE scan_id = ? AND task_id = ? AND state = 'leased' AND lease_owner = ?",
+            (time.time() + self.lease_seconds, scan_id, task_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, scan_id, task_id, worker_id, result):
+        """
+        Store the result of a leased task.
+
+        Returns:
+            bool: False if the lease had been lost (the task went to another
+            worker, whose result counts instead).
+        """
+        cursor = self._db().execute(
+            "UPDATE tasks SET state = ?, result = ?, finished = ?, lease_owner = NULL "
+            "WHERE scan_id = ? AND task_id = ? AND state = 'leased' AND lease_owner = ?",
+            ("done" if result.get("status") == "success" else "failed", json.dumps(result), time.time(),
+             scan_id, task_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def counts(self, scan_id):
+        """Number of tasks of a scan in each state."""
+        rows = self._db().execute("SELECT state, COUNT(*) FROM tasks WHERE scan_id = ? GROUP BY state", (scan_id,))
+        return dict(rows.fetchall())
+
+    def is_finished(self, scan_id):
+        counts = self.counts(scan_id)
+        return bool(counts) and not counts.get("queued") and not counts.get("leased") and not counts.get("held")
+
+    def results(self, scan_id):
+        """Yield (task, result) for the finished tasks of a scan, in the order they were queued."""
+        rows = self._db().execute(
+            "SELECT task, result FROM tasks WHERE scan_id = ? AND state IN ('done', 'failed') ORDER BY enqueued, rowid",
+            (scan_id,)
+        )
+        for task, result in rows:
+            yield json.loads(task), json.loads(result)
+
+def expand_injection_tasks(held, finished):
+    """Turn a scan's held-back sqlmap tasks into batches over the endpoints its finished tasks found."""
+    endpoints = EndpointSet()
+    for task, result in finished:
+        endpoints.add_result(task, result)
+    return batch_injection_tasks(held, endpoints)
+
+def release_injection_tasks(queue, scan_id):
+    """Queue the sqlmap batches of a scan once its discovery is done (see TaskQueue.release_held)."""
+    tasks = queue.release_held(scan_id, expand_injection_tasks)
+    if tasks:
+        logging.info(f"Queued {len(tasks)} sqlmap tasks for scan {scan_id}")
+    return tasks
+
+def submit_scan(queue, target, refresh=False, scan_id=None):
+    """
+    Queue the initial tasks of a scan; workers add the follow-ups as they find them.
+
+    sqlmap is held back until the rest of the scan is done, then runs in
+    batches over the endpoints found (like run_agent).
+
+    Returns:
+        str: The scan id, or None if the target is out of scope.
+    """
+    tasks = generate_tasks(target)
+    if not tasks:
+        logging.error("No tasks generated. The target might be out of scope.")
+        return None
+    scan_id = scan_id or new_scan_id()
+    queue.create_scan(scan_id, target)
+    for i, task in enumerate(tasks):
+        task_id = f"{task['tool']}-{i}"
+        if "shard" in task:
+            task_id += f"#{task['shard'] + 1}/{task['shards']}"
+        queue.enqueue(scan_id, dict(task, id=task_id, refresh=refresh), held=task["tool"] == "sqlmap")
+    logging.info(f"Queued scan {scan_id} of {target}: {len(tasks)} tasks")
+    return scan_id
+
+def _enqueue_follow_ups(queue, scan_id, task, events):
+    for event in events:
+        for follow_up in follow_up_tasks(task, event):
+            if queue.enqueue(scan_id, dict(follow_up, refresh=task.get("refresh", False))):
+                logging.info(f"Queued follow-up {follow_up['id']} for scan {scan_id}")
+
+def _heartbeat(queue, scan_id, task_id, worker_id, stop):
+    """Renew the lease of a running task until `stop` is set."""
+    interval = max(0.5, queue.lease_seconds / 3)
+    while not stop.wait(interval):
+        if not queue.heartbeat(scan_id, task_id, worker_id):
+            logging.warning(f"Lost the lease on {task_id} of scan {scan_id}")
+            return
+
+def run_worker(queue, worker_id=None, poll_interval=WORKER_POLL_INTERVAL, stop=None, idle_exit=False):
+    """
+    Claim and run tasks from the shared queue until stopped.
+
+    Follow-ups are queued while a task is still streaming its output (and
+    again from its final result, which adds nothing already queued), before
+    the task is completed, so a scan never looks finished in between.
+
+    Args:
+        queue (TaskQueue): The shared queue.
+        worker_id (str): Name of this worker in leases; defaults to "<host>:<pid>:<thread>".
+        poll_interval (float): Seconds to wait when the queue is empty.
+        stop (threading.Event): Stops the worker after its current task.
+        idle_exit (bool): Return as soon as the queue is empty.
+
+    Returns:
+        int: Number of tasks this worker completed.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    stop = stop or threading.Event()
+    completed = 0
+    logging.info(f"Worker {worker_id} polling {queue.path}")
+    while not stop.is_set():
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            if idle_exit:
+                break
+            stop.wait(poll_interval)
+            continue
+
+        scan_id, task = claimed
+        beat = threading.Event()
+        threading.Thread(target=_heartbeat, args=(queue, scan_id, task["id"], worker_id, beat), daemon=True).start()
+        try:
+            with log_context(scan_id=scan_id):
+                result = execute_task(task, on_event=lambda task, event: _enqueue_follow_ups(queue, scan_id, task, [event]))
+                _enqueue_follow_ups(queue, scan_id, task, [dict(port, type="port") for port in result.get("ports", [])])
+        except Exception as e:
+            logging.error(f"Task {task['id']} of scan {scan_id} raised an exception: {str(e)}")
+            result = {"status": "failed", "error": str(e)}
+        finally:
+            beat.set()
+        if queue.complete(scan_id, task["id"], worker_id, result):
+            completed += 1
+            release_injection_tasks(queue, scan_id)
+        else:
+            logging.warning(f"Dropped the result of {task['id']} of scan {scan_id}: its lease had expired")
+    return completed
+
+def collect_scan(queue, scan_id, save_report=True, poll_interval=WORKER_POLL_INTERVAL, timeout=None):
+    """
+    Wait for the workers to finish a scan and aggregate its results into one report.
+
+    Returns:
+        dict: Like run_agent: results as a list per tool, plus "findings";
+        "error" if the scan did not finish within `timeout` seconds.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not queue.is_finished(scan_id):
+        if deadline is not None and time.monotonic() >= deadline:
+            return {"error": f"Scan {scan_id} did not finish within {timeout} seconds: {queue.counts(scan_id)}"}
+        queue.requeue_expired()
+        release_injection_tasks(queue, scan_id)  # In case the last discovery task failed on an expired lease
+        time.sleep(poll_interval)
+
+    target = queue.scan_target(scan_id)
+    results = {}
+    findings = FindingIndex()
+    timings = []
+    sink = ReportSink(report_path(f"scan_{scan_id}")) if save_report else None
+    nmap_shards = []
+    try:
+        for task, result in queue.results(scan_id):
+            if task["tool"] == "nmap" and "shards" in task:
+                nmap_shards.append(result)
+            else:
+                results.setdefault(task["tool"], []).append(result)
+            findings.extend(findings_from_result(task, result))
+            timings.append((task["id"], task["tool"], result.get("timing", {})))
+            if sink:
+                sink.write(target, task["tool"], compact_result(task["tool"], result),
+                           scan_id=scan_id, task_id=task["id"], task_target=task["target"])
+        if nmap_shards:
+            results.setdefault("nmap", []).append(merge_nmap_shards(target, nmap_shards))
+        if sink:
+            sink.write(target, "timing", {"status": "success", "summary": timing_summary(timings)},
+                       scan_id=scan_id, task_id=f"{scan_id}:timing")
+    finally:
+        if sink is not None:
+            sink.close()
+            logging.info(f"Report for scan {scan_id} saved to {sink.path}")
+    results["findings"] = findings.to_dicts()
+    return results
+
+def run_distributed(target, queue=None, refresh=False, scan_id=None, local_workers=0, timeout=None, save_report=True):
+    """
+    Scan a target through the shared queue and return the aggregated results.
+
+    Tasks are executed by worker processes (`python main.py --worker`) on any
+    node sharing the queue; `local_workers` also runs that many workers in this process.
+
+    Returns:
+        dict: See collect_scan; "error" if the target is out of scope.
+    """
+    queue = queue or TaskQueue()
+    scan_id = submit_scan(queue, target, refresh=refresh, scan_id=scan_id)
+    if scan_id is None:
+        return {"error": "Target is out of scope or no valid tasks were generated."}
+
+    stop = threading.Event()
+    workers = [threading.Thread(target=run_worker, args=(queue,), kwargs={"stop": stop}, daemon=True)
+               for _ in range(local_workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        with log_context(scan_id=scan_id):
+            results = collect_scan(queue, scan_id, save_report=save_report, timeout=timeout)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+    write_metrics()
+    get_runtime_history().flush()
+    return results
@@ -0,0 +1,289 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+from array import array
+from config import WORDLIST_DIR, DEFAULT_WORDLIST
+
+# Seed content of the default list, used when no "common" list has been registered
+DEFAULT_WORDS = ["admin", "login", "wp-admin", "api", "test", "dev"]
+
+# Bytes copied (and hashed) at a time when writing or hashing shard files
+CHUNK_SIZE = 1024 * 1024
+
+def normalize_word(line):
+    """Normalize one wordlist entry; returns "" for blank lines and comments."""
+    word = line.strip()
+    if not word or word.startswith("#"):
+        return ""
+    return word.lstrip("/")  # Tools add the slash themselves (e.g. ffuf's ".../FUZZ")
+
+def write_atomic(path, text):
+    """Write a small text file through a temporary file, so readers never see it half-written."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+class Wordlist:
+    """
+    A registered, normalized wordlist stored in a memory-mappable format.
+
+    On disk a list is three files in the registry directory:
+    `<name>.lst` (one entry per line), `<name>.idx` (the byte offset of every
+    line as 64-bit integers) and `<name>.json` (metadata: entry count and
+    content hash). Entries and shards are read through mmap, so lists with
+    millions of entries are never loaded into memory as a whole.
+    """
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, f"{name}.lst")
+        self.index_path = os.path.join(directory, f"{name}.idx")
+        with open(os.path.join(directory, f"{name}.json"), "r") as f:
+            meta = json.load(f)
+        self.count = meta["count"]
+        self.content_hash = meta["sha256"]
+        self._directory = directory
+        self._shards = {}  # (shard, shards) -> (path, content hash)
+        self._entries = {self.path: self.count}  # Path of the list or of a shard -> its entry count
+
+    def __len__(self):
+        return self.count
+
+    def _offsets(self, start, stop):
+        """Return the byte range covering entries [start, stop)."""
+        with open(self.index_path, "rb") as f:
+            f.seek(start * 8)
+            first = array("Q")
+            first.fromfile(f, 1)
+        if stop >= self.count:
+            return first[0], os.path.getsize(self.path)
+        with open(self.index_path, "rb") as f:
+            f.seek(stop * 8)
+            last = array("Q")
+            last.fromfile(f, 1)
+        return first[0], last[0]
+
+    def shard_bounds(self, shard, shards, limit=None):
+        """Return the [start, stop) entry range of shard number `shard` out of `shards`, cut to its first `limit` entries."""
+        size, extra = divmod(self.count, shards)
+        start = shard * size + min(shard, extra)
+        stop = start + size + (1 if shard < extra else 0)
+        if limit is not None:
+            stop = min(stop, start + max(0, limit))
+        return start, stop
+
+    def shard(self, shard, shards, limit=None):
+        """
+        Materialize one shard of the list as its own file and return its path and content hash.
+
+        Shards are contiguous, near-equal slices of the list, so N parallel
+        gobuster/ffuf workers together cover every entry exactly once. With a
+        `limit` only the first `limit` entries of the shard are kept (used to
+        trim a scan to a time budget). Shard files are written once, copied
+        from the list in CHUNK_SIZE pieces and hashed on the way, and reused
+        with their stored hash (`<shard>.sha256`) by later calls and processes.
+
+        Returns:
+            tuple: (path, sha256 of the shard content)
+        """
+        start, stop = self.shard_bounds(shard, shards, limit)
+        if shards <= 1 and stop >= self.count:
+            return self.path, self.content_hash
+        if (shard, shards, limit) in self._shards:
+            return self._shards[(shard, shards, limit)]
+        name = f"{self.name}.{self.content_hash[:12]}.shard-{shard}-of-{shards}"
+        if limit is not None:
+            name += f".first-{stop - start}"
+        shard_path = os.path.join(self._directory, f"{name}.lst")
+        if os.path.exists(shard_path):
+            content_hash = self._stored_hash(shard_path)  # Written by an earlier process
+        else:
+            content_hash = self._write_shard(shard_path, start, stop)
+        self._shards[(shard, shards, limit)] = (shard_path, content_hash)
+        self._entries[shard_path] = stop - start
+        return self._shards[(shard, shards, limit)]
+
+    def _write_shard(self, shard_path, start, stop):
+        """Copy entries [start, stop) to `shard_path` in chunks, hashing them on the way; returns the hash."""
+        digest = hashlib.sha256()
+        tmp_path = f"{shard_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as out:
+            if start < stop:
+                begin, end = self._offsets(start, stop)
+                with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    for offset in range(begin, end, CHUNK_SIZE):
+                        chunk = mapped[offset:min(offset + CHUNK_SIZE, end)]
+                        digest.update(chunk)
+                        out.write(chunk)
+        content_hash = digest.hexdigest()
+        write_atomic(f"{shard_path}.sha256", content_hash)  # Before the shard, so an existing shard always has it
+        os.replace(tmp_path, shard_path)
+        return content_hash
+
+    @staticmethod
+    def _stored_hash(shard_path):
+        """Return the stored hash of an existing shard, hashing it in chunks if it has none."""
+        try:
+            with open(f"{shard_path}.sha256", "r") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            pass
+        digest = hashlib.sha256()
+        with open(shard_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        write_atomic(f"{shard_path}.sha256", content_hash)
+        return content_hash
+
+    def entries(self, path):
+        """Return the entry count of the file at `path` if it is this list or a shard of it made here, else None."""
+        return self._entries.get(path)
+
+    def describe(self, shard=0, shards=1, limit=None):
+        """Summary of the list (or one shard of it) for reports."""
+        info = {"name": self.name, "sha256": self.content_hash, "entries": self.count}
+        if shards > 1:
+            start, stop = self.shard_bounds(shard, shards)
+            info.update(shard=shard, shards=shards, entries=stop - start)
+        if limit is not None and limit < info["entries"]:
+            info.update(entries=limit, trimmed_from=info["entries"])
+        return info
+
+class WordlistRegistry:
+    """
+    Named wordlists, deduplicated and normalized once at registration.
+
+    Args:
+        directory (str): Where registered lists are stored.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = os.path.join(directory or WORDLIST_DIR, "registry")
+        self._source_directory = directory or WORDLIST_DIR
+        self._lock = threading.Lock()
+        self._register_lock = threading.RLock()  # One registration at a time
+        self._lists = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def names(self):
+        """Return the names of all registered lists."""
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def register(self, name, source):
+        """
+        Normalize, deduplicate and store a wordlist under `name`.
+
+        The source is streamed line by line; the first occurrence of each
+        entry is kept in its original order.
+
+        Args:
+            name (str): Name of the list (e.g. "common", "raft-large").
+            source (str | list): Path to a text wordlist, or a list of entries.
+
+        Returns:
+            Wordlist: The registered list.
+        """
+        with self._register_lock:
+            return self._register(name, source)
+
+    def _register(self, name, source):
+        lst_path = os.path.join(self.directory, f"{name}.lst")
+        digest = hashlib.sha256()
+        offsets = array("Q")
+        seen = set()
+        position = 0
+
+        lines = open(source, "r", errors="ignore") if isinstance(source, str) else iter(source)
+        try:
+            with open(f"{lst_path}.tmp", "wb") as out:
+                for line in lines:
+                    word = normalize_word(line)
+                    if not word:
+                        continue
+                    data = word.encode() + b"\n"
+                    key = hashlib.blake2b(data, digest_size=8).digest()  # Compact dedup key
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    offsets.append(position)
+                    out.write(data)
+                    digest.update(data)
+                    position += len(data)
+        finally:
+            if hasattr(lines, "close"):
+                lines.close()
+
+        with open(os.path.join(self.directory, f"{name}.idx.tmp"), "wb") as f:
+            offsets.tofile(f)
+        meta = {"name": name, "count": len(offsets), "sha256": digest.hexdigest(),
+                "source": source if isinstance(source, str) else None}
+        with open(os.path.join(self.directory, f"{name}.json.tmp"), "w") as f:
+            json.dump(meta, f)
+
+        # Swap the files in together so readers never mix old and new parts
+        with self._lock:
+            for suffix in (".lst", ".idx", ".json"):
+                path = os.path.join(self.directory, f"{name}{suffix}")
+                os.replace(f"{path}.tmp", path)
+            self._lists.pop(name, None)
+        logging.info(f"Registered wordlist {name}: {meta['count']} entries, sha256 {meta['sha256'][:12]}")
+        return self.get(name)
+
+    def entries(self, path):
+        """Return the entry count of a list or shard file handed out by this registry, or None for other files."""
+        with self._lock:
+            lists = list(self._lists.values())
+        return next((count for count in (wordlist.entries(path) for wordlist in lists) if count is not None), None)
+
+    def get(self, name):
+        """
+        Return a registered list.
+
+        The default list is registered on first use, from `<WORDLIST_DIR>/<name>.txt`
+        if that file exists and from a small built-in seed list otherwise.
+        """
+        with self._lock:
+            if name in self._lists:
+                return self._lists[name]
+        with self._register_lock:
+            if not os.path.exists(os.path.join(self.directory, f"{name}.json")):
+                if name != DEFAULT_WORDLIST:
+                    raise KeyError(f"Unknown wordlist: {name}")
+                legacy_path = os.path.join(self._source_directory, f"{name}.txt")
+                return self.register(name, legacy_path if os.path.exists(legacy_path) else DEFAULT_WORDS)
+        wordlist = Wordlist(self.directory, name)
+        with self._lock:
+            self._lists[name] = wordlist
+        return wordlist
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """Return the process-wide wordlist registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = WordlistRegistry()
+        return _registry
+
+def resolve_wordlist(task):
+    """
+    Resolve the wordlist file for a gobuster/ffuf task.
+
+    Uses the task's "wordlist" name (default DEFAULT_WORDLIST), for sharded
+    tasks its "shard"/"shards" numbers, and for trimmed tasks its
+    "wordlist_limit" (the number of leading entries to keep).
+
+    Returns:
+        tuple: (path to pass to the tool, content hash, description for reports)
+    """
+    wordlist = get_registry().get(task.get("wordlist", DEFAULT_WORDLIST))
+    shard, shards, limit = task.get("shard", 0), task.get("shards", 1), task.get("wordlist_limit")
+    path, content_hash = wordlist.shard(shard, shards, limit)
+    return path, content_hash, wordlist.describe(shard, shards, limit)
@@ -0,0 +1,192 @@
+"""
+Offline end-to-end benchmark of the agent, with stub security tools on PATH.
+
+Each scale (number of targets) runs as a batch scan in its own process and
+scratch directory, against stub nmap/gobuster/ffuf/sqlmap executables (see
+benchmarks/stub_tool.py), so the numbers measure the orchestration itself:
+wall time, task throughput and peak RSS. The suite also measures the
+scheduler's per-task overhead and the parse throughput of the tool parsers.
+
+Results are printed as one JSON document; with --output they are also
+appended as one line to a JSON Lines file, to track them over time.
+
+Run from the project root:
+    python -m benchmarks.bench_agent [--scales 1,10,100,1000] [--size 20] [--latency 0.05]
+        [--fail-rate 0.1] [--fail-mode network] [--output benchmarks/results.jsonl]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_TOOL = os.path.join(PROJECT_ROOT, "benchmarks", "stub_tool.py")
+TOOLS = ("nmap", "gobuster", "ffuf", "sqlmap")
+
+def install_stubs(directory):
+    """Write one executable wrapper per tool into `directory`, all running stub_tool.py."""
+    os.makedirs(directory, exist_ok=True)
+    for tool in TOOLS:
+        path = os.path.join(directory, tool)
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{STUB_TOOL}" {tool} "$@"\n')
+        os.chmod(path, 0o755)
+    return directory
+
+def bench_targets(count):
+    """Return `count` distinct in-scope IP targets (inside 10.0.0.0/8)."""
+    return [f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}" for n in range(1, count + 1)]
+
+def scale_environment(workdir, args):
+    """Environment of a scale run: stubs first on PATH, scratch state, fast retries."""
+    env = dict(os.environ)
+    env.update({
+        "PATH": f"{install_stubs(os.path.join(workdir, 'bin'))}{os.pathsep}{env.get('PATH', '')}",
+        "PYTHONPATH": PROJECT_ROOT,
+        "TARGET_IPS": "10.0.0.0/8",
+        "WORDLIST_DIR": os.path.join(workdir, "wordlists"),
+        "CACHE_ENABLED": "false",
+        "RETRY_BASE_DELAY": "0.01",
+        "RETRY_MAX_DELAY": "0.05",
+        "STUB_SIZE": str(args.size),
+        "STUB_LATENCY": str(args.latency),
+        "STUB_FAIL_RATE": str(args.fail_rate),
+        "STUB_FAIL_MODE": args.fail_mode,
+    })
+    return env
+
+def run_scale(targets, args):
+    """
+    Run one batch scan of `targets` stub targets in a fresh process and scratch directory.
+
+    Returns:
+        dict: The measurements reported by the worker process.
+    """
+    with tempfile.TemporaryDirectory(prefix="bench_agent_") as workdir:
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_agent", "--worker", str(targets), "--batch-workers", str(args.batch_workers)],
+            cwd=workdir, env=scale_environment(workdir, args), capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Benchmark worker failed for {targets} targets:\n{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def worker(targets, batch_workers):
+    """Scan `targets` stub targets as a batch (run inside the scale's scratch directory)."""
+    from agent.batch import run_batch
+    from agent.audit_log import configure_audit_log
+
+    configure_audit_log()  # Log like a real scan does, into the scratch directory
+    start = time.perf_counter()
+    summary = run_batch(bench_targets(targets), workers=batch_workers, report_filename="reports/bench.ndjson")
+    wall = time.perf_counter() - start
+
+    tasks = failed = 0
+    with open(summary["report"], "r") as f:
+        for line in f:
+            tasks += 1
+            failed += json.loads(line)["result"].get("status") != "success"
+
+    print(json.dumps({
+        "targets": targets,
+        "wall_seconds": round(wall, 3),
+        "tasks": tasks,
+        "failed_tasks": failed,
+        "failed_targets": len(summary["failed"]),
+        "tasks_per_second": round(tasks / wall, 2) if wall else None,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_child_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }))
+
+def bench_scheduler(task_count):
+    """Measure the scheduler's own cost per task, with tasks that do nothing."""
+    from agent.scheduler import TaskScheduler
+
+    scheduler = TaskScheduler(lambda task: {"status": "success"}, tool_limits={})
+    for i in range(task_count):
+        scheduler.add_task({"tool": "noop", "target": str(i)})
+    start = time.perf_counter()
+    scheduler.run()
+    seconds = time.perf_counter() - start
+    return {"tasks": task_count, "seconds": round(seconds, 4), "overhead_us_per_task": round(seconds / task_count * 1e6, 1)}
+
+def throughput(name, count, data_bytes, seconds):
+    return {
+        "parser": name,
+        "records": count,
+        "records_per_second": round(count / seconds) if seconds else None,
+        "mb_per_second": round(data_bytes / seconds / 1e6, 2) if seconds else None,
+    }
+
+def bench_parsers(records):
+    """Measure how fast each tool's output is parsed into records."""
+    from agent.parsers import parse_nmap_xml, get_parser, ffuf_hit
+    from benchmarks.stub_tool import nmap_xml, gobuster_lines, ffuf_lines, sqlmap_lines
+
+    results = []
+    xml = "\n".join(nmap_xml([f"10.0.{i // 256}.{i % 256}" for i in range(max(1, records // 100))], 100))
+    start = time.perf_counter()
+    count = sum(1 for _ in parse_nmap_xml(io.StringIO(xml)))
+    results.append(throughput("nmap_xml", count, len(xml), time.perf_counter() - start))
+
+    for name, lines, parse in (
+        ("gobuster", list(gobuster_lines(records)), get_parser("gobuster").feed),
+        ("ffuf", list(ffuf_lines("https://example.com/FUZZ", records)), ffuf_hit),
+        ("sqlmap", list(sqlmap_lines("https://example.com/?id=1", records)), get_parser("sqlmap").feed),
+    ):
+        start = time.perf_counter()
+        for line in lines:
+            parse(line)
+        results.append(throughput(name, len(lines), sum(len(line) + 1 for line in lines), time.perf_counter() - start))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1,10,100", help="Comma-separated target counts, e.g. 1,10,100,1000")
+    parser.add_argument("--size", type=int, default=20, help="Result entries printed by each stub run")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each stub run takes")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Probability that a stub run fails")
+    parser.add_argument("--fail-mode", default="network", choices=["network", "args", "crash"])
+    parser.add_argument("--batch-workers", type=int, default=4, help="Targets scanned at once")
+    parser.add_argument("--scheduler-tasks", type=int, default=10_000)
+    parser.add_argument("--parse-records", type=int, default=100_000)
+    parser.add_argument("--output", help="Append the results as one JSON line to this file")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        worker(args.worker, args.batch_workers)
+        return
+
+    results = {
+        "benchmark": "agent",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {name: getattr(args, name) for name in ("size", "latency", "fail_rate", "fail_mode", "batch_workers")},
+        "scales": [run_scale(int(scale), args) for scale in args.scales.split(",") if scale.strip()],
+        "scheduler": bench_scheduler(args.scheduler_tasks),
+        "parsers": bench_parsers(args.parse_records),
+    }
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(results) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark for scope checks: 100k lookups against a large allowlist.
+
+Times is_within_scope, the check callers use (cached index lookup plus
+target parsing), and the precompiled ScopeIndex on its own, against a linear
+scan over the allowlist (the approach is_within_scope used before the index
+existed).
+
+Run from the project root:
+    python -m benchmarks.bench_scope [--lookups 100000] [--domains 5000] [--networks 5000]
+"""
+import argparse
+import ipaddress
+import json
+import logging
+import random
+import time
+import config
+from agent.scope import ScopeIndex, reload_scope_index
+from agent.task_manager import is_within_scope
+
+def linear_contains(host, domains, networks):
+    """Reference implementation: scan every allowed domain and network in turn."""
+    if host in domains:
+        return True
+    for domain in domains:
+        if host.endswith(f".{domain}"):
+            return True
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+def build_workload(n_domains, n_networks, n_lookups, seed=1):
+    """Build a random allowlist and a mix of in-scope and out-of-scope lookups."""
+    rng = random.Random(seed)
+    domains = [f"site{i}.example{i % 50}.com" for i in range(n_domains)]
+    networks = [f"10.{i // 256 % 256}.{i % 256}.0/24" for i in range(n_networks)]
+
+    lookups = []
+    for _ in range(n_lookups):
+        kind = rng.random()
+        if kind < 0.35:
+            lookups.append(f"api.{rng.choice(domains)}")
+        elif kind < 0.5:
+            lookups.append(f"unknown{rng.randrange(10**6)}.org")
+        elif kind < 0.85:
+            lookups.append(f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}")
+        else:
+            lookups.append(f"172.16.{rng.randrange(256)}.{rng.randrange(1, 255)}")
+    return domains, networks, lookups
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--domains", type=int, default=5_000)
+    parser.add_argument("--networks", type=int, default=5_000)
+    parser.add_argument("--linear-sample", type=int, default=1_000, help="Lookups timed for the linear baseline")
+    args = parser.parse_args()
+
+    domains, networks, lookups = build_workload(args.domains, args.networks, args.lookups)
+
+    start = time.perf_counter()
+    index = ScopeIndex(domains, networks)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hits = sum(1 for host in lookups if index.contains(host))
+    index_seconds = time.perf_counter() - start
+
+    config.ALLOWED_DOMAINS, config.ALLOWED_IPS = domains, networks
+    reload_scope_index()
+    logging.disable(logging.WARNING)  # Out-of-scope targets are logged one by one
+    start = time.perf_counter()
+    scope_hits = sum(1 for host in lookups if is_within_scope(host))
+    scope_seconds = time.perf_counter() - start
+    logging.disable(logging.NOTSET)
+
+    parsed_networks = [ipaddress.ip_network(n) for n in networks]
+    sample = lookups[:args.linear_sample]
+    start = time.perf_counter()
+    for host in sample:
+        linear_contains(host, domains, parsed_networks)
+    linear_per_lookup = (time.perf_counter() - start) / max(1, len(sample))
+
+    print(json.dumps({
+        "lookups": len(lookups),
+        "allowlist": {"domains": len(domains), "networks": len(networks)},
+        "hits": hits,
+        "index_build_seconds": round(build_seconds, 4),
+        "index_total_seconds": round(index_seconds, 4),
+        "index_lookups_per_second": round(len(lookups) / index_seconds),
+        "is_within_scope_hits": scope_hits,
+        "is_within_scope_total_seconds": round(scope_seconds, 4),
+        "is_within_scope_lookups_per_second": round(len(lookups) / scope_seconds),
+        "linear_estimated_total_seconds": round(linear_per_lookup * len(lookups), 2),
+    }, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Stand-in for nmap, gobuster, ffuf and sqlmap used by the offline benchmarks.
+
+Invoked as `stub_tool.py <tool> <tool arguments...>` (see benchmarks.bench_agent,
+which installs one wrapper per tool on PATH). It prints output in the format
+the agent expects from the real tool, sized and paced by environment variables.
+A tool-specific variable (e.g. STUB_NMAP_SIZE) overrides the generic one:
+
+    STUB_SIZE        Number of result entries (ports, paths, hits, ...); default 20
+    STUB_LATENCY     Total run time in seconds, spread over the output; default 0
+    STUB_FAIL_RATE   Probability (0-1) that a run fails; default 0
+    STUB_FAIL_MODE   How it fails: "network" (retryable), "args" (permanent) or "crash"
+    STUB_SEED        Makes failures reproducible: the same arguments always fail or
+                     always succeed. Unset, every run draws anew, so retries can recover.
+"""
+import json
+import os
+import random
+import sys
+import time
+
+FAILURES = {
+    "network": (1, "dial tcp: connect: connection refused"),
+    "args": (2, "flag provided but not defined: -stub"),
+    "crash": (1, "panic: runtime error: index out of range"),
+}
+
+def setting(tool, name, default, cast=float):
+    """Read STUB_<TOOL>_<NAME>, falling back to STUB_<NAME> and then to `default`."""
+    value = os.environ.get(f"STUB_{tool.upper()}_{name}", os.environ.get(f"STUB_{name}"))
+    return default if value in (None, "") else cast(value)
+
+def option(args, flag, default=""):
+    """Return the value following `flag` in the argument list."""
+    if flag in args and args.index(flag) + 1 < len(args):
+        return args[args.index(flag) + 1]
+    return default
+
+def nmap_xml(hosts, size):
+    """Yield the lines of an nmap XML report with `size` ports per host (80 and 443 open)."""
+    yield '<?xml version="1.0" encoding="UTF-8"?>'
+    yield '<nmaprun scanner="nmap" args="nmap -Pn -oX -">'
+    for host in hosts:
+        yield f'<host><status state="up"/><address addr="{host}" addrtype="ipv4"/><ports>'
+        yield '<port protocol="tcp" portid="80"><state state="open"/><service name="http" method="probed"/></port>'
+        yield '<port protocol="tcp" portid="443"><state state="open"/><service name="http" tunnel="ssl" method="probed"/></port>'
+        for port in range(max(0, size - 2)):
+            yield f'<port protocol="tcp" portid="{1000 + port}"><state state="closed"/><service name="unknown" method="table"/></port>'
+        yield '</ports></host>'
+    yield '</nmaprun>'
+
+def gobuster_lines(size):
+    for i in range(size):
+        yield f"/path{i}                (Status: {200 if i % 4 else 301}) [Size: {100 + i}]"
+
+def ffuf_lines(url, size):
+    for i in range(size):
+        yield json.dumps({
+            "input": {"FUZZ": "cGF0aA=="}, "position": i + 1, "status": 200 if i % 4 else 301,
+            "length": 100 + i, "words": 10, "lines": 3, "content-type": "text/html",
+            "redirectlocation": "", "url": url.replace("FUZZ", f"path{i}"), "duration": 25_000_000,
+        })
+
+def sqlmap_lines(url, size):
+    """Yield sqlmap's output for one URL: `size` tests and one injectable parameter."""
+    yield "URL:"
+    yield f"GET {url}"
+    yield f"[INFO] testing URL '{url}'"
+    for i in range(size):
+        yield f"[INFO] testing 'AND boolean-based blind - WHERE or HAVING clause' ({i})"
+    yield "---"
+    yield "Parameter: id (GET)"
+    yield "    Type: boolean-based blind"
+    yield "---"
+
+def main(argv):
+    tool, args = argv[0], argv[1:]
+    size = setting(tool, "SIZE", 20, int)
+    latency = setting(tool, "LATENCY", 0.0)
+    fail_rate = setting(tool, "FAIL_RATE", 0.0)
+    fail_mode = setting(tool, "FAIL_MODE", "network", str)
+
+    seed = setting(tool, "SEED", None, str)
+    rng = random.Random(f"{seed}:{' '.join(argv)}" if seed is not None else None)
+    if rng.random() < fail_rate:
+        time.sleep(latency / 2)
+        returncode, message = FAILURES.get(fail_mode, FAILURES["crash"])
+        print(message, file=sys.stderr)
+        return returncode
+
+    if tool == "nmap":
+        lines = nmap_xml([args[-1]], size)
+    elif tool == "gobuster":
+        lines = gobuster_lines(size)
+    elif tool == "ffuf":
+        lines = ffuf_lines(option(args, "-u"), size)
+    elif tool == "sqlmap":
+        if "-m" in args:
+            # Bulk run: one block per URL in the file
+            with open(option(args, "-m")) as f:
+                urls = [line.strip() for line in f if line.strip()]
+        else:
+            urls = [option(args, "-u")]
+        lines = [line for url in urls for line in sqlmap_lines(url, size)]
+    else:
+        print(f"unknown stub tool: {tool}", file=sys.stderr)
+        return 127
+
+    lines = list(lines)
+    pause = latency / max(1, len(lines))
+    for line in lines:
+        print(line, flush=True)
+        if pause:
+            time.sleep(pause)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -7,4 +7,125 @@ load_dotenv()
 # Define the allowed scanning scope
 ALLOWED_DOMAINS = os.getenv("TARGET_DOMAINS", "google.com,yahoo.com").split(",")
 ALLOWED_IPS = os.getenv("TARGET_IPS", "192.168.0.0/24,10.0.0.0/24").split(",")
-MAX_RETRIES = int(os.getenv("MAX_RETRIES", 5))
\ No newline at end of file
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", 5))
+
+# Scheduler concurrency: a global cap on running tasks plus per-tool limits
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", 4))
+TOOL_CONCURRENCY = {
+    "nmap": int(os.getenv("NMAP_CONCURRENCY", 2)),
+    "gobuster": int(os.getenv("GOBUSTER_CONCURRENCY", 2)),
+    "ffuf": int(os.getenv("FFUF_CONCURRENCY", 2)),
+    "sqlmap": int(os.getenv("SQLMAP_CONCURRENCY", 1)),
+}
+
+# Number of targets scanned at once in batch mode
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 4))
+
+# On-disk cache of tool results: location, size bound and per-tool time-to-live (seconds)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_DIR = os.getenv("CACHE_DIR", "cache/results")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 256 * 1024 * 1024))
+CACHE_TTLS = {
+    "nmap": int(os.getenv("NMAP_CACHE_TTL", 3600)),
+    "gobuster": int(os.getenv("GOBUSTER_CACHE_TTL", 6 * 3600)),
+    "ffuf": int(os.getenv("FFUF_CACHE_TTL", 6 * 3600)),
+    "sqlmap": int(os.getenv("SQLMAP_CACHE_TTL", 12 * 3600)),
+}
+
+# Retry policy: exponential backoff with jitter, and a per-host circuit breaker
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 2))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 60))
+MAX_TIMEOUT_RETRIES = int(os.getenv("MAX_TIMEOUT_RETRIES", 1))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 3))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 120))
+
+# Append-only scan journals used to resume interrupted scans
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journal")
+
+# Directory of NDJSON scan reports, and their compression: "" (plain), "gzip" or "zstd" (needs the zstandard package)
+REPORT_DIR = os.getenv("REPORT_DIR", "reports")
+REPORT_COMPRESSION = os.getenv("REPORT_COMPRESSION", "")
+
+# Wordlist registry location, default list and number of shards per gobuster/ffuf scan
+WORDLIST_DIR = os.path.expanduser(os.getenv("WORDLIST_DIR", "~/wordlists"))
+DEFAULT_WORDLIST = os.getenv("DEFAULT_WORDLIST", "common")
+WORDLIST_SHARDS = int(os.getenv("WORDLIST_SHARDS", 1))
+
+# Nmap sharding: ports to scan ("" = nmap's default top ports; sharding without a port list splits
+# 1-65535), and the number of port-range and host (CIDR sub-network) shards each nmap scan is split into
+NMAP_PORTS = os.getenv("NMAP_PORTS", "")
+NMAP_PORT_SHARDS = int(os.getenv("NMAP_PORT_SHARDS", 1))
+NMAP_HOST_SHARDS = int(os.getenv("NMAP_HOST_SHARDS", 1))
+
+# Content-addressed store for raw tool output; outputs above BLOB_INLINE_BYTES are kept there
+# and results only carry a reference to them
+BLOB_DIR = os.getenv("BLOB_DIR", "cache/blobs")
+BLOB_INLINE_BYTES = int(os.getenv("BLOB_INLINE_BYTES", 4096))
+BLOB_MAX_BYTES = int(os.getenv("BLOB_MAX_BYTES", 1024 * 1024 * 1024))  # Least recently used blobs are removed past this
+
+# Adaptive per-host thread counts (AIMD) for the web tools: (minimum, initial, maximum) threads per invocation
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() in ("1", "true", "yes")
+TOOL_THREADS = {
+    "gobuster": (int(os.getenv("GOBUSTER_MIN_THREADS", 5)), int(os.getenv("GOBUSTER_THREADS", 50)), int(os.getenv("GOBUSTER_MAX_THREADS", 100))),
+    "ffuf": (int(os.getenv("FFUF_MIN_THREADS", 5)), int(os.getenv("FFUF_THREADS", 40)), int(os.getenv("FFUF_MAX_THREADS", 100))),
+    "sqlmap": (1, int(os.getenv("SQLMAP_THREADS", 4)), 10),  # sqlmap allows at most 10 threads
+}
+# Requests per second all tools together may send to one host, the share of it each invocation gets
+# (1/HOST_RATE_SHARES, less while the budget is taken), and the latency above which they back off
+HOST_RPS_BUDGET = float(os.getenv("HOST_RPS_BUDGET", 200))
+HOST_RATE_SHARES = int(os.getenv("HOST_RATE_SHARES", len(TOOL_THREADS)))
+LATENCY_TARGET = float(os.getenv("LATENCY_TARGET", 2.0))
+
+# Task timing metrics: OpenMetrics text file written after each scan, and an optional local scrape port (0 = off)
+METRICS_FILE = os.getenv("METRICS_FILE", "logs/metrics.prom")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+# Background scans started from the Streamlit app: number of scans running at once
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+
+# Local job service shared by the CLI and the Streamlit app: address ("http://host:port" or
+# "unix:///path/to.sock"; empty runs scans in-process) and number of tools it runs at once
+JOB_SERVICE_URL = os.getenv("JOB_SERVICE_URL", "")
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", MAX_WORKERS))
+
+# Audit log: JSON lines written by a background thread, rotated by size; messages longer than
+# AUDIT_LOG_MAX_MESSAGE characters are kept in the blob store and only referenced from the log
+AUDIT_LOG_FILE = os.getenv("AUDIT_LOG_FILE", "logs/audit.log")
+AUDIT_LOG_LEVEL = os.getenv("AUDIT_LOG_LEVEL", "INFO")
+AUDIT_LOG_MAX_BYTES = int(os.getenv("AUDIT_LOG_MAX_BYTES", 10 * 1024 * 1024))
+AUDIT_LOG_BACKUPS = int(os.getenv("AUDIT_LOG_BACKUPS", 5))
+AUDIT_LOG_QUEUE_SIZE = int(os.getenv("AUDIT_LOG_QUEUE_SIZE", 10000))
+AUDIT_LOG_MAX_MESSAGE = int(os.getenv("AUDIT_LOG_MAX_MESSAGE", 2048))
+
+# Distributed worker mode: shared SQLite task queue, task lease length (seconds; workers renew it
+# while a task runs), attempts before a task whose lease keeps expiring fails, and idle poll interval
+TASK_QUEUE_DB = os.getenv("TASK_QUEUE_DB", "queue/tasks.db")
+LEASE_SECONDS = float(os.getenv("LEASE_SECONDS", 120))
+MAX_TASK_ATTEMPTS = int(os.getenv("MAX_TASK_ATTEMPTS", 3))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", 1.0))
+
+# Scan planning: per-(tool, target) runtime history, the weight of the latest run in its moving
+# average, how often (seconds) recorded runs are written to the history file, the estimated duration (seconds) of tools without history, and the smallest share of a
+# wordlist a time-budgeted scan still runs rather than skipping the task
+RUNTIME_HISTORY_FILE = os.getenv("RUNTIME_HISTORY_FILE", "cache/runtime_history.json")
+RUNTIME_HISTORY_WEIGHT = float(os.getenv("RUNTIME_HISTORY_WEIGHT", 0.3))
+RUNTIME_HISTORY_FLUSH_SECONDS = float(os.getenv("RUNTIME_HISTORY_FLUSH_SECONDS", 30))
+DEFAULT_TASK_ESTIMATES = {
+    "nmap": float(os.getenv("NMAP_ESTIMATE", 120)),
+    "gobuster": float(os.getenv("GOBUSTER_ESTIMATE", 300)),
+    "ffuf": float(os.getenv("FFUF_ESTIMATE", 300)),
+    "sqlmap": float(os.getenv("SQLMAP_ESTIMATE", 600)),
+}
+MIN_WORDLIST_FRACTION = float(os.getenv("MIN_WORDLIST_FRACTION", 0.1))
+
+# Tool processes: stdout kept in memory before it spills to a temporary file, stderr kept (its
+# last bytes), and per-process CPU-seconds and address-space limits (0 = unlimited; POSIX only)
+TOOL_OUTPUT_MEMORY_BYTES = int(os.getenv("TOOL_OUTPUT_MEMORY_BYTES", 8 * 1024 * 1024))
+TOOL_STDERR_MAX_BYTES = int(os.getenv("TOOL_STDERR_MAX_BYTES", 64 * 1024))
+TOOL_CPU_SECONDS = int(os.getenv("TOOL_CPU_SECONDS", 0))
+TOOL_MEMORY_BYTES = int(os.getenv("TOOL_MEMORY_BYTES", 0))
+
+# Injection testing: sqlmap runs after discovery over the distinct endpoints found (at most
+# SQLMAP_MAX_ENDPOINTS, deduplicated by path and parameter names), SQLMAP_BATCH_SIZE URLs per process
+SQLMAP_BATCH_SIZE = int(os.getenv("SQLMAP_BATCH_SIZE", 50))
+SQLMAP_MAX_ENDPOINTS = int(os.getenv("SQLMAP_MAX_ENDPOINTS", 200))
@@ -1,19 +1,178 @@
-import sys  # Module for handling command-line arguments
+import argparse  # Module for parsing command-line arguments
 from agent.agent_graph import run_agent  # Import the main agent function to run the scan
+from agent.batch import expand_targets, read_entries, run_batch  # Import the batch helpers for multi-target scans
+from agent.diff_scan import run_diff_scan  # Import the differential re-scan
+from agent.task_queue import TaskQueue, run_worker, run_distributed  # Import the shared task queue of distributed mode
+from agent.journal import ScanJournal, new_scan_id  # Import the journal used to resume interrupted scans
+from agent.metrics import start_metrics_server, write_metrics  # Import the timing metrics exporters
+from agent.job_client import JobServiceClient, JobServiceError, DEFAULT_PRIORITY, DEFAULT_SERVICE_URL  # Client of the shared job service
+from agent.job_service import run_service  # The shared job service itself (--serve)
+from agent.audit_log import configure_audit_log  # Import the background audit log writer
+from config import BATCH_WORKERS, METRICS_PORT, JOB_SERVICE_URL, TASK_QUEUE_DB
+
+def parse_args(argv=None):
+    """Parse the command-line arguments (`argv`, default sys.argv) for single-target and batch scans."""
+    parser = argparse.ArgumentParser(description="Agentic Cybersecurity Pipeline")
+    parser.add_argument("targets", nargs="*", help="Target domain/IP (several targets start a batch scan)")
+    parser.add_argument("--targets-file", help="File with one target or CIDR block per line")
+    parser.add_argument("--cidr", help="CIDR block (e.g. one of ALLOWED_IPS) to expand and scan")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Number of targets scanned at once in batch mode")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached tool results and re-run every tool")
+    parser.add_argument("--resume", metavar="SCAN_ID", help="Resume an interrupted scan or batch, running only unfinished tasks")
+    parser.add_argument("--diff", action="store_true", help="Re-scan only what changed since the previous report and print the delta")
+    parser.add_argument("--baseline", metavar="REPORT", help="Report --diff compares with (default: the latest report for the target)")
+    parser.add_argument("--queue", default=TASK_QUEUE_DB, help="Shared SQLite task queue of distributed mode")
+    parser.add_argument("--worker", action="store_true", help="Run a scanner worker that executes tasks from --queue")
+    parser.add_argument("--distributed", action="store_true", help="Queue the scan on --queue for the workers and aggregate their results")
+    parser.add_argument("--local-workers", type=int, default=0, help="Workers to run in this process as well in --distributed mode")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS", help="Fit a single-target scan into this many seconds, trimming or skipping the tasks estimated not to finish")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Serve timing metrics on this local port while scanning (0 = off)")
+    parser.add_argument("--service", default=JOB_SERVICE_URL, help="Run scans on the job service at this address (http://host:port or unix:///path)")
+    parser.add_argument("--priority", type=int, default=DEFAULT_PRIORITY, help="Priority of the scans on the job service (lower runs first)")
+    parser.add_argument("--serve", action="store_true", help=f"Run the job service (at --service, default {DEFAULT_SERVICE_URL})")
+    return parser.parse_args(argv)
+
+def run_on_service(url, targets, refresh=False, priority=DEFAULT_PRIORITY):
+    """Submit one scan job per target to the job service and wait for all of them."""
+    client = JobServiceClient(url)
+    jobs = []
+    for target in targets:
+        try:
+            jobs.append(client.submit_scan(target, priority=priority, refresh=refresh))
+            print(f"Submitted scan of {target} to {client.url} (job {jobs[-1]['job_id']})")
+        except JobServiceError as e:
+            print(f"Skipping {target}: {e}")
+    failed = 0
+    for job in jobs:
+        job = client.wait(job["job_id"])
+        failed += job["status"] != "completed"
+        print(f"Scan of {job['request']['target']} {job['status']} (scan id {job['scan_id']})"
+              + (f": {job['error']}" if job["error"] else ""))
+    return failed
+
+def main(argv=None):
+    """Run the scan, batch, service or worker that the command-line arguments ask for."""
+    args = parse_args(argv)
+    configure_audit_log()  # JSON lines in logs/audit.log, written off the scan threads
+
+    if args.metrics_port:
+        # Let a local Prometheus-compatible scraper follow the scan as it runs
+        start_metrics_server(args.metrics_port)
+
+    if args.serve:
+        # Run the shared job service until interrupted; clients connect with --service
+        run_service(args.service or DEFAULT_SERVICE_URL)
+        raise SystemExit(0)
+
+    if args.worker:
+        # Execute queued tasks of any scan until interrupted; run one per scanner node (or several)
+        try:
+            run_worker(TaskQueue(args.queue))
+        except KeyboardInterrupt:
+            pass
+        raise SystemExit(0)
+
+    # Collect every batch source given on the command line
+    batch_sources = []
+    if args.targets_file:
+        batch_sources.append(args.targets_file)
+    if args.cidr:
+        batch_sources.append(args.cidr)
+
+    if args.resume:
+        # Rebuild the interrupted scan from its journal and finish it
+        journal = ScanJournal(args.resume)
+        if not journal.exists():
+            print(f"No journal found for scan {args.resume}")
+            raise SystemExit(1)
+        print(f"Resuming scan: {args.resume}")
+        if journal.kind() == "batch":
+            summary = run_batch(None, workers=args.workers, refresh=args.refresh, batch_id=args.resume, resume=True)
+            print(f"Batch scan completed. Combined report: {summary['report']}")
+        else:
+            run_agent(None, refresh=args.refresh, scan_id=args.resume, resume=True)
+            print("Scan completed. Check the reports/ directory for details.")
+        raise SystemExit(0)
+
+    # Ensure that at least one target is provided
+    if not args.targets and not batch_sources:
+        print("Usage: python main.py <target> | python main.py [--targets-file FILE] [--cidr CIDR] [target ...]")
+        raise SystemExit(1)  # Exit if no target is provided
+
+    if args.distributed:
+        if len(args.targets) != 1 or batch_sources:
+            print("Usage: python main.py --distributed [--queue PATH] [--local-workers N] <target>")
+            raise SystemExit(1)
+        print(f"Queueing scan of {args.targets[0]} on {args.queue}; start workers with: python main.py --worker --queue {args.queue}")
+        results = run_distributed(args.targets[0], TaskQueue(args.queue), refresh=args.refresh, local_workers=args.local_workers)
+        if "error" in results:
+            print(results["error"])
+            raise SystemExit(1)
+        print("Scan completed. Check the reports/ directory for details.")
+        raise SystemExit(0)
+
+    if args.diff:
+        if len(args.targets) != 1 or batch_sources:
+            print("Usage: python main.py --diff [--baseline REPORT] <target>")
+            raise SystemExit(1)
+        results = run_diff_scan(args.targets[0], baseline=args.baseline, refresh=args.refresh)
+        if "error" in results:
+            print(results["error"])
+            raise SystemExit(1)
+        delta = results["delta"]
+        print(f"Compared with {delta['baseline'] or 'no previous report'}: re-ran {len(delta['rerun'])} tasks, "
+              f"carried forward {delta['carried_forward']} results")
+        for name in ("added", "removed", "changed"):
+            for service in delta["services"][name]:
+                print(f"  service {name}: {service['host']}:{service['port']}")
+        for name in ("added", "removed"):
+            for finding in delta["findings"][name]:
+                print(f"  {name}: {finding['kind']} {finding['host']}:{finding['port']}{finding['path']} {finding['status']}")
+        print(f"Timing metrics written to {write_metrics()}")
+        raise SystemExit(0)
+
+    if args.service:
+        # Thin client: the service runs the tools, sharing identical runs with other clients
+        entries = list(args.targets)
+        for source in batch_sources:
+            entries.extend(expand_targets(source))
+        failed = run_on_service(args.service, entries, refresh=args.refresh, priority=args.priority)
+        print("Scans completed. Reports are in the service's reports/ directory.")
+        raise SystemExit(1 if failed else 0)
+
+    if len(args.targets) == 1 and not batch_sources:
+        # Retrieve the target (domain or IP) from the command-line arguments
+        target = args.targets[0]
+        scan_id = new_scan_id()
+        print(f"Starting scan on: {target} (scan id {scan_id}, resume with --resume {scan_id})")
+
+        # Call the main agent function to perform the scan on the target
+        results = run_agent(target, refresh=args.refresh, scan_id=scan_id, time_budget=args.time_budget)
+
+        # Inform the user that the scan has been completed and where to find the report
+        print("Scan completed. Check the reports/ directory for details.")
+        for trimmed in results.get("plan", {}).get("trimmed", []):
+            print(f"  trimmed: {trimmed['task']} ran {trimmed['kept']} of {trimmed['entries']} wordlist entries")
+        for skipped in results.get("plan", {}).get("skipped", []):
+            print(f"  skipped: {skipped['task']} ({skipped['reason']})")
+    else:
+        # Combine the file, CIDR and listed targets into one batch; run_batch expands them as it goes
+        entries = list(args.targets)
+        for source in batch_sources:
+            entries.extend(read_entries(source))
+        batch_id = new_scan_id()
+        print(f"Starting batch scan with {args.workers} workers (scan id {batch_id}, resume with --resume {batch_id})")
+
+        summary = run_batch(entries, workers=args.workers, refresh=args.refresh, batch_id=batch_id)
+
+        print(
+            f"Batch scan completed: {len(summary['completed'])} scanned, "
+            f"{len(summary['failed'])} failed, {len(summary['skipped'])} out of scope. "
+            f"Combined report: {summary['report']}"
+        )
+
+    print(f"Timing metrics written to {write_metrics()}")
 
 # Check if the script is executed as the main module
 if __name__ == "__main__":
-    # Ensure that a target is provided via command-line arguments
-    if len(sys.argv) < 2:
-        print("Usage: python main.py <target>")
-        sys.exit(1)  # Exit if no target is provided
-    
-    # Retrieve the target (domain or IP) from the command-line arguments
-    target = sys.argv[1]
-    print(f"Starting scan on: {target}")
-    
-    # Call the main agent function to perform the scan on the target
-    results = run_agent(target)
-    
-    # Inform the user that the scan has been completed and where to find the report
-    print("Scan completed. Check reports/final_report.json for details.")
\ No newline at end of file
+    main()
@@ -1,9 +1,19 @@
 import streamlit as st
+import glob
+import os
 import json
+import time
 from datetime import datetime
-from agent.agent_graph import run_agent, execute_task
+from agent.jobs import get_job_manager
+from agent.report_sink import ReportReader, report_dir
+from agent.findings import Finding, FindingIndex, format_findings
+from agent.blob_store import load_output
+from agent.audit_log import configure_audit_log
 from config import ALLOWED_DOMAINS, ALLOWED_IPS
 
+# Log to the audit log from a background writer thread (a no-op on reruns)
+configure_audit_log()
+
 # Set the title of the Streamlit app
 st.title("Agentic Cybersecurity Pipeline")
 
@@ -21,6 +31,10 @@ if scan_type == "Basic":
 elif scan_type == "Full":
     st.sidebar.write("**Full Scan includes:**\n- Nmap\n- Gobuster\n- FFuF\n- SQLMap")
 
+# Cached tool results make re-running a scan instant; allow forcing a fresh run
+refresh_cache = st.sidebar.checkbox("Ignore cached results", value=False,
+                                    help="Re-run every tool even if a recent result is cached")
+
 # Sidebar section for scope configuration (allowed domains and IP ranges)
 st.sidebar.header("Scope Configuration")
 allowed_domains = st.sidebar.text_input("Allowed Domains (comma-separated):", value="google.com,example.com")
@@ -60,8 +74,14 @@ def format_scan_results(results):
     Formats the scan results to include descriptions for each tool,
     making it easier for users to understand the output.
 
+    Findings reported by several tools (e.g. a path found by both Gobuster
+    and FFuF) are merged first; each tool's tab then lists the findings that
+    tool contributed to. Tools without findings show their raw output.
+    A tool that ran several tasks (wordlist or nmap shards, follow-up scans
+    of other web ports) shows the output of all of them.
+
     Args:
-        results (dict): A dictionary with scan tool outputs.
+        results (dict): The results of each tool's tasks, as a list per tool name (as run_agent returns them).
 
     Returns:
         dict: A formatted dictionary with additional description for each tool.
@@ -74,112 +94,182 @@ def format_scan_results(results):
         "sqlmap": "SQLMap is an open-source penetration testing tool that automates the process of detecting and exploiting SQL injection flaws."
     }
     
+    findings = FindingIndex(
+        Finding.from_dict(data)
+        for tool_results in results.values()
+        for result in tool_results if result
+        for data in result.get("findings", [])
+    )
+
     formatted = {}
-    for tool, result in results.items():
-        if result is None:
+    for tool, tool_results in results.items():
+        tool_findings = [finding for finding in findings if tool in finding.tools]
+        succeeded = [result for result in tool_results if result and result.get("status") != "failed"]
+        errors = [result.get("error", "") for result in tool_results if result and result.get("error")]
+        if not succeeded:
             formatted[tool] = {
                 "status": "Failed",
-                "error": "Tool execution failed or not installed",
+                "error": "; ".join(errors) or "Tool execution failed or not installed",
                 "description": descriptions.get(tool, "")
             }
         else:
             formatted[tool] = {
                 "status": "Success",
-                "output": result.get("output", ""),
-                "error": result.get("error", ""),
+                "output": format_findings(tool_findings) if tool_findings else
+                          "\n".join(result.get("output", "") for result in succeeded if result.get("output")),
+                # Large raw output stays in the blob store
+                "output_refs": [result["output_ref"] for result in succeeded if result.get("output_ref")],
+                "findings": [finding.to_dict() for finding in tool_findings],
+                "error": "; ".join(errors),
                 "description": descriptions.get(tool, "")
             }
     return formatted
 
-# Create a progress bar and a placeholder for status updates
-progress_bar = st.progress(0)
-status_text = st.empty()
+def build_tasks(clean_target):
+    """Build the task list for the selected scan type."""
+    # Web tools scan the target over the selected protocol
+    web_target = f"{protocol}://{clean_target}"
+    if scan_type == "Custom":
+        selected_tools = []
+        if use_nmap:
+            selected_tools.append({"tool": "nmap", "target": clean_target})
+        if use_gobuster:
+            selected_tools.append({"tool": "gobuster", "target": web_target})
+        if use_ffuf:
+            selected_tools.append({"tool": "ffuf", "target": web_target})
+        if use_sqlmap:
+            selected_tools.append({"tool": "sqlmap", "target": web_target})
+    elif scan_type == "Basic":
+        # Basic scan includes only Nmap and Gobuster
+        selected_tools = [
+            {"tool": "nmap", "target": clean_target},
+            {"tool": "gobuster", "target": web_target}
+        ]
+    else:
+        # Full scan includes all four tools
+        selected_tools = [
+            {"tool": "nmap", "target": clean_target},
+            {"tool": "gobuster", "target": web_target},
+            {"tool": "ffuf", "target": web_target},
+            {"tool": "sqlmap", "target": web_target}
+        ]
+    return selected_tools
+
+def render_results(results):
+    """Render finished scan results as one tab per tool, plus a JSON download."""
+    # Format the results for improved readability and description
+    formatted_results = format_scan_results(results)
+    st.write("## Scan Results")
+
+    # Create tabs for each tool's output
+    tabs = st.tabs(list(formatted_results.keys()))
+    for tab, (tool, data) in zip(tabs, formatted_results.items()):
+        with tab:
+            st.subheader(f"{tool.upper()} Scan")
+            st.write(data["description"])
+            if data["status"] == "Success":
+                st.code(data["output"])
+                # Raw output is only read from the blob store when asked for
+                for output_ref in data["output_refs"]:
+                    if st.checkbox(f"Show raw output ({output_ref['size']} bytes)",
+                                   key=f"raw-{tool}-{output_ref['sha256']}"):
+                        st.code(load_output({"output_ref": output_ref}) or "Raw output is no longer available.")
+            else:
+                st.error(data["error"])
+                # Provide installation hints for specific tools if needed
+                if tool in ["gobuster", "ffuf"]:
+                    st.info("To fix this, ensure the tool is installed:\n```bash\nbrew install {tool}```")
+
+    # Save the final report with a timestamp in the filename
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_filename = f"final_report_{timestamp}.json"
+    # Provide a download button for the JSON report of the scan results
+    st.download_button(
+        label="Download Full Report",
+        data=json.dumps(formatted_results, indent=4),
+        file_name=report_filename,
+        mime="application/json"
+    )
+
+# Scans run in a background job manager that outlives script reruns; the
+# session only remembers the running job and the results of finished ones
+jobs = get_job_manager()
+st.session_state.setdefault("job_id", None)
+st.session_state.setdefault("scan_results", {})  # job_id -> list of results per tool
+st.session_state.setdefault("last_job_id", None)
+
+running_job = jobs.get(st.session_state["job_id"]) if st.session_state["job_id"] else None
 
 # Define the action when the "Start Scan" button is pressed
-if st.button("Start Scan", type="primary"):
+if st.button("Start Scan", type="primary", disabled=running_job is not None):
     if not target:
         # Display an error if no target is provided
         st.error("Please enter a valid target.")
     else:
         # Clean the target by removing protocol prefixes and extra spaces
         clean_target = target.replace('http://', '').replace('https://', '').strip()
-        
-        # Start a spinner to indicate the scan is running
-        with st.spinner(f"Starting scan for {clean_target} ..."):
-            # Based on the scan type, build the list of selected tools
-            if scan_type == "Custom":
-                selected_tools = []
-                if use_nmap:
-                    selected_tools.append({"tool": "nmap", "target": clean_target})
-                if use_gobuster:
-                    selected_tools.append({"tool": "gobuster", "target": clean_target, "protocol": protocol})
-                if use_ffuf:
-                    selected_tools.append({"tool": "ffuf", "target": clean_target, "protocol": protocol})
-                if use_sqlmap:
-                    selected_tools.append({"tool": "sqlmap", "target": clean_target, "protocol": protocol})
-            elif scan_type == "Basic":
-                # Basic scan includes only Nmap and Gobuster
-                selected_tools = [
-                    {"tool": "nmap", "target": clean_target},
-                    {"tool": "gobuster", "target": clean_target, "protocol": protocol}
-                ]
-            elif scan_type == "Full":
-                # Full scan includes all four tools
-                selected_tools = [
-                    {"tool": "nmap", "target": clean_target},
-                    {"tool": "gobuster", "target": clean_target, "protocol": protocol},
-                    {"tool": "ffuf", "target": clean_target, "protocol": protocol},
-                    {"tool": "sqlmap", "target": clean_target, "protocol": protocol}
-                ]
-                    
-            results = {}
-            total_tasks = len(selected_tools)
-            # Loop through each selected tool and execute its task
-            for i, task in enumerate(selected_tools):
-                # Append protocol to target if provided in the task dictionary
-                task_target = task["target"]
-                if "protocol" in task:
-                    task_target = f"{task['protocol']}://{task_target}"
-                # Execute the task using the execute_task function from the agent
-                result = execute_task(task)
-                if result["status"] == "failed":
-                    st.error(f"Task {task['tool']} failed: {result['error']}")
-                results[task["tool"]] = result
-                # Update progress bar and status text based on task completion
-                progress_bar.progress((i + 1) / total_tasks)
-                status_text.text(f"Completed {i + 1}/{total_tasks} tasks")
-            
-            # Format the results for improved readability and description
-            formatted_results = format_scan_results(results)
-            st.write("## Scan Results")
-            
-            # Check for errors in the results and display allowed scope if errors exist
-            if "error" in results:
-                st.error(results["error"])
-                st.info(f"Allowed domains: {', '.join(ALLOWED_DOMAINS)}")
-                st.info(f"Allowed IP ranges: {', '.join(ALLOWED_IPS)}")
-            else:
-                # Create tabs for each tool's output
-                tabs = st.tabs(list(formatted_results.keys()))
-                for tab, (tool, data) in zip(tabs, formatted_results.items()):
-                    with tab:
-                        st.subheader(f"{tool.upper()} Scan")
-                        st.write(data["description"])
-                        if data["status"] == "Success":
-                            st.code(data["output"])
-                        else:
-                            st.error(data["error"])
-                            # Provide installation hints for specific tools if needed
-                            if tool in ["gobuster", "ffuf"]:
-                                st.info("To fix this, ensure the tool is installed:\n```bash\nbrew install {tool}```")
-                
-                # Save the final report with a timestamp in the filename
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                report_filename = f"final_report_{timestamp}.json"
-                # Provide a download button for the JSON report of the scan results
-                st.download_button(
-                    label="Download Full Report",
-                    data=json.dumps(formatted_results, indent=4),
-                    file_name=report_filename,
-                    mime="application/json"
-                )
\ No newline at end of file
+        st.session_state["job_id"] = jobs.submit(build_tasks(clean_target), refresh=refresh_cache)
+        running_job = jobs.get(st.session_state["job_id"])
+
+if running_job is not None:
+    # Show the job's progress: per-tool state and the tail of each running tool's output
+    snapshot = running_job.snapshot()
+    st.progress(snapshot["done"] / max(1, snapshot["total"]))
+    st.text(f"Completed {snapshot['done']}/{snapshot['total']} tasks")
+    for info in snapshot["tasks"].values():
+        st.caption(f"{info['tool']} on {info['target']}: {info['state']}")
+        if info["state"] == "running" and info["lines"]:
+            st.code("\n".join(info["lines"]))
+    for task_id, result in snapshot["results"].items():
+        if result.get("status") == "failed":
+            st.error(f"Task {snapshot['tasks'][task_id]['tool']} failed: {result.get('error', '')}")
+
+    if running_job.done():
+        # Keep the results in the session so reruns render them without re-running anything
+        # Every task's result, in the order the tasks were queued; a tool may have run several
+        results = {}
+        for task_id, info in snapshot["tasks"].items():
+            if task_id in snapshot["results"]:
+                results.setdefault(info["tool"], []).append(snapshot["results"][task_id])
+        if snapshot["error"]:
+            st.error(f"Scan failed: {snapshot['error']}")
+        st.session_state["scan_results"][snapshot["job_id"]] = results
+        st.session_state["last_job_id"] = snapshot["job_id"]
+        st.session_state["job_id"] = None
+        st.rerun()
+    else:
+        # Poll the job again shortly; widgets stay responsive in between
+        time.sleep(1)
+        st.rerun()
+
+if st.session_state["last_job_id"] in st.session_state["scan_results"]:
+    render_results(st.session_state["scan_results"][st.session_state["last_job_id"]])
+
+# Browse reports written by earlier scans; only the selected records are read from disk
+with st.expander("Saved Reports"):
+    report_files = sorted(
+        (f for f in glob.glob(os.path.join(report_dir(), "*.ndjson*")) if not f.endswith(".idx")),
+        reverse=True
+    )
+    if not report_files:
+        st.write("No saved reports yet.")
+    else:
+        report_file = st.selectbox("Report", report_files)
+        reader = ReportReader(report_file)
+        report_target = st.selectbox("Target", reader.targets())
+        if report_target:
+            report_tool = st.selectbox("Tool", reader.tools(report_target))
+            for record in reader.read(report_target, report_tool):
+                result = record["result"]
+                st.caption(f"{record.get('task_target', report_target)} ({result.get('status', 'unknown')})")
+                if result.get("findings"):
+                    st.code(format_findings(Finding.from_dict(data) for data in result["findings"]))
+                elif "summary" in result:
+                    st.json(result["summary"])  # Per-scan timing summary
+                elif "output" in result or "error" in result:
+                    st.code(result.get("output") or result.get("error", ""))
+                # Raw output is only read from the blob store when asked for
+                if "output_ref" in result and st.checkbox(
+                        f"Show raw output ({result['output_ref']['size']} bytes)",
+                        key=f"raw-{record.get('task_id')}-{result['output_ref']['sha256']}"):
+                    st.code(load_output(result) or "Raw output is no longer available.")
@@ -0,0 +1,37 @@
+import pytest
+from agent import result_cache, journal, wordlists, blob_store, metrics, cost_model, report_sink
+
+@pytest.fixture(autouse=True)
+def isolated_result_cache(tmp_path, monkeypatch):
+    """Give every test its own empty result cache so cached runs never leak between tests."""
+    monkeypatch.setattr(result_cache, "_default_cache", result_cache.ResultCache(str(tmp_path / "cache")))
+
+@pytest.fixture(autouse=True)
+def isolated_journal_dir(tmp_path, monkeypatch):
+    """Write scan journals to a per-test directory."""
+    monkeypatch.setattr(journal, "JOURNAL_DIR", str(tmp_path / "journal"))
+
+@pytest.fixture(autouse=True)
+def isolated_wordlists(tmp_path, monkeypatch):
+    """Keep registered wordlists in a per-test directory instead of ~/wordlists."""
+    monkeypatch.setattr(wordlists, "_registry", wordlists.WordlistRegistry(str(tmp_path / "wordlists")))
+
+@pytest.fixture(autouse=True)
+def isolated_blob_store(tmp_path, monkeypatch):
+    """Store raw tool output in a per-test blob store."""
+    monkeypatch.setattr(blob_store, "_default_store", blob_store.BlobStore(str(tmp_path / "blobs")))
+
+@pytest.fixture(autouse=True)
+def isolated_report_dir(tmp_path, monkeypatch):
+    """Write the reports of each test's scans to a per-test directory."""
+    monkeypatch.setattr(report_sink, "REPORT_DIR", str(tmp_path / "reports"))
+
+@pytest.fixture(autouse=True)
+def isolated_metrics_file(tmp_path, monkeypatch):
+    """Write the metrics file of each test's scans to a per-test path."""
+    monkeypatch.setattr(metrics, "METRICS_FILE", str(tmp_path / "metrics.prom"))
+
+@pytest.fixture(autouse=True)
+def isolated_runtime_history(tmp_path, monkeypatch):
+    """Record task runtimes in a per-test history file."""
+    monkeypatch.setattr(cost_model, "_default_history", cost_model.RuntimeHistory(str(tmp_path / "runtime_history.json")))
@@ -0,0 +1,36 @@
+import time
+from agent import agent_graph
+
+def test_follow_up_starts_before_nmap_finishes(monkeypatch):
+    """
+    A gobuster follow-up for a web service on any port must start as soon as
+    nmap prints the port, while nmap itself is still running.
+    """
+    timeline = {}
+
+    def fake_nmap(target, on_line=None, ports=None):
+        on_line('<?xml version="1.0"?>')
+        on_line("<nmaprun><host>")
+        on_line('<address addr="142.250.0.1" addrtype="ipv4"/>')
+        on_line('<ports><port protocol="tcp" portid="8080"><state state="open"/><service name="http-proxy"/></port>')
+        time.sleep(0.3)
+        timeline["nmap_done"] = time.monotonic()
+        return {"status": "success", "output": ""}
+
+    def fake_gobuster(target, on_line=None, wordlist=None):
+        if target == "http://google.com:8080":
+            timeline["follow_up_started"] = time.monotonic()
+        return {"status": "success", "output": ""}
+
+    def fake_tool(target, on_line=None, wordlist=None, urls=None):
+        return {"status": "success", "output": ""}
+
+    monkeypatch.setattr(agent_graph, "run_nmap", fake_nmap)
+    monkeypatch.setattr(agent_graph, "run_gobuster", fake_gobuster)
+    monkeypatch.setattr(agent_graph, "run_ffuf", fake_tool)
+    monkeypatch.setattr(agent_graph, "run_sqlmap", fake_tool)
+
+    results = agent_graph.run_agent("google.com", save_report=False)
+
+    assert set(results) == {"nmap", "gobuster", "ffuf", "sqlmap", "findings"}
+    assert timeline["follow_up_started"] < timeline["nmap_done"]
@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+import queue
+import pytest
+from agent import audit_log
+from agent.audit_log import configure_audit_log, shutdown_audit_log, log_context
+from agent.blob_store import get_blob_store
+from agent.metrics import registry
+from agent.scheduler import TaskScheduler
+
+@pytest.fixture
+def audit_path(tmp_path):
+    yield str(tmp_path / "logs" / "audit.log")
+    shutdown_audit_log()
+
+def read_records(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f]
+
+def test_records_are_json_with_context_and_long_messages_are_referenced(audit_path):
+    """Records are JSON lines carrying the log context, and long messages are moved to the blob store."""
+    configure_audit_log(audit_path)
+    with log_context(scan_id="scan-1"), log_context(task_id="nmap-1", tool="nmap"):
+        logging.info("Command succeeded: %s", "nmap -Pn google.com")
+        logging.info("x" * 5000, extra={"attempt": 2})
+    logging.warning("outside")
+    shutdown_audit_log()
+
+    first, long, outside = read_records(audit_path)
+    assert first["message"] == "Command succeeded: nmap -Pn google.com"
+    assert (first["scan_id"], first["task_id"], first["tool"]) == ("scan-1", "nmap-1", "nmap")
+    assert first["level"] == "INFO"
+    assert len(long["message"]) < 5000 and long["attempt"] == 2
+    assert get_blob_store().get(long["message_ref"]) == "x" * 5000
+    assert "scan_id" not in outside
+
+def test_log_rotates_by_size(audit_path):
+    """The audit log rotates by size and keeps only the configured number of backups."""
+    configure_audit_log(audit_path, max_bytes=2000, backups=2)
+    for i in range(100):
+        logging.info(f"record {i} " + "y" * 50)
+    shutdown_audit_log()
+
+    assert read_records(audit_path)[-1]["message"].startswith("record 99 ")
+    assert read_records(f"{audit_path}.1")
+    assert not os.path.exists(f"{audit_path}.3")
+
+def test_full_queue_drops_records_instead_of_blocking():
+    """A full queue drops records, counting them in the metrics, rather than blocking the logging thread."""
+    handler = audit_log._DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(logging.makeLogRecord({"msg": "kept", "levelname": "INFO"}))
+    handler.handle(logging.makeLogRecord({"msg": "dropped", "levelname": "INFO"}))
+    assert handler.queue.qsize() == 1
+    assert 'agent_log_records_dropped_total{level="INFO"}' in registry.render()
+
+def test_scheduler_tasks_inherit_the_log_context():
+    """Tasks run on scheduler threads log with the scan context of the caller."""
+    seen = []
+
+    def execute(task):
+        seen.append(audit_log._log_fields.get().get("scan_id"))
+        return {"status": "success"}
+
+    scheduler = TaskScheduler(execute, tool_limits={})
+    for i in range(3):
+        scheduler.add_task({"tool": "noop", "target": str(i)})
+    with log_context(scan_id="scan-2"):
+        scheduler.run()
+    assert seen == ["scan-2"] * 3
@@ -0,0 +1,74 @@
+from itertools import islice
+from agent import batch
+from agent.batch import expand_targets, iter_targets, run_batch
+from agent.report_sink import ReportReader
+
+def test_expand_targets_from_file_and_cidr(tmp_path):
+    """
+    Target files may mix domains, IPs and CIDR blocks; comments and duplicates are dropped.
+    """
+    target_file = tmp_path / "targets.txt"
+    target_file.write_text("google.com\n# staging hosts\n10.0.0.0/30\n\n10.0.0.1  # duplicate\n")
+
+    assert expand_targets(str(target_file)) == ["google.com", "10.0.0.1", "10.0.0.2"]
+    assert expand_targets("192.168.0.7/32") == ["192.168.0.7"]
+
+def test_run_batch_streams_combined_report(tmp_path, monkeypatch):
+    """
+    Every in-scope target is scanned once and its results land in the combined
+    report; out-of-scope targets are skipped.
+    """
+    scanned = []
+
+    def fake_run_agent(target, report_sink=None, **kwargs):
+        scanned.append(target)
+        report_sink.write(target, "nmap", {"status": "success", "output": target})
+        return {}
+
+    monkeypatch.setattr(batch, "run_agent", fake_run_agent)
+    report = tmp_path / "batch.ndjson"
+    summary = run_batch(["google.com", "10.0.0.0/30", "evil.example"], workers=2, report_filename=str(report))
+
+    reader = ReportReader(str(report))
+    assert sorted(scanned) == ["10.0.0.1", "10.0.0.2", "google.com"]
+    assert sorted(reader.targets()) == sorted(scanned)
+    assert reader.read("10.0.0.2", "nmap")[0]["result"]["output"] == "10.0.0.2"
+    assert summary["skipped"] == ["evil.example"]
+
+def test_cidr_blocks_are_expanded_lazily_without_duplicates():
+    """
+    A large block is expanded one address at a time, and addresses already
+    listed or covered by an earlier block are not yielded again.
+    """
+    targets = iter_targets(["10.0.0.5", "10.0.0.0/8", "10.0.0.0/30", "10.1.2.3", "google.com", "google.com"])
+    assert next(targets) == "10.0.0.5"
+    assert list(islice(targets, 5)) == ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4", "10.0.0.6"]
+    assert expand_targets(["10.0.0.0/30", "10.0.0.0/29", "10.0.0.2"]) == [
+        "10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4", "10.0.0.5", "10.0.0.6"]
+
+def test_run_batch_bounds_queued_targets_and_counts_errors_as_failed(tmp_path, monkeypatch):
+    """
+    Targets are pulled from the expansion only as workers free up, and a scan
+    that returns an error counts as failed rather than completed.
+    """
+    pulled = []
+
+    def fake_iter_targets(entries):
+        for i in range(20):
+            pulled.append(i)
+            yield f"10.0.0.{i + 1}"
+
+    def fake_run_agent(target, report_sink=None, **kwargs):
+        # At most 2 * workers targets are queued ahead of the one running
+        assert len(pulled) <= int(target.rsplit(".", 1)[1]) + 4
+        if target == "10.0.0.3":
+            return {"error": "Target is out of scope or no valid tasks were generated."}
+        return {}
+
+    monkeypatch.setattr(batch, "iter_targets", fake_iter_targets)
+    monkeypatch.setattr(batch, "run_agent", fake_run_agent)
+    summary = run_batch(["10.0.0.0/27"], workers=2, report_filename=str(tmp_path / "batch.ndjson"))
+
+    assert summary["failed"] == ["10.0.0.3"]
+    assert len(summary["completed"]) == 19
+    assert ReportReader(summary["report"]).read("10.0.0.3", "agent")[0]["result"]["status"] == "failed"
@@ -0,0 +1,20 @@
+import os
+from agent.agent_graph import run_agent
+from benchmarks.bench_agent import install_stubs, bench_targets
+
+def test_run_agent_against_stub_tools(tmp_path, monkeypatch):
+    """With the benchmark stubs on PATH a whole scan runs offline and yields findings from every tool."""
+    monkeypatch.setenv("PATH", f"{install_stubs(str(tmp_path / 'bin'))}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("STUB_SIZE", "5")
+
+    results = run_agent("10.0.0.5", save_report=False)
+
+    assert all(result["status"] == "success" for tool in ("nmap", "gobuster", "ffuf", "sqlmap") for result in results[tool])
+    assert {tool for finding in results["findings"] for tool in finding["tools"]} == {"nmap", "gobuster", "ffuf", "sqlmap"}
+    injectable = {finding["path"] for finding in results["findings"] if finding["kind"] == "injection"}
+    assert len(results["sqlmap"]) == 1 and len(injectable) > 1  # One bulk run over the endpoints discovered
+
+def test_bench_targets_are_distinct():
+    """The benchmark targets are distinct addresses, starting at 10.0.0.1."""
+    targets = bench_targets(1000)
+    assert len(set(targets)) == 1000 and targets[0] == "10.0.0.1"
@@ -0,0 +1,49 @@
+import os
+from agent import agent_graph
+from agent.blob_store import BlobStore, get_blob_store, load_output
+
+def test_blobs_are_content_addressed(tmp_path):
+    """Identical content is stored once and read back through its handle."""
+    store = BlobStore(str(tmp_path))
+    first = store.put("x" * 10000)
+    second = store.put(b"x" * 10000)
+
+    assert first == second and first["size"] == 10000
+    assert store.get(first) == "x" * 10000
+    assert len(list((tmp_path / first["sha256"][:2]).iterdir())) == 1
+    assert store.get({"sha256": "0" * 64, "size": 1}) is None
+
+def test_large_output_is_offloaded(monkeypatch):
+    """Results carry a small reference instead of large raw output, loaded on demand."""
+    big = "\n".join(f"line {i}" for i in range(5000))
+    monkeypatch.setattr(agent_graph, "run_sqlmap", lambda target, on_line=None, urls=None: {"status": "success", "output": big})
+    monkeypatch.setattr(agent_graph, "run_nmap", lambda target, on_line=None, ports=None: {"status": "success", "output": "short", "ports": []})
+
+    large = agent_graph.execute_task({"tool": "sqlmap", "target": "https://example.com"})
+    small = agent_graph.execute_task({"tool": "nmap", "target": "example.com"})
+
+    assert "output" not in large and large["output_ref"]["size"] == len(big)
+    assert load_output(large) == big
+    assert get_blob_store().exists(large["output_ref"])
+    assert small["output"] == "short" and "output_ref" not in small
+
+def test_least_recently_used_blobs_are_removed_past_the_size_bound(tmp_path):
+    """The store stays under max_bytes by removing the blobs read or written longest ago."""
+    store = BlobStore(str(tmp_path), max_bytes=25)
+    first, second = store.put("a" * 10), store.put("b" * 10)
+    assert store.get(first) == "a" * 10  # Read: now more recent than the second blob
+    third = store.put("c" * 10)
+
+    assert not store.exists(second)
+    assert store.exists(first) and store.exists(third)
+    assert BlobStore(str(tmp_path), max_bytes=25)._total == 20  # Reopened: sizes read from disk
+
+def test_cached_result_without_its_blob_is_a_miss(monkeypatch):
+    """A cached result whose raw output was removed from the blob store is run again."""
+    from agent.result_cache import get_cache
+    handle = get_blob_store().put("raw" * 2000)
+    get_cache().put("key", "sqlmap", {"status": "success", "output_ref": handle})
+    assert get_cache().get("key", "sqlmap") == {"status": "success", "output_ref": handle}
+
+    os.remove(get_blob_store()._path(handle["sha256"]))
+    assert get_cache().get("key", "sqlmap") is None
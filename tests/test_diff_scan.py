@@ -0,0 +1,119 @@
+import os
+import time
+from agent import agent_graph
+from agent.diff_scan import run_diff_scan, find_baseline, plan_rescan, changed_services
+from agent.findings import Finding
+from agent.report_sink import ReportSink
+
+def port(number, service, tunnel=""):
+    return {"host": "google.com", "port": number, "protocol": "tcp", "state": "open",
+            "service": service, "tunnel": tunnel, "product": ""}
+
+def port_finding(record):
+    return Finding("port", record["host"], record["port"], "", "open", "nmap",
+                   {"protocol": "tcp", "service": record["service"], "tunnel": record["tunnel"]}).to_dict()
+
+def path_finding(tool, url_port, path):
+    return Finding("path", "google.com", url_port, path, 200, tool).to_dict()
+
+def write_baseline(path):
+    with ReportSink(path) as sink:
+        nmap = {"status": "success", "findings": [port_finding(port(80, "http")), port_finding(port(443, "http", "ssl"))]}
+        sink.write("google.com", "nmap", nmap, scan_id="old", task_id="nmap-1", task_target="google.com")
+        for tool in ("gobuster", "ffuf"):
+            result = {"status": "success", "findings": [path_finding(tool, 443, "/admin")]}
+            sink.write("google.com", tool, result, scan_id="old", task_id=f"{tool}-1", task_target="https://google.com")
+        sink.write("google.com", "sqlmap", {"status": "success", "output": "", "findings": []},
+                   scan_id="old", task_id="sqlmap-1", task_target="https://google.com")
+        sink.write("google.com", "gobuster", {"status": "success", "findings": [path_finding("gobuster", 80, "/old")]},
+                   scan_id="old", task_id="gobuster:http://google.com", task_target="http://google.com")
+    return path
+
+def test_only_new_services_are_rescanned_and_the_delta_is_reported(tmp_path, monkeypatch):
+    """Only services new since the baseline are re-scanned; the rest is carried forward and the delta lists what changed."""
+    baseline = write_baseline(str(tmp_path / "scan_old.ndjson"))
+    ran = []
+
+    def fake_nmap(target, on_line=None, ports=None):
+        # Port 80 is gone, 443 is unchanged and 8080 is new
+        return {"status": "success", "output": "", "ports": [port(443, "http", "ssl"), port(8080, "http-proxy")]}
+
+    def fake_tool(tool):
+        def run(target, on_line=None, wordlist=None, urls=None):
+            ran.append((tool, target))
+            if tool == "gobuster":
+                on_line("/new                 (Status: 200) [Size: 10]")
+                return {"status": "success", "output": "/new                 (Status: 200) [Size: 10]"}
+            return {"status": "success", "output": ""}
+        return run
+
+    monkeypatch.setattr(agent_graph, "run_nmap", fake_nmap)
+    for tool in ("gobuster", "ffuf", "sqlmap"):
+        monkeypatch.setattr(agent_graph, f"run_{tool}", fake_tool(tool))
+
+    results = run_diff_scan("google.com", baseline=baseline, save_report=False)
+
+    assert ran == [("gobuster", "http://google.com:8080")]
+    delta = results["delta"]
+    assert delta["baseline_scan_id"] == "old"
+    assert delta["carried_forward"] == 3  # gobuster, ffuf and sqlmap on https://google.com
+    assert delta["services"]["added"] == [{"host": "google.com", "port": 8080}]
+    assert delta["services"]["removed"] == [{"host": "google.com", "port": 80}]
+    added = {(finding["port"], finding["path"]) for finding in delta["findings"]["added"]}
+    removed = {(finding["port"], finding["path"]) for finding in delta["findings"]["removed"]}
+    assert added == {(8080, ""), (8080, "/new")}
+    assert removed == {(80, ""), (80, "/old")}
+    assert all(result.get("carried_forward") for result in results["ffuf"])
+
+def test_without_a_baseline_every_web_tool_runs(tmp_path, monkeypatch):
+    """With no earlier report for the target, the diff scan runs every tool like a full scan."""
+    ran = []
+    monkeypatch.setattr(agent_graph, "run_nmap", lambda target, on_line=None, ports=None: {"status": "success", "output": "", "ports": []})
+    for tool in ("gobuster", "ffuf", "sqlmap"):
+        monkeypatch.setattr(agent_graph, f"run_{tool}", lambda target, on_line=None, wordlist=None, urls=None, tool=tool: ran.append(tool) or {"status": "success", "output": ""})
+    monkeypatch.chdir(tmp_path)
+
+    results = run_diff_scan("google.com", save_report=False)
+
+    assert sorted(ran) == ["ffuf", "gobuster", "sqlmap"]
+    assert results["baseline"] is None
+    assert results["delta"]["carried_forward"] == 0
+
+def test_find_baseline_picks_the_latest_report_for_the_target(tmp_path):
+    """The baseline is the most recent report, scan or batch, that covers the target."""
+    older = write_baseline(str(tmp_path / "scan_1.ndjson"))
+    newer = write_baseline(str(tmp_path / "batch_2.ndjson"))
+    os.utime(older, (time.time() - 60, time.time() - 60))
+    with ReportSink(str(tmp_path / "scan_3.ndjson")) as sink:
+        sink.write("yahoo.com", "nmap", {"status": "success"})
+
+    assert find_baseline("google.com", directory=str(tmp_path)) == newer
+    assert find_baseline("example.org", directory=str(tmp_path)) is None
+
+def test_rerun_sqlmap_tests_the_endpoints_of_the_rescan(tmp_path, monkeypatch):
+    """A re-run sqlmap goes last and tests the endpoints discovered, in one batch."""
+    tested = []
+    monkeypatch.setattr(agent_graph, "run_nmap", lambda target, on_line=None, ports=None: {"status": "success", "output": "", "ports": []})
+    monkeypatch.setattr(agent_graph, "run_gobuster", lambda target, on_line=None, wordlist=None, urls=None:
+                        {"status": "success", "output": "/admin (Status: 200)"})
+    monkeypatch.setattr(agent_graph, "run_ffuf", lambda target, on_line=None, wordlist=None, urls=None: {"status": "success", "output": ""})
+    monkeypatch.setattr(agent_graph, "run_sqlmap", lambda target, on_line=None, urls=None: tested.append(urls) or {"status": "success", "output": ""})
+    monkeypatch.chdir(tmp_path)
+
+    results = run_diff_scan("google.com", save_report=False)
+
+    assert tested == [["https://google.com", "https://google.com/admin"]]
+    assert "sqlmap:https://google.com" in results["delta"]["rerun"]
+
+def test_a_changed_service_only_reruns_the_tasks_of_its_own_host():
+    """A service change on one host of a range leaves the same port on the other hosts carried forward."""
+    delta = {"added": [], "changed": [("10.0.0.1", 80)], "removed": []}
+    changed = changed_services(delta, "10.0.0.0/30")
+    tasks = [{"id": f"gobuster:http://{host}", "tool": "gobuster", "target": f"http://{host}"} for host in ("10.0.0.1", "10.0.0.2")]
+    previous = [{"tool": "gobuster", "task_target": task["target"], "result": {"status": "success"}} for task in tasks]
+
+    run, carried = plan_rescan(tasks, changed, previous)
+
+    assert [task["target"] for task in run] == ["http://10.0.0.1"]
+    assert [record["task_target"] for record in carried] == ["http://10.0.0.2"]
+    assert changed_services({"added": [("142.250.0.1", 8080)], "changed": []}, "Google.com") == {("google.com", 8080)}
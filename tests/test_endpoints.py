@@ -0,0 +1,58 @@
+from agent import agent_graph
+from agent.endpoints import EndpointSet, endpoint_signature, batch_sqlmap_tasks
+from agent.task_executor import sqlmap_command
+
+def test_endpoints_are_deduplicated_by_path_and_parameter_names():
+    """Endpoints are deduplicated by path and parameter names and listed seed first, then those with parameters."""
+    assert endpoint_signature("https://Example.com:443/item.php?id=1") == endpoint_signature("https://example.com/item.php?id=2")
+    assert endpoint_signature("http://example.com/a//b/") == ("http", "example.com", 80, "/a/b", ())
+    assert endpoint_signature("https://example.com/item.php?id=1&sort=a") != endpoint_signature("https://example.com/item.php?id=1")
+
+    endpoints = EndpointSet()
+    endpoints.update(["https://example.com/about", "https://example.com/item.php?id=1",
+                      "https://example.com/item.php?id=2", "https://example.com/", "https://example.com/search?q=x"])
+    assert len(endpoints) == 4
+    assert endpoints.urls(seed="https://example.com") == [
+        "https://example.com", "https://example.com/item.php?id=1", "https://example.com/search?q=x",
+        "https://example.com/about"]
+    assert endpoints.urls(seed="https://example.com", limit=2) == ["https://example.com", "https://example.com/item.php?id=1"]
+
+def test_endpoints_are_batched_into_bulk_sqlmap_runs():
+    """Discovered endpoints are split into numbered sqlmap batches that each run over a bulk file."""
+    task = {"tool": "sqlmap", "target": "https://example.com"}
+    urls = [f"https://example.com/page{i}.php?id=1" for i in range(5)]
+
+    batches = batch_sqlmap_tasks(task, urls, batch_size=2)
+    assert [batch["id"] for batch in batches] == [f"sqlmap:https://example.com#{i}/3" for i in (1, 2, 3)]
+    assert [len(batch["urls"]) for batch in batches] == [2, 2, 1]
+    assert batch_sqlmap_tasks(task, ["https://example.com"]) == [task]  # Nothing discovered: the plain run
+    assert sqlmap_command("https://example.com", 4, bulk_file="urls.txt").startswith("sqlmap -m urls.txt --forms --batch")
+
+def test_sqlmap_runs_once_over_the_endpoints_discovery_found(monkeypatch):
+    """After discovery, sqlmap runs once over the testable endpoints found, and its findings point to their pages."""
+    calls = []
+
+    def fake_gobuster(target, on_line=None, wordlist=None):
+        return {"status": "success", "output": "/item.php (Status: 200)\n/private (Status: 403)"}
+
+    def fake_ffuf(target, on_line=None, wordlist=None):
+        hits = [{"url": f"https://google.com/{path}", "status": 200}
+                for path in ("item.php?id=1", "item.php?id=2", "search?q=a")]
+        return {"status": "success", "output": "", "hits": hits}
+
+    def fake_sqlmap(target, on_line=None, urls=None):
+        calls.append((target, urls))
+        return {"status": "success", "output": "GET https://google.com/item.php?id=1\nParameter: id (GET)"}
+
+    monkeypatch.setattr(agent_graph, "run_nmap", lambda target, on_line=None, ports=None: {"status": "success", "output": "", "ports": []})
+    monkeypatch.setattr(agent_graph, "run_gobuster", fake_gobuster)
+    monkeypatch.setattr(agent_graph, "run_ffuf", fake_ffuf)
+    monkeypatch.setattr(agent_graph, "run_sqlmap", fake_sqlmap)
+
+    results = agent_graph.run_agent("google.com", save_report=False)
+
+    assert calls == [("https://google.com", ["https://google.com", "https://google.com/item.php?id=1",
+                                             "https://google.com/search?q=a", "https://google.com/item.php"])]
+    assert len(results["sqlmap"]) == 1
+    injections = [finding for finding in results["findings"] if finding["kind"] == "injection"]
+    assert [(finding["path"], finding["detail"]["parameters"]) for finding in injections] == [("/item.php", ["id (GET)"])]
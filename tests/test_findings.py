@@ -0,0 +1,53 @@
+from agent import agent_graph
+from agent.findings import Finding, FindingIndex, findings_from_result, compact_result
+
+def test_gobuster_and_ffuf_paths_are_merged():
+    """The same path reported by gobuster and ffuf becomes one finding listing both tools."""
+    gobuster = findings_from_result(
+        {"tool": "gobuster", "target": "https://example.com"},
+        {"status": "success", "output": "/admin                (Status: 301) [Size: 0]\n/login (Status: 200)\nProgress: 6 / 6"},
+    )
+    ffuf = findings_from_result(
+        {"tool": "ffuf", "target": "https://example.com"},
+        {"status": "success", "hits": [
+            {"url": "https://example.com/admin", "status": 301, "length": 0, "redirectlocation": "/admin/"},
+            {"url": "https://example.com:8443/admin", "status": 301},
+        ]},
+    )
+    index = FindingIndex(gobuster + ffuf)
+
+    assert [(f.host, f.port, f.path, f.status, f.tools) for f in index] == [
+        ("example.com", 443, "/admin", 301, ["gobuster", "ffuf"]),
+        ("example.com", 443, "/login", 200, ["gobuster"]),
+        ("example.com", 8443, "/admin", 301, ["ffuf"]),
+    ]
+    assert next(iter(index)).detail["redirectlocation"] == "/admin/"
+
+def test_findings_round_trip_and_compact_reports():
+    """Findings survive a dict round trip; reports keep them instead of the raw output."""
+    result = {"status": "success", "output": "table", "ports": [
+        {"host": "10.0.0.1", "port": 80, "protocol": "tcp", "state": "open", "service": "http", "tunnel": "", "product": ""},
+        {"host": "10.0.0.1", "port": 81, "protocol": "tcp", "state": "closed", "service": "http", "tunnel": "", "product": ""},
+    ]}
+    task = {"tool": "nmap", "target": "10.0.0.1"}
+    agent_graph.attach_findings(task, result)
+
+    assert len(result["findings"]) == 1  # Closed ports are not findings
+    restored = findings_from_result(task, result)
+    assert [finding.to_dict() for finding in restored] == result["findings"]
+    assert compact_result("nmap", result) == {"status": "success", "findings": result["findings"]}
+    assert compact_result("sqlmap", {"status": "success", "output": "raw", "findings": []})["output"] == "raw"
+
+def test_run_agent_keeps_every_task_and_dedups_findings(monkeypatch):
+    """Results of several tasks for one tool are all kept, and their findings merged."""
+    monkeypatch.setattr(agent_graph, "generate_tasks", lambda target: [
+        {"tool": "gobuster", "target": "https://example.com"},
+        {"tool": "gobuster", "target": "https://example.com", "wordlist": "common", "extensions": "php"},
+    ])
+    monkeypatch.setattr(agent_graph, "run_gobuster",
+                        lambda target, on_line=None, wordlist=None: {"status": "success", "output": "/admin (Status: 200)"})
+
+    results = agent_graph.run_agent("example.com", save_report=False)
+
+    assert len(results["gobuster"]) == 2
+    assert results["findings"] == [Finding("path", "example.com", 443, "/admin", 200, "gobuster").to_dict()]
@@ -0,0 +1,221 @@
+import asyncio
+import sys
+import threading
+import time
+import pytest
+from agent import agent_graph
+from agent.process import CommandCancelled
+from agent.task_executor import stream_command
+from agent.job_service import JobService, task_body
+from agent.job_client import JobServiceClient, JobServiceError
+
+def fake_nmap_factory(calls, release=None):
+    def fake_nmap(target, on_line=None, ports=None):
+        calls.append(target)
+        on_line("Starting Nmap")
+        if release is not None:
+            release.wait(5)
+        return {"status": "success", "output": "", "ports": []}
+    return fake_nmap
+
+async def wait_all(service, jobs):
+    for job in jobs:
+        await service.wait(job, 5)
+        assert job.done()
+
+def test_identical_requests_share_one_run(monkeypatch):
+    """A request for a tool run already in flight joins it instead of starting a second run."""
+    calls = []
+    release = threading.Event()
+    monkeypatch.setattr(agent_graph, "run_nmap", fake_nmap_factory(calls, release))
+
+    async def scenario():
+        service = JobService(workers=2)
+        await service.start()
+        first = service.submit({"tool": "nmap", "target": "google.com"})
+        await asyncio.sleep(0.05)
+        # Same tool and (normalized) target while the first run is in flight
+        second = service.submit({"tool": "nmap", "target": "Google.com", "priority": 1})
+        await asyncio.sleep(0.05)
+        release.set()
+        await wait_all(service, [first, second])
+        await service.stop()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert calls == ["google.com"]
+    assert not first.shared and second.shared
+    assert first.status == second.status == "completed"
+    assert second.result["status"] == "success"
+    assert first.result is not second.result  # Each job gets its own copy
+    assert list(first.lines) == ["Starting Nmap"]
+
+def test_concurrent_scans_of_one_target_share_tool_runs(monkeypatch):
+    """Two full scans of the same target run each tool once between them."""
+    calls = []
+    release = threading.Event()
+    monkeypatch.setattr(agent_graph, "run_nmap", fake_nmap_factory(calls, release))
+
+    def fake_tool(target, on_line=None, wordlist=None, urls=None):
+        calls.append(target)
+        return {"status": "success", "output": ""}
+
+    for name in ("run_gobuster", "run_ffuf", "run_sqlmap"):
+        monkeypatch.setattr(agent_graph, name, fake_tool)
+
+    async def scenario():
+        service = JobService(workers=4)
+        await service.start()
+        first = service.submit({"scan": "google.com"})
+        await asyncio.sleep(0.1)
+        second = service.submit({"scan": "google.com"})
+        await asyncio.sleep(0.1)
+        release.set()
+        await wait_all(service, [first, second])
+        await service.stop()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert calls.count("google.com") == 1  # One nmap run for both scans
+    assert first.status == second.status == "completed"
+    assert second.shared
+    assert first.result["nmap"][0]["status"] == second.result["nmap"][0]["status"] == "success"
+
+def test_higher_priority_runs_first_and_queued_cancel_is_dropped(monkeypatch):
+    """Queued jobs run in priority order, and a job cancelled while queued never runs."""
+    calls = []
+    release = threading.Event()
+    monkeypatch.setattr(agent_graph, "run_nmap", fake_nmap_factory(calls, release))
+
+    async def scenario():
+        service = JobService(workers=1)
+        await service.start()
+        blocker = service.submit({"tool": "nmap", "target": "google.com"})
+        await asyncio.sleep(0.05)  # Occupy the only worker
+        low = service.submit({"tool": "nmap", "target": "yahoo.com", "priority": 20})
+        dropped = service.submit({"tool": "nmap", "target": "mail.google.com", "priority": 20})
+        high = service.submit({"tool": "nmap", "target": "www.google.com", "priority": 1})
+        await asyncio.sleep(0.05)
+        service.cancel(dropped.job_id)
+        release.set()
+        await wait_all(service, [blocker, low, dropped, high])
+        await service.stop()
+        return dropped
+
+    dropped = asyncio.run(scenario())
+    assert calls == ["google.com", "www.google.com", "yahoo.com"]
+    assert dropped.status == "cancelled"
+
+def test_rejects_out_of_scope_and_unknown_tools():
+    """Out-of-scope targets and unknown tools are refused when submitted."""
+    async def scenario():
+        service = JobService(workers=1)
+        await service.start()
+        try:
+            with pytest.raises(ValueError):
+                service.submit({"tool": "nmap", "target": "evil.example"})
+            with pytest.raises(ValueError):
+                service.submit({"tool": "nikto", "target": "google.com"})
+        finally:
+            await service.stop()
+
+    asyncio.run(scenario())
+
+def test_client_over_unix_socket(tmp_path, monkeypatch):
+    """The client submits, waits for and looks up jobs over a Unix socket, and gets service errors as JobServiceError."""
+    monkeypatch.setattr(agent_graph, "run_nmap", fake_nmap_factory([]))
+    socket_path = tmp_path / "service.sock"
+    loop = asyncio.new_event_loop()
+    service = JobService(workers=1)
+    ready = threading.Event()
+    stopped = asyncio.Event()
+
+    async def run():
+        await service.start()
+        server = await service.listen(f"unix://{socket_path}")
+        ready.set()
+        async with server:
+            await stopped.wait()
+        await service.stop()
+
+    thread = threading.Thread(target=lambda: loop.run_until_complete(run()), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    try:
+        client = JobServiceClient(f"unix://{socket_path}")
+        assert client.health()["status"] == "ok"
+        job = client.submit_task("nmap", "google.com")
+        finished = client.wait(job["job_id"], timeout=5)
+        assert finished["status"] == "completed"
+        assert finished["result"]["status"] == "success"
+        with pytest.raises(JobServiceError):
+            client.submit_task("nmap", "evil.example")
+        with pytest.raises(JobServiceError):
+            client.status("missing")
+    finally:
+        loop.call_soon_threadsafe(stopped.set)
+        thread.join(5)
+        loop.close()
+
+def test_cancelling_a_running_task_kills_its_tool(monkeypatch):
+    """Cancelling a running job kills its tool process within a couple of seconds."""
+    outcome = []
+
+    def slow_nmap(target, on_line=None, ports=None):
+        try:
+            stream_command(f'"{sys.executable}" -c "import time; print(1, flush=True); time.sleep(30)"', on_line=on_line)
+        except CommandCancelled:
+            outcome.append(time.monotonic())
+        return {"status": "failed", "error": "cancelled"}
+
+    monkeypatch.setattr(agent_graph, "run_nmap", slow_nmap)
+
+    async def scenario():
+        service = JobService(workers=1)
+        await service.start()
+        job = service.submit({"tool": "nmap", "target": "google.com"})
+        while not job.lines:
+            await asyncio.sleep(0.05)  # The tool is running
+        cancelled_at = time.monotonic()
+        service.cancel(job.job_id)
+        while not outcome and time.monotonic() - cancelled_at < 5:
+            await asyncio.sleep(0.05)
+        await service.stop()
+        return job, cancelled_at
+
+    job, cancelled_at = asyncio.run(scenario())
+    assert job.status == "cancelled"
+    assert outcome and outcome[0] - cancelled_at < 2
+
+@pytest.mark.parametrize("request_body", [
+    {"tool": "nmap", "target": "https://google.com/ -oN /tmp/pwn"},
+    {"tool": "nmap", "target": "-iL/etc/passwd"},
+    {"scan": "google.com --script vuln"},
+    {"tool": "nmap", "target": "google.com", "ports": "80 --script http-brute"},
+    {"tool": "nmap", "target": "google.com", "ports": "0-70000"},
+    {"tool": "nmap", "target": "google.com", "script": "vuln"},
+    {"tool": "sqlmap", "target": "https://google.com", "urls": ["https://evil.example/item.php?id=1"]},
+    {"tool": "sqlmap", "target": "https://google.com", "ports": "80"},
+    {"tool": "gobuster", "target": "https://google.com", "wordlist": "../../etc/passwd"},
+    {"tool": "gobuster", "target": "https://google.com", "shard": 2, "shards": 2},
+])
+def test_rejects_tool_arguments_smuggled_into_requests(request_body):
+    """Targets, options and their values that could add tool arguments or leave the scope are refused."""
+    async def scenario():
+        service = JobService(workers=1)
+        await service.start()
+        try:
+            with pytest.raises(ValueError):
+                service.submit(request_body)
+        finally:
+            await service.stop()
+
+    asyncio.run(scenario())
+
+def test_accepts_the_options_each_tool_takes():
+    """Valid port lists, in-scope sqlmap URLs and registered wordlists pass into the task unchanged."""
+    assert task_body({"tool": "nmap", "target": "google.com", "ports": "22,80-90", "priority": 1}) == \
+        {"tool": "nmap", "target": "google.com", "ports": "22,80-90"}
+    assert task_body({"tool": "sqlmap", "target": "https://google.com", "urls": ["https://google.com/a?id=1"]})["urls"] == \
+        ["https://google.com/a?id=1"]
+    assert task_body({"tool": "ffuf", "target": "https://google.com", "wordlist": "common", "shard": 1, "shards": 2})["shard"] == 1
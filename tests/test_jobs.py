@@ -0,0 +1,48 @@
+import threading
+import time
+from agent import agent_graph
+from agent.jobs import JobManager, LIVE_LINES
+
+def wait_for(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not job.done() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.done()
+
+def test_job_runs_in_background_and_reports_progress(monkeypatch):
+    """submit() returns at once; the job exposes live output while running and results when done."""
+    release = threading.Event()
+
+    def fake_gobuster(target, on_line=None, wordlist=None):
+        for i in range(LIVE_LINES + 5):
+            on_line(f"/path{i}                (Status: 200) [Size: 10]")
+        release.wait(5)
+        return {"status": "success", "output": "/path0 (Status: 200)"}
+
+    monkeypatch.setattr(agent_graph, "run_gobuster", fake_gobuster)
+
+    manager = JobManager(max_jobs=1)
+    job_id = manager.submit([{"tool": "gobuster", "target": "https://example.com"}])
+    job = manager.get(job_id)
+
+    deadline = time.monotonic() + 5
+    while len(job.snapshot()["tasks"]["gobuster-0"]["lines"]) < LIVE_LINES and time.monotonic() < deadline:
+        time.sleep(0.01)
+    snapshot = job.snapshot()
+    assert snapshot["status"] == "running"
+    assert snapshot["done"] == 0 and snapshot["total"] == 1
+    assert snapshot["tasks"]["gobuster-0"]["state"] == "running"
+    assert snapshot["tasks"]["gobuster-0"]["lines"][-1].startswith(f"/path{LIVE_LINES + 4}")
+    assert len(snapshot["tasks"]["gobuster-0"]["lines"]) == LIVE_LINES
+
+    release.set()
+    wait_for(job)
+    snapshot = job.snapshot()
+    assert snapshot["status"] == "completed"
+    assert snapshot["done"] == 1
+    assert snapshot["results"]["gobuster-0"]["status"] == "success"
+    assert snapshot["tasks"]["gobuster-0"]["state"] == "success"
+
+def test_unknown_job_is_none():
+    """Looking up a job id the manager never issued returns None."""
+    assert JobManager(max_jobs=1).get("missing") is None
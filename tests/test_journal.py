@@ -0,0 +1,48 @@
+from agent import agent_graph
+from agent.journal import ScanJournal
+
+def test_resume_runs_only_unfinished_tasks(monkeypatch):
+    """
+    Resuming an interrupted scan restores completed results from the journal
+    and only runs the tasks that never completed.
+    """
+    journal = ScanJournal("interrupted")
+    journal.append("scan", target="google.com")
+    for tool, target in [("nmap", "google.com"), ("gobuster", "https://google.com"),
+                         ("ffuf", "https://google.com"), ("sqlmap", "https://google.com")]:
+        journal.append("enqueue", task={"id": f"{tool}-x", "tool": tool, "target": target}, depends_on=[])
+    journal.append("complete", task_id="nmap-x", result={"status": "success", "output": "done", "ports": []})
+    journal.append("complete", task_id="gobuster-x", result={"status": "success", "output": "/admin"})
+    journal.append("start", task_id="sqlmap-x")
+    with open(journal.path, "a") as f:
+        f.write('{"event": "complete", "task_id": "sqlm')  # Crashed mid-write
+
+    ran = []
+
+    def fake_tool(target, on_line=None):
+        return {"status": "success", "output": "fresh"}
+
+    for name in ["run_nmap", "run_gobuster", "run_ffuf", "run_sqlmap"]:
+        monkeypatch.setattr(agent_graph, name, lambda target, on_line=None, wordlist=None, ports=None, urls=None, name=name: ran.append(name) or fake_tool(target))
+
+    results = agent_graph.run_agent(None, save_report=False, scan_id="interrupted", resume=True)
+
+    assert sorted(ran) == ["run_ffuf", "run_sqlmap"]
+    assert results["gobuster"][0]["output"] == "/admin"
+    assert results["sqlmap"][0]["output"] == "fresh"
+
+    # The resumed run is journaled as well, so the scan is now fully completed
+    state = journal.load()
+    assert set(state["completed"]) == {"nmap-x", "gobuster-x", "ffuf-x", "sqlmap-x"}
+
+def test_append_after_crash_keeps_new_events_intact():
+    """A write after a torn last line starts on a fresh line instead of being merged into it."""
+    journal = ScanJournal("torn")
+    journal.append("scan", target="google.com")
+    with open(journal.path, "a") as f:
+        f.write('{"event": "enqu')
+
+    resumed = ScanJournal("torn")
+    resumed.append("complete", task_id="nmap-1", result={"status": "success"})
+
+    assert [event["event"] for event in resumed.events()] == ["scan", "complete"]
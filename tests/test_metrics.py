@@ -0,0 +1,59 @@
+import sys
+import time
+from agent import agent_graph, metrics
+from agent.metrics import MetricsRegistry, TaskSpan, task_span, timed, timing_summary
+from agent.report_sink import ReportReader, ReportSink
+from agent.task_executor import run_command
+
+def test_run_command_records_attempts_and_output_in_span(monkeypatch):
+    """Retries, subprocess time and output bytes end up in the open task span."""
+    monkeypatch.setattr("agent.task_executor.backoff_delay", lambda attempt: 0.01)
+    with task_span("nmap", "example.com") as span:
+        run_command(f'"{sys.executable}" -c "print(\'hello\'); raise SystemExit(1)"', retries=3)
+
+    assert span.attempts == 3
+    assert span.output_bytes == len("hello\n") * 3
+    assert span.subprocess > 0 and span.backoff > 0
+
+def test_openmetrics_rendering():
+    """Counters get a _total suffix, histograms cumulative buckets, and the text ends with # EOF."""
+    registry = MetricsRegistry()
+    span = TaskSpan("ffuf", "https://example.com")
+    span.total, span.subprocess, span.attempts, span.status = 0.2, 0.15, 2, "success"
+    registry.record_span(span)
+    text = registry.render()
+
+    assert 'agent_tasks_total{status="success",tool="ffuf"} 1' in text
+    assert 'agent_command_retries_total{tool="ffuf"} 1' in text
+    assert 'agent_subprocess_duration_seconds_bucket{tool="ffuf",le="0.1"} 0' in text
+    assert 'agent_subprocess_duration_seconds_bucket{tool="ffuf",le="0.5"} 1' in text
+    assert 'agent_subprocess_duration_seconds_count{tool="ffuf"} 1' in text
+    assert text.endswith("# EOF\n")
+
+def test_scan_report_contains_timing_summary(tmp_path, monkeypatch):
+    """Every task result carries its timing, and the report ends with a per-scan summary."""
+    monkeypatch.setattr(agent_graph, "generate_tasks", lambda target: [{"tool": "nmap", "target": target}])
+    monkeypatch.setattr(agent_graph, "run_nmap", lambda target, on_line=None, ports=None: {"status": "success", "output": "", "ports": []})
+    path = str(tmp_path / "scan.ndjson")
+
+    with ReportSink(path) as sink:
+        results = agent_graph.run_agent("example.com", report_sink=sink)
+
+    assert "queue_wait" in results["nmap"][0]["timing"]
+    summary = ReportReader(path).read("example.com", "timing")[0]["result"]["summary"]
+    assert summary["tasks"] == 1 and summary["slowest_tasks"][0]["tool"] == "nmap"
+    with open(metrics.METRICS_FILE) as f:
+        assert 'agent_tasks_total{status="success",tool="nmap"}' in f.read()
+
+def test_parse_time_inside_the_subprocess_is_not_counted_twice():
+    """Lines parsed while the tool runs count as parse time only, so the slowest stage is the real one."""
+    with task_span("ffuf", "https://example.com") as span:
+        with timed("subprocess"):
+            time.sleep(0.02)
+            with timed("parse"):
+                time.sleep(0.1)
+
+    assert span.parse >= 0.1
+    assert span.subprocess < 0.08
+    assert span.subprocess + span.parse <= span.total
+    assert timing_summary([("ffuf:1", "ffuf", span.to_dict())])["slowest_stage"] == "parse"
@@ -0,0 +1,87 @@
+import threading
+from agent import agent_graph
+from agent import task_manager
+from agent.task_manager import split_port_spec, split_hosts, shard_nmap_task, parse_port_spec
+from agent.task_executor import merge_nmap_results, nmap_command
+
+def port(host, number, service="http"):
+    return {"host": host, "port": number, "protocol": "tcp", "state": "open",
+            "service": service, "tunnel": "", "product": ""}
+
+def test_port_shards_cover_every_port_once():
+    """Port shards are contiguous ranges that together cover every port of the spec exactly once."""
+    specs = split_port_spec("22,80-90,443,8000-8010", 3)
+    assert len(specs) == 3
+    covered = [number for spec in specs for number in parse_port_spec(spec)]
+    assert covered == parse_port_spec("22,80-90,443,8000-8010")
+    assert split_port_spec("1-65535", 2) == ["1-32768", "32769-65535"]
+    assert split_port_spec("80,443", 4) == ["80", "443"]
+
+def test_networks_split_into_sub_networks():
+    """A CIDR target splits into at most the requested number of equal sub-networks; hostnames are not split."""
+    assert split_hosts("10.0.0.0/24", 4) == ["10.0.0.0/26", "10.0.0.64/26", "10.0.0.128/26", "10.0.0.192/26"]
+    assert split_hosts("10.0.0.0/24", 3) == ["10.0.0.0/25", "10.0.0.128/25"]
+    assert split_hosts("10.0.0.4/31", 8) == ["10.0.0.4/32", "10.0.0.5/32"]
+    assert split_hosts("google.com", 4) == ["google.com"]
+
+def test_nmap_task_shards_by_ports_and_hosts():
+    """An nmap task becomes one task per sub-network and port range, and an unsharded task is left unchanged."""
+    tasks = shard_nmap_task({"id": "nmap", "tool": "nmap", "target": "10.0.0.0/24"},
+                            port_shards=2, host_shards=2, ports="1-1000")
+    assert [(task["id"], task["target"], task["ports"]) for task in tasks] == [
+        ("nmap#1/4", "10.0.0.0/25", "1-500"),
+        ("nmap#2/4", "10.0.0.0/25", "501-1000"),
+        ("nmap#3/4", "10.0.0.128/25", "1-500"),
+        ("nmap#4/4", "10.0.0.128/25", "501-1000"),
+    ]
+    assert shard_nmap_task({"tool": "nmap", "target": "google.com"}, port_shards=1, host_shards=1, ports="") == \
+        [{"tool": "nmap", "target": "google.com"}]
+    assert nmap_command("google.com", "1-500") == "nmap -Pn -oX - -p 1-500 google.com"
+
+def test_shard_results_are_merged_and_deduplicated():
+    """Shard results merge into one nmap result with deduplicated ports and the errors of failed shards."""
+    merged = merge_nmap_results([
+        {"status": "success", "ports": [port("10.0.0.1", 443), port("10.0.0.1", 80)]},
+        {"status": "success", "ports": [port("10.0.0.1", 80)]},
+        {"status": "failed", "error": "Command timed out"},
+    ])
+    assert merged["status"] == "success"
+    assert [record["port"] for record in merged["ports"]] == [80, 443]
+    assert merged["shard_errors"] == ["Command timed out"]
+    assert merged["shards"] == 3
+    assert merge_nmap_results([{"status": "failed", "error": "boom"}])["status"] == "failed"
+
+def test_sharded_scan_runs_shards_in_parallel_and_reports_one_nmap_result(monkeypatch):
+    """The shards of a scan run at the same time, and the scan reports a single merged nmap result."""
+    monkeypatch.setattr(task_manager, "NMAP_PORT_SHARDS", 2)
+    monkeypatch.setattr(task_manager, "NMAP_PORTS", "1-10000")
+    running, seen = set(), []
+    both_running = threading.Event()
+    lock = threading.Lock()
+
+    def fake_nmap(target, on_line=None, ports=None):
+        with lock:
+            running.add(ports)
+            seen.append(ports)
+            if len(running) == 2:
+                both_running.set()
+        both_running.wait(2)
+        found = port("142.250.0.1", 8080, "http-proxy") if ports == "5001-10000" else port("142.250.0.1", 443)
+        return {"status": "success", "output": "", "ports": [found]}
+
+    def fake_tool(target, on_line=None, wordlist=None, urls=None):
+        return {"status": "success", "output": ""}
+
+    monkeypatch.setattr(agent_graph, "run_nmap", fake_nmap)
+    for name in ("run_gobuster", "run_ffuf", "run_sqlmap"):
+        monkeypatch.setattr(agent_graph, name, fake_tool)
+
+    results = agent_graph.run_agent("google.com", save_report=False, refresh=True)
+
+    assert both_running.is_set()
+    assert sorted(seen) == ["1-5000", "5001-10000"]
+    [nmap] = results["nmap"]
+    assert nmap["shards"] == 2
+    assert {record["port"] for record in nmap["ports"]} == {443, 8080}
+    assert any(finding["port"] == 8080 for finding in nmap["findings"])
+    assert len(results["gobuster"]) == 3  # The default scan plus a follow-up per web service of each shard
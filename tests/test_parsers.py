@@ -0,0 +1,62 @@
+import io
+from agent.parsers import get_parser, parse_nmap_xml, PortRecord
+
+NMAP_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<nmaprun scanner="nmap" args="nmap -Pn -oX - 10.0.0.0/30">
+<host><status state="up"/>
+<address addr="10.0.0.1" addrtype="ipv4"/>
+<ports><extraports state="filtered" count="997"/>
+<port protocol="tcp" portid="22"><state state="open"/><service name="ssh" method="table"/></port>
+<port protocol="tcp" portid="8080"><state state="open"/><service name="http-proxy" method="table"/></port>
+</ports></host>
+<host><status state="up"/>
+<address addr="10.0.0.2" addrtype="ipv4"/>
+<ports>
+<port protocol="tcp" portid="8443"><state state="open"/><service name="https-alt" method="table"/></port>
+<port protocol="tcp" portid="9000"><state state="closed"/><service name="http" tunnel="ssl" method="probed"/></port>
+</ports></host>
+</nmaprun>
+"""
+
+def test_parse_nmap_xml_multi_host():
+    """Every port of every host becomes a typed record carrying its host address."""
+    records = list(parse_nmap_xml(io.StringIO(NMAP_XML)))
+
+    assert [(r.host, r.port, r.state) for r in records] == [
+        ("10.0.0.1", 22, "open"),
+        ("10.0.0.1", 8080, "open"),
+        ("10.0.0.2", 8443, "open"),
+        ("10.0.0.2", 9000, "closed"),
+    ]
+    assert [r.is_web() for r in records] == [False, True, True, True]
+    assert records[2].url_scheme() == "https"
+    assert records[3].url_scheme() == "https"  # TLS tunnel detected by service probing
+
+def test_streaming_nmap_parser_matches_file_parser():
+    """Feeding the XML line by line yields the same records as the file parser."""
+    parser = get_parser("nmap")
+    events = [event for line in NMAP_XML.splitlines() for event in parser.feed(line)]
+
+    streamed = [PortRecord(**{f: e[f] for f in PortRecord._fields}) for e in events]
+    assert streamed == list(parse_nmap_xml(io.StringIO(NMAP_XML)))
+
+def test_gobuster_and_generic_parsers():
+    """Gobuster lines become path events; tools without a parser emit nothing."""
+    gobuster = get_parser("gobuster")
+    assert gobuster.feed("\x1b[2K/robots.txt           (Status: 301) [Size: 230]") == [
+        {"type": "path", "path": "/robots.txt", "status": 301}
+    ]
+    assert get_parser("sqlmap").feed("[INFO] testing connection") == []
+
+def test_ffuf_json_lines_become_compact_hits():
+    """Only result lines become hits, and only the compact fields are kept."""
+    parser = get_parser("ffuf")
+    line = ('{"input":{"FUZZ":"YWRtaW4="},"position":1,"status":301,"length":0,"words":1,"lines":1,'
+            '"content-type":"","redirectlocation":"/admin/","url":"https://example.com/admin","duration":1234}')
+
+    assert parser.feed(":: Progress: [10/100] :: Job [1/1]") == []
+    assert parser.feed("{not json") == []
+    assert parser.feed(line) == [{
+        "type": "hit", "url": "https://example.com/admin", "status": 301,
+        "length": 0, "words": 1, "lines": 1, "redirectlocation": "/admin/", "duration": 1234,
+    }]
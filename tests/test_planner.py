@@ -0,0 +1,95 @@
+from agent import agent_graph
+from agent.cost_model import RuntimeHistory, target_class, get_runtime_history
+from agent.planner import ScanPlanner
+from agent.wordlists import get_registry
+
+def test_history_keeps_moving_averages_per_target_and_class(tmp_path):
+    """Runtimes are kept as moving averages shared across processes, scaled by task size and falling back to the target class."""
+    path = str(tmp_path / "history.json")
+    history = RuntimeHistory(path, weight=0.5)
+    task = {"tool": "nmap", "target": "google.com", "ports": "1-100"}
+    history.record(task, 10.0)
+    history.flush()
+    other = RuntimeHistory(path, weight=0.5)  # Another process
+    other.record(task, 20.0)
+    other.flush()
+    history.record(task, 30.0)
+    history.flush()
+
+    assert history.stats(task) == {"runs": 3, "seconds": 22.5, "per_unit": 0.225}
+    assert history.estimate(dict(task, ports="1-200")) == 45.0  # Scales with the ports
+    assert history.estimate({"tool": "nmap", "target": "yahoo.com", "ports": "1-100"}) == 22.5  # Same class
+    assert history.estimate({"tool": "sqlmap", "target": "https://yahoo.com"}) == 600  # No history: the default
+    assert [target_class(t) for t in ("10.0.0.0/24", "10.0.0.1", "google.com", "https://google.com:8443")] == \
+        ["network", "ip", "domain", "https:domain"]
+
+def test_history_is_written_once_per_flush_interval(tmp_path):
+    """Recorded runs count at once but reach the file only when the flush interval passed or flush() is called."""
+    path = tmp_path / "history.json"
+    history = RuntimeHistory(str(path), flush_interval=3600)
+    task = {"tool": "nmap", "target": "google.com"}
+    for seconds in (10.0, 20.0, 30.0):
+        history.record(task, seconds)
+
+    assert history.stats(task)["runs"] == 3
+    assert not path.exists()
+    history.flush()
+    assert RuntimeHistory(str(path)).stats(task)["runs"] == 3
+
+    history.flush_interval = 0  # Due on every record
+    history.record(task, 40.0)
+    assert RuntimeHistory(str(path)).stats(task)["runs"] == 4
+
+def test_tasks_are_ordered_longest_critical_path_first(tmp_path):
+    """Tasks start longest critical path first, counting the follow-ups of nmap."""
+    history = RuntimeHistory(str(tmp_path / "history.json"))
+    history.record({"tool": "sqlmap", "target": "https://google.com"}, 5.0)
+    history.record({"tool": "ffuf", "target": "https://google.com"}, 50.0)
+    history.record({"tool": "nmap", "target": "google.com"}, 30.0)
+    history.record({"tool": "gobuster", "target": "https://google.com"}, 40.0)
+
+    tasks = [{"tool": tool, "target": "google.com" if tool == "nmap" else "https://google.com"}
+             for tool in ("nmap", "gobuster", "ffuf", "sqlmap")]
+    planned = ScanPlanner(history=history).plan(tasks)
+    assert [task["tool"] for task in planned] == ["nmap", "ffuf", "gobuster", "sqlmap"]  # nmap: 30s + its follow-ups
+
+def test_budget_trims_wordlists_and_skips_what_does_not_fit(tmp_path):
+    """Under a time budget, wordlists are trimmed to fit and tasks that cannot be trimmed are skipped."""
+    get_registry().register("common", [f"word{i}" for i in range(100)])
+    history = RuntimeHistory(str(tmp_path / "history.json"))
+    history.record({"tool": "gobuster", "target": "https://google.com"}, 100.0)  # 1s per entry
+    history.record({"tool": "sqlmap", "target": "https://google.com"}, 500.0)
+
+    planner = ScanPlanner(budget=60, history=history, max_workers=2, tool_limits={})
+    planned = planner.plan([{"tool": "gobuster", "target": "https://google.com"},
+                            {"tool": "sqlmap", "target": "https://google.com"}])
+
+    assert planned == [{"tool": "gobuster", "target": "https://google.com", "wordlist_limit": 60}]
+    summary = planner.summary()
+    assert summary["trimmed"][0]["kept"] == 60
+    assert [skipped["tool"] for skipped in summary["skipped"]] == ["sqlmap"]
+    assert planner.admit({"id": "sqlmap:https://google.com:8443", "tool": "sqlmap", "target": "https://google.com:8443"}) is None
+
+def test_time_budgeted_scan_reports_skipped_tasks_and_records_runtimes(monkeypatch):
+    """A time-budgeted scan reports what it trimmed and skipped and records the runtimes of what ran."""
+    get_registry().register("common", [f"word{i}" for i in range(100)])
+    history = get_runtime_history()
+    history.record({"tool": "sqlmap", "target": "https://google.com"}, 3600.0)
+    entries = []
+
+    def fake_wordlist_tool(target, on_line=None, wordlist=None):
+        with open(wordlist) as f:
+            entries.append(len(f.read().split()))
+        return {"status": "success", "output": ""}
+
+    monkeypatch.setattr(agent_graph, "run_nmap", lambda target, on_line=None, ports=None: {"status": "success", "output": "", "ports": []})
+    monkeypatch.setattr(agent_graph, "run_gobuster", fake_wordlist_tool)
+    monkeypatch.setattr(agent_graph, "run_ffuf", fake_wordlist_tool)
+    monkeypatch.setattr(agent_graph, "run_sqlmap", lambda target, on_line=None, urls=None: {"status": "success", "output": ""})
+
+    results = agent_graph.run_agent("google.com", save_report=False, time_budget=150)
+
+    assert "sqlmap" not in results
+    assert [skipped["tool"] for skipped in results["plan"]["skipped"]] == ["sqlmap"]
+    assert entries == [50, 50]  # 300s default estimate for the full list, 150s left
+    assert history.stats({"tool": "nmap", "target": "google.com"})["runs"] == 1
@@ -0,0 +1,76 @@
+from agent.rate_control import ConcurrencyController
+from agent.retry import TIMEOUT, BAD_ARGUMENTS
+from agent.task_executor import gobuster_command, ffuf_command
+from agent.wordlists import get_registry
+
+def make_controller():
+    return ConcurrencyController(tool_threads={"ffuf": (5, 40, 100)}, host_budget=100, latency_target=1.0, enabled=True,
+                                 shares=2)
+
+def test_aimd_adjusts_threads_per_host():
+    """Clean runs add threads, timeouts and slow responses halve them; other hosts are unaffected."""
+    controller = make_controller()
+
+    settings = controller.acquire("a.example", "ffuf")
+    assert (settings.threads, settings.rate) == (40, 50)
+    controller.release(settings)
+    assert controller.acquire("a.example", "ffuf").threads == 50
+
+    controller.release(controller.acquire("a.example", "ffuf"), TIMEOUT)
+    settings = controller.acquire("a.example", "ffuf")
+    assert settings.threads == 25 and settings.rate < 50
+    controller.release(settings, latency=3.0)
+    assert controller.acquire("a.example", "ffuf").threads == 12
+
+    controller.release(controller.acquire("b.example", "ffuf"), BAD_ARGUMENTS)  # Not the host's fault
+    assert controller.acquire("b.example", "ffuf").threads == 40
+
+def test_host_budget_is_shared_between_concurrent_tools():
+    """Invocations running against one host never get more than its requests-per-second budget together."""
+    controller = make_controller()
+    first = controller.acquire("a.example", "ffuf")
+    second = controller.acquire("a.example", "gobuster")
+    third = controller.acquire("a.example", "sqlmap")
+
+    assert (first.rate, second.rate) == (50, 50)
+    assert third.rate == 1.0  # Budget taken: the minimum rate until a share is returned
+    assert controller.acquire("b.example", "ffuf").rate == 50
+
+    controller.release(first)
+    controller.release(third)
+    assert controller.acquire("a.example", "ffuf").rate == 50  # A returned share; the second invocation still holds the other half
+
+def test_settings_reach_the_command_line():
+    """Thread counts and rates are passed to the tools."""
+    assert "-t 20 --delay 200ms" in gobuster_command("https://example.com", "list.txt", 20, 100)
+    assert "-t 40" in ffuf_command("https://example.com/", "list.txt", 40, 50.0) and "-rate 50" in ffuf_command("https://example.com/", "list.txt", 40, 50.0)
+    assert "-rate" not in ffuf_command("https://example.com/", "list.txt")
+
+def test_gobuster_and_sqlmap_report_latency(monkeypatch):
+    """Tools that print no response times still feed an observed latency back to the controller."""
+    from agent import task_executor
+    released = []
+    monkeypatch.setattr(task_executor.rate_controller, "release",
+                        lambda settings, failure=None, latency=None: released.append((settings.tool, latency)))
+    wordlist = get_registry().register("latency", ["a", "b", "c", "d"]).shard(0, 2)[0]
+    with open(wordlist, "a") as f:
+        f.write("not\ncounted\n")  # The count comes from the registry, not from reading the file
+    estimate_latency = task_executor.estimate_latency
+    counted = []
+    monkeypatch.setattr(task_executor, "estimate_latency",
+                        lambda elapsed, requests, *args: counted.append(requests) or estimate_latency(elapsed, requests, *args))
+
+    def fake_run_command(command, on_line=None, host=None, capture=True):
+        if command.startswith("sqlmap"):
+            on_line("[12:00:00] [CRITICAL] connection timed out to the target URL")
+        return {"status": "success", "output": ""}
+
+    monkeypatch.setattr(task_executor, "run_command", fake_run_command)
+    task_executor.run_gobuster("https://example.com", wordlist=wordlist)
+    task_executor.run_sqlmap("https://example.com")
+
+    assert released[0][0] == "gobuster" and released[0][1] >= 0
+    assert counted == [2]
+    assert released[1] == ("sqlmap", task_executor.SQLMAP_REQUEST_TIMEOUT)
+    assert estimate_latency(2.0, 4, 2) == 1.0
+    assert estimate_latency(2.0, 4, 2, rate=4) == 0.5  # Less the rate-limit delay
@@ -0,0 +1,27 @@
+import gzip
+import json
+import pytest
+from agent.report_sink import ReportSink, ReportReader
+
+@pytest.mark.parametrize("name", ["report.ndjson", "report.ndjson.gz"])
+def test_report_records_are_individually_addressable(tmp_path, name):
+    """
+    Each result is one record that can be read back through the side index,
+    and the whole file stays a valid (optionally gzip-compressed) NDJSON stream.
+    """
+    path = str(tmp_path / name)
+    with ReportSink(path) as sink:
+        sink.write("google.com", "nmap", {"status": "success", "output": "80/tcp open http"}, task_id="nmap-1")
+        sink.write("yahoo.com", "gobuster", {"status": "success", "output": "/admin"}, task_id="gobuster-2")
+        sink.write("google.com", "sqlmap", {"status": "failed", "error": "timeout"}, task_id="sqlmap-3")
+
+    reader = ReportReader(path)
+    assert reader.targets() == ["google.com", "yahoo.com"]
+    assert reader.tools("google.com") == ["nmap", "sqlmap"]
+    (record,) = reader.read("yahoo.com", "gobuster")
+    assert record["result"]["output"] == "/admin"
+    assert record["task_id"] == "gobuster-2"
+
+    opener = gzip.open if name.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        assert [json.loads(line)["tool"] for line in f] == ["nmap", "gobuster", "sqlmap"]
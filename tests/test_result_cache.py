@@ -0,0 +1,53 @@
+import os
+import time
+from agent.result_cache import ResultCache, make_key
+from agent import agent_graph
+
+def test_cache_ttl_and_lru_eviction(tmp_path):
+    """
+    Entries expire after their tool's TTL, and the least recently used entry is
+    evicted first once the cache exceeds its size bound.
+    """
+    cache = ResultCache(str(tmp_path), max_bytes=400, ttls={"nmap": 60, "sqlmap": 0})
+    result = {"status": "success", "output": "x" * 50}
+
+    cache.put("a", "nmap", result)
+    cache.put("b", "nmap", result)
+    assert cache.get("a", "nmap") == result  # "a" is now the most recently used entry
+    cache.put("c", "nmap", result)  # Pushes the cache over its bound
+
+    assert cache.get("b", "nmap") is None
+    assert cache.get("a", "nmap") == result
+    assert cache.get("c", "nmap") == result
+
+    cache.put("d", "sqlmap", result)  # TTL of 0 disables caching for the tool
+    assert cache.get("d", "sqlmap") is None
+
+    cache.ttls["nmap"] = -1  # Everything is now expired
+    assert cache.get("a", "nmap") is None
+    assert not os.path.exists(os.path.join(str(tmp_path), "a.json"))
+
+def test_cache_key_normalizes_target():
+    """Equivalent spellings of a target share a key; different arguments don't."""
+    assert make_key("gobuster", "HTTPS://Example.com/", "-t 50") == make_key("gobuster", "https://example.com", "-t 50")
+    assert make_key("gobuster", "https://example.com", "-t 50") != make_key("gobuster", "https://example.com", "-t 10")
+
+def test_execute_task_consults_cache(monkeypatch):
+    """A repeated task is served from the cache unless a refresh is requested."""
+    calls = []
+
+    def fake_nmap(target, on_line=None, ports=None):
+        calls.append(target)
+        return {"status": "success", "output": "80/tcp open http", "ports": []}
+
+    monkeypatch.setattr(agent_graph, "run_nmap", fake_nmap)
+    task = {"tool": "nmap", "target": "google.com"}
+
+    first = agent_graph.execute_task(task)
+    second = agent_graph.execute_task(task)
+    agent_graph.execute_task(dict(task, refresh=True))
+
+    assert len(calls) == 2
+    first.pop("timing")
+    assert second.pop("timing")["cached"] is True  # Each call is timed on its own
+    assert second == dict(first, cached=True)
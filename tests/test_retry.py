@@ -0,0 +1,57 @@
+import subprocess
+import sys
+from agent import task_executor
+from agent.retry import classify_failure, CircuitBreaker, MISSING_BINARY, BAD_ARGUMENTS, TRANSIENT_NETWORK, TIMEOUT
+
+def test_classify_failure():
+    """Failures are sorted into classes that decide whether a retry can help."""
+    assert classify_failure(127, "sh: 1: gobuster: not found") == MISSING_BINARY
+    assert classify_failure(1, "Error: error on parsing arguments: wordlist file \"/x\" does not exist: stat /x: no such file or directory") == BAD_ARGUMENTS
+    assert classify_failure(1, "dial tcp 10.0.0.1:443: connect: connection refused") == TRANSIENT_NETWORK
+    assert classify_failure(exception=subprocess.TimeoutExpired("nmap", 300)) == TIMEOUT
+
+def test_run_command_skips_retries_for_permanent_failures(monkeypatch):
+    """A missing binary fails after a single attempt instead of MAX_RETRIES."""
+    attempts = []
+    real_stream_command = task_executor.stream_command
+    monkeypatch.setattr(task_executor, "stream_command", lambda *a, **kw: attempts.append(1) or real_stream_command(*a, **kw))
+
+    result = task_executor.run_command("definitely-not-an-installed-tool --help", retries=5)
+
+    assert result["status"] == "failed"
+    assert result["failure"] == MISSING_BINARY
+    assert len(attempts) == 1
+
+def test_run_command_retries_transient_failures_with_backoff(monkeypatch, tmp_path):
+    """Network failures are retried, sleeping with backoff between attempts."""
+    sleeps = []
+    monkeypatch.setattr(task_executor.time, "sleep", sleeps.append)
+    monkeypatch.setattr(task_executor, "circuit_breaker", CircuitBreaker(threshold=100))
+    script = "import sys; sys.stderr.write('connection reset by peer'); sys.exit(1)"
+
+    result = task_executor.run_command(f'"{sys.executable}" -c "{script}"', retries=3, host="10.0.0.1")
+
+    assert result["failure"] == TRANSIENT_NETWORK
+    assert len(sleeps) == 2
+
+def test_circuit_breaker_opens_and_half_opens(monkeypatch):
+    """
+    Repeated host failures open the circuit for every tool; after the reset
+    period a single trial is allowed and a success closes the circuit again.
+    """
+    now = [0.0]
+    monkeypatch.setattr("agent.retry.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=2, reset_seconds=30)
+
+    breaker.record_failure("10.0.0.1", BAD_ARGUMENTS)  # Our fault, not the host's
+    breaker.record_failure("10.0.0.1", TIMEOUT)
+    assert breaker.allow("10.0.0.1")
+    breaker.record_failure("10.0.0.1", TRANSIENT_NETWORK)
+    assert not breaker.allow("10.0.0.1")
+    assert breaker.allow("10.0.0.2")
+
+    now[0] = 31.0
+    assert breaker.allow("10.0.0.1")  # Half-open trial
+    assert not breaker.allow("10.0.0.1")  # Only one trial at a time
+    breaker.record_success("10.0.0.1")
+    assert breaker.allow("10.0.0.1")
@@ -0,0 +1,79 @@
+import threading
+import time
+from agent.scheduler import TaskScheduler
+
+def sleepy_executor(delay, log=None):
+    """Build an executor that sleeps for `delay` seconds and records start/end order."""
+    def execute(task):
+        if log is not None:
+            log.append(("start", task["id"]))
+        time.sleep(delay)
+        if log is not None:
+            log.append(("end", task["id"]))
+        return {"status": "success", "output": task["tool"]}
+    return execute
+
+def test_independent_tasks_run_concurrently():
+    """
+    Independent tasks for different tools should overlap, so the total wall time
+    is close to the longest task rather than the sum of all tasks.
+    """
+    scheduler = TaskScheduler(sleepy_executor(0.2), max_workers=4)
+    for tool in ["nmap", "gobuster", "ffuf", "sqlmap"]:
+        scheduler.add_task({"tool": tool, "target": "example.com"})
+
+    start = time.monotonic()
+    results = scheduler.run()
+    elapsed = time.monotonic() - start
+
+    assert len(results) == 4
+    assert all(result["status"] == "success" for _, result in results)
+    assert elapsed < 0.6
+
+def test_dependencies_and_follow_ups():
+    """
+    A task only starts once its dependencies have finished, including follow-ups
+    that are queued from the completion callback.
+    """
+    log = []
+
+    def follow_up(task, result, scheduler):
+        if task["tool"] == "nmap":
+            scheduler.add_task({"tool": "gobuster", "target": "http://example.com"}, depends_on=[task["id"]])
+
+    scheduler = TaskScheduler(sleepy_executor(0.05, log), max_workers=4, on_complete=follow_up)
+    nmap_id = scheduler.add_task({"tool": "nmap", "target": "example.com"})
+    results = scheduler.run()
+
+    follow_up_id = results[1][0]["id"]
+    assert [task["tool"] for task, _ in results] == ["nmap", "gobuster"]
+    assert log.index(("end", nmap_id)) < log.index(("start", follow_up_id))
+
+def test_per_tool_limit_is_respected():
+    """No more tasks of one tool may run at once than its configured limit."""
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0}
+
+    def execute(task):
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        time.sleep(0.05)
+        with lock:
+            running["now"] -= 1
+        return {"status": "success"}
+
+    scheduler = TaskScheduler(execute, max_workers=8, tool_limits={"gobuster": 2})
+    for i in range(6):
+        scheduler.add_task({"tool": "gobuster", "target": f"https://host{i}.example.com"})
+    scheduler.run()
+
+    assert running["peak"] == 2
+
+def test_unresolvable_dependency_fails_task():
+    """A task waiting on an id that never finishes is reported as failed instead of hanging."""
+    scheduler = TaskScheduler(sleepy_executor(0), max_workers=2)
+    scheduler.add_task({"tool": "gobuster", "target": "example.com"}, depends_on=["missing"])
+    (_, result), = scheduler.run()
+
+    assert result["status"] == "failed"
@@ -0,0 +1,36 @@
+import config
+from agent.scope import ScopeIndex, get_scope_index, reload_scope_index
+from agent.task_manager import is_within_scope
+
+def test_scope_index_domains_and_networks():
+    """Domains match themselves and their subdomains; IPs match by CIDR membership."""
+    index = ScopeIndex(["Example.com", " corp.test "], ["192.168.0.0/24", "10.0.0.0/25", "10.0.0.128/25", "2001:db8::/32", ""])
+
+    assert index.contains("example.com")
+    assert index.contains("a.b.corp.test")
+    assert not index.contains("badexample.com")
+    assert not index.contains("com")
+    assert index.contains("192.168.0.5")
+    assert not index.contains("192.168.1.5")
+    assert index.contains("10.0.0.200")  # Adjacent blocks are merged into one interval
+    assert index.contains("2001:db8::1")
+    assert not index.contains("")
+
+def test_scope_index_is_rebuilt_when_config_changes(monkeypatch):
+    """The cached index follows changes to the configured allowlist."""
+    monkeypatch.setattr(config, "ALLOWED_DOMAINS", ["example.org"])
+    monkeypatch.setattr(config, "ALLOWED_IPS", ["172.16.0.0/12"])
+    first = get_scope_index()
+
+    assert get_scope_index() is first
+    assert is_within_scope("https://www.example.org:8443/login")
+    assert is_within_scope("172.20.1.1")
+
+    monkeypatch.setattr(config, "ALLOWED_IPS", ["10.0.0.0/8"])
+    assert get_scope_index() is not first
+    assert not is_within_scope("172.20.1.1")
+
+    config.ALLOWED_IPS.append("172.16.0.0/12")  # Changed in place: only picked up on reload
+    assert not is_within_scope("172.20.1.1")
+    reload_scope_index()
+    assert is_within_scope("172.20.1.1")
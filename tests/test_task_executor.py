@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from agent import task_executor, process
+from agent.task_executor import stream_command
+from agent.blob_store import get_blob_store
+from agent.retry import CANCELLED
+
+def test_stream_command_delivers_lines_before_exit():
+    """
+    Lines must reach the callback while the process is still running, not
+    only after it exits.
+    """
+    script = "import time; print('first', flush=True); time.sleep(0.5); print('second', flush=True)"
+    seen = []
+    start = time.monotonic()
+    result = stream_command(f'"{sys.executable}" -c "{script}"', on_line=lambda line: seen.append((line, time.monotonic() - start)))
+
+    assert result.returncode == 0
+    assert [line for line, _ in seen] == ["first", "second"]
+    assert seen[0][1] < 0.4  # The first line arrived before the sleep finished
+
+def test_run_ffuf_streams_hits_without_output_files(tmp_path, monkeypatch):
+    """
+    ffuf results are parsed from its JSON-lines stdout into hit records; no
+    output file is written to the working directory.
+    """
+    script = ("import json\n"
+              "for path in ['admin', 'login', 'admin']:\n"
+              "    print(json.dumps({'url': 'https://example.com/' + path, 'status': 200, 'length': 10, 'words': 2, 'lines': 1}))\n")
+    workdir = tmp_path / "run"
+    workdir.mkdir()
+    (workdir / "fake_ffuf.py").write_text(script)
+    monkeypatch.chdir(workdir)
+    monkeypatch.setattr(task_executor, "ffuf_command", lambda target, wordlist, threads, rate: f'"{sys.executable}" fake_ffuf.py')
+
+    lines = []
+    result = task_executor.run_ffuf("https://example.com", on_line=lines.append, wordlist="unused.txt")
+
+    assert result["status"] == "success"
+    assert [hit["url"] for hit in result["hits"]] == ["https://example.com/admin", "https://example.com/login"]
+    assert "https://example.com/login" in result["output"]
+    assert len(lines) == 3  # Live output still reaches the caller
+    assert sorted(path.name for path in workdir.iterdir()) == ["fake_ffuf.py"]
+
+def test_large_output_spills_to_the_blob_store(monkeypatch):
+    """Stdout past the memory bound goes to the blob store, and only the tail of stderr is kept."""
+    monkeypatch.setattr(process, "TOOL_OUTPUT_MEMORY_BYTES", 64 * 1024)
+    monkeypatch.setattr(task_executor, "TOOL_STDERR_MAX_BYTES", 100)
+    script = "import sys; [print('x' * 99) for _ in range(5000)]; sys.stderr.write('e' * 5000 + 'END')"
+    result = stream_command(f'"{sys.executable}" -c "{script}"')
+
+    assert result.stdout == ""
+    assert result.stdout_ref["size"] == 500000
+    assert get_blob_store().get(result.stdout_ref) == ("x" * 99 + "\n") * 5000
+    assert len(result.stderr) == 100 and result.stderr.endswith("END")
+
+def test_commands_run_without_a_shell():
+    """Arguments reach the tool as they are, with no shell to interpret separators or variables."""
+    result = stream_command(f'"{sys.executable}" -c "import sys; print(sys.argv[1:])" "a;b" "$HOME"')
+    assert result.stdout.strip() == "['a;b', '$HOME']"
+
+@pytest.mark.skipif(os.name != "posix", reason="resource limits are POSIX only")
+def test_resource_limits_are_applied_without_preexec_fn(monkeypatch):
+    """
+    CPU and memory limits are set by an exec shim, so Popen never gets a
+    preexec_fn, and the tool ends up with the limits under its own pid.
+    """
+    popen = subprocess.Popen
+    seen = {}
+
+    def checked_popen(args, **kwargs):
+        seen.update(kwargs)
+        return popen(args, **kwargs)
+
+    monkeypatch.setattr(process.subprocess, "Popen", checked_popen)
+    script = "import os, resource; print(os.getpid(), resource.getrlimit(resource.RLIMIT_CPU)[0], resource.getrlimit(resource.RLIMIT_AS)[0])"
+    child = process.spawn([sys.executable, "-c", script], cpu_seconds=30, memory_bytes=2 ** 33, stdout=subprocess.PIPE, text=True)
+    output, _ = child.communicate(timeout=10)
+
+    assert "preexec_fn" not in seen
+    assert output.split() == [str(child.pid), "30", str(2 ** 33)]
+    with pytest.raises(FileNotFoundError):
+        process.spawn(["no-such-tool-installed"], cpu_seconds=30)
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc to inspect processes")
+def test_timeout_kills_the_whole_process_tree(tmp_path):
+    """A timed-out command is killed together with the processes it started."""
+    pid_file = tmp_path / "child.pid"
+    script = ("import subprocess, sys, time; "
+              "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+              f"open(r'{pid_file}', 'w').write(str(child.pid)); time.sleep(30)")
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        stream_command(f'"{sys.executable}" -c "{script}"', timeout=1)
+    assert time.monotonic() - start < 5
+
+    def alive(pid):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                return f.read().split(")")[-1].split()[0] != "Z"  # Zombies are dead, just not yet reaped
+        except FileNotFoundError:
+            return False
+
+    child = int(pid_file.read_text())
+    deadline = time.monotonic() + 2
+    while alive(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(child)
+
+def test_cancelled_command_is_killed_and_not_retried():
+    """A cancelled command is killed at once and reported as cancelled rather than retried."""
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    start = time.monotonic()
+    with process.cancel_scope(cancel):
+        result = task_executor.run_command(f'"{sys.executable}" -c "import time; time.sleep(30)"', retries=3)
+
+    assert result["failure"] == CANCELLED
+    assert time.monotonic() - start < 5
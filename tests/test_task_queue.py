@@ -0,0 +1,118 @@
+import threading
+import time
+import pytest
+from agent import agent_graph
+from agent.task_queue import TaskQueue, submit_scan, run_worker, collect_scan
+
+def test_expired_lease_goes_to_another_worker(tmp_path):
+    """A task whose lease expired is handed to another worker, and the old holder can no longer complete it."""
+    queue = TaskQueue(str(tmp_path / "tasks.db"), lease_seconds=0.1)
+    queue.enqueue("scan", {"id": "nmap-0", "tool": "nmap", "target": "google.com"})
+
+    assert queue.claim("w1")[1]["id"] == "nmap-0"
+    assert queue.claim("w2") is None  # Leased to w1
+    time.sleep(0.2)
+    assert queue.claim("w2")[1]["id"] == "nmap-0"
+
+    assert not queue.complete("scan", "nmap-0", "w1", {"status": "success"})  # w1 lost its lease
+    assert queue.complete("scan", "nmap-0", "w2", {"status": "success"})
+    assert queue.counts("scan") == {"done": 1}
+
+def test_heartbeat_keeps_the_lease_and_attempts_are_bounded(tmp_path):
+    """Heartbeats keep a lease alive, and a task whose lease expires max_attempts times fails."""
+    queue = TaskQueue(str(tmp_path / "tasks.db"), lease_seconds=0.3, max_attempts=2)
+    queue.enqueue("scan", {"id": "nmap-0", "tool": "nmap", "target": "google.com"})
+    queue.claim("w1")
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat("scan", "nmap-0", "w1")
+    assert queue.claim("w2") is None
+
+    time.sleep(0.4)
+    assert queue.claim("w2") is not None  # Second attempt
+    time.sleep(0.4)
+    assert queue.claim("w3") is None
+    assert queue.counts("scan") == {"failed": 1}
+    [(task, result)] = queue.results("scan")
+    assert "Lease expired" in result["error"]
+
+def test_enqueue_is_idempotent(tmp_path):
+    """Enqueueing a task id that is already queued is a no-op."""
+    queue = TaskQueue(str(tmp_path / "tasks.db"))
+    assert queue.enqueue("scan", {"id": "gobuster:http://google.com", "tool": "gobuster", "target": "http://google.com"})
+    assert not queue.enqueue("scan", {"id": "gobuster:http://google.com", "tool": "gobuster", "target": "http://google.com"})
+
+def test_workers_run_a_scan_with_follow_ups_and_results_are_aggregated(tmp_path, monkeypatch):
+    """Workers run the queued scan with its follow-ups, and collect_scan aggregates the results."""
+    ran = []
+    lock = threading.Lock()
+
+    def fake_nmap(target, on_line=None, ports=None):
+        on_line('<?xml version="1.0"?>')
+        on_line("<nmaprun><host>")
+        on_line('<address addr="142.250.0.1" addrtype="ipv4"/>')
+        on_line('<ports><port protocol="tcp" portid="8080"><state state="open"/><service name="http-proxy"/></port>')
+        return {"status": "success", "output": "", "ports": [
+            {"host": "142.250.0.1", "port": 8080, "protocol": "tcp", "state": "open",
+             "service": "http-proxy", "tunnel": "", "product": ""}
+        ]}
+
+    def fake_tool(target, on_line=None, wordlist=None, urls=None):
+        with lock:
+            ran.append(target)
+        return {"status": "success", "output": ""}
+
+    monkeypatch.setattr(agent_graph, "run_nmap", fake_nmap)
+    for name in ("run_gobuster", "run_ffuf", "run_sqlmap"):
+        monkeypatch.setattr(agent_graph, name, fake_tool)
+
+    queue = TaskQueue(str(tmp_path / "tasks.db"))
+    scan_id = submit_scan(queue, "google.com")
+    stop = threading.Event()
+    workers = [threading.Thread(target=run_worker, args=(queue,), kwargs={"stop": stop, "poll_interval": 0.01})
+               for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    try:
+        results = collect_scan(queue, scan_id, save_report=False, poll_interval=0.01, timeout=10)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    assert "http://google.com:8080" in ran  # The follow-up queued by the nmap worker
+    assert len(results["gobuster"]) == 2
+    assert results["nmap"][0]["status"] == "success"
+    assert any(finding["port"] == 8080 for finding in results["findings"])
+
+def test_worker_mode_starts_without_targets(tmp_path, monkeypatch):
+    """`main.py --worker --queue PATH` runs a worker on the queue rather than asking for a target."""
+    import main
+    queues = []
+    monkeypatch.setattr(main, "configure_audit_log", lambda: None)
+    monkeypatch.setattr(main, "run_worker", lambda queue: queues.append(queue.path))
+
+    with pytest.raises(SystemExit) as exit_info:
+        main.main(["--worker", "--queue", str(tmp_path / "tasks.db"), "--metrics-port", "0"])
+    assert exit_info.value.code == 0
+    assert queues == [str(tmp_path / "tasks.db")]
+
+def test_distributed_sqlmap_waits_for_discovery_and_tests_the_endpoints_found(tmp_path, monkeypatch):
+    """sqlmap is held until the workers finish discovery, then tests the endpoints found in one batch."""
+    calls = []
+    monkeypatch.setattr(agent_graph, "run_nmap", lambda target, on_line=None, ports=None: {"status": "success", "output": "", "ports": []})
+    monkeypatch.setattr(agent_graph, "run_gobuster", lambda target, on_line=None, wordlist=None, urls=None:
+                        {"status": "success", "output": "/item.php (Status: 200)"})
+    monkeypatch.setattr(agent_graph, "run_ffuf", lambda target, on_line=None, wordlist=None, urls=None:
+                        {"status": "success", "output": "", "hits": [{"url": "https://google.com/item.php?id=1", "status": 200}]})
+    monkeypatch.setattr(agent_graph, "run_sqlmap", lambda target, on_line=None, urls=None:
+                        calls.append(urls) or {"status": "success", "output": ""})
+
+    queue = TaskQueue(str(tmp_path / "tasks.db"))
+    scan_id = submit_scan(queue, "google.com")
+    assert queue.counts(scan_id)["held"] == 1
+    run_worker(queue, idle_exit=True)
+    results = collect_scan(queue, scan_id, save_report=False, timeout=10)
+
+    assert calls == [["https://google.com", "https://google.com/item.php?id=1", "https://google.com/item.php"]]
+    assert len(results["sqlmap"]) == 1 and queue.is_finished(scan_id)
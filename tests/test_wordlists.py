@@ -0,0 +1,80 @@
+import hashlib
+import os
+from agent import agent_graph, wordlists
+from agent.task_manager import shard_task
+from agent.wordlists import WordlistRegistry, resolve_wordlist, get_registry
+
+def test_register_normalizes_and_deduplicates(tmp_path):
+    """Entries are trimmed, comments and blanks dropped, and duplicates kept once in order."""
+    source = tmp_path / "raw.txt"
+    source.write_text("# comment\nadmin\n/admin\n\n  login  \napi\nlogin\n")
+    registry = WordlistRegistry(str(tmp_path))
+
+    wordlist = registry.register("raw", str(source))
+
+    assert len(wordlist) == 3
+    with open(wordlist.path) as f:
+        assert f.read() == "admin\nlogin\napi\n"
+    assert registry.names() == ["raw"]
+
+def test_shards_cover_every_entry_once(tmp_path):
+    """Shards are contiguous, near-equal and together cover the whole list."""
+    words = [f"word{i}" for i in range(10)]
+    wordlist = WordlistRegistry(str(tmp_path)).register("big", words)
+
+    covered = []
+    hashes = set()
+    for shard in range(3):
+        path, content_hash = wordlist.shard(shard, 3)
+        with open(path) as f:
+            covered.extend(f.read().split())
+        hashes.add(content_hash)
+
+    assert covered == words
+    assert len(hashes) == 3
+    assert wordlist.shard(0, 1) == (wordlist.path, wordlist.content_hash)
+
+def test_shards_are_streamed_once_and_reused_by_their_stored_hash(tmp_path, monkeypatch):
+    """A new shard is copied in chunks and hashed on the way; an existing one is reused without copying."""
+    monkeypatch.setattr(wordlists, "CHUNK_SIZE", 7)
+    wordlist = WordlistRegistry(str(tmp_path)).register("big", [f"word{i}" for i in range(100)])
+    path, content_hash = wordlist.shard(1, 4)
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data.split() == [f"word{i}".encode() for i in range(25, 50)]
+    assert content_hash == hashlib.sha256(data).hexdigest()
+
+    def no_copy(*args, **kwargs):
+        raise AssertionError("existing shard copied again")
+
+    monkeypatch.setattr(wordlists.mmap, "mmap", no_copy)
+    again = WordlistRegistry(str(tmp_path)).get("big")  # As another process would
+    assert again.shard(1, 4) == (path, content_hash)
+    os.remove(f"{path}.sha256")  # A shard written before hashes were stored
+    assert WordlistRegistry(str(tmp_path)).get("big").shard(1, 4) == (path, content_hash)
+
+def test_content_hash_tracks_content(tmp_path):
+    """Re-registering with different content changes the hash; the same content keeps it."""
+    registry = WordlistRegistry(str(tmp_path))
+    first = registry.register("list", ["a", "b"]).content_hash
+    assert registry.register("list", ["b", "a", "a"]).content_hash != first
+    assert registry.register("list", ["a", "b"]).content_hash == first
+
+def test_sharded_tasks_use_their_shard(monkeypatch):
+    """Each shard task runs gobuster on its own shard file and caches separately."""
+    get_registry().register("common", [f"w{i}" for i in range(4)])
+    tasks = shard_task({"id": "gobuster:https://example.com", "tool": "gobuster", "target": "https://example.com"}, shards=2)
+    seen = []
+
+    def fake_gobuster(target, on_line=None, wordlist=None):
+        with open(wordlist) as f:
+            seen.append(f.read().split())
+        return {"status": "success", "output": ""}
+
+    monkeypatch.setattr(agent_graph, "run_gobuster", fake_gobuster)
+    results = [agent_graph.execute_task(task) for task in tasks]
+
+    assert [task["id"] for task in tasks] == ["gobuster:https://example.com#1/2", "gobuster:https://example.com#2/2"]
+    assert seen == [["w0", "w1"], ["w2", "w3"]]
+    assert [result["wordlist"]["entries"] for result in results] == [2, 2]
+    assert resolve_wordlist(tasks[0])[1] != resolve_wordlist(tasks[1])[1]